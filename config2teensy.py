@@ -4,7 +4,11 @@ from neurokraken import _SerialReady
 
 path = None
 if len(sys.argv) > 1:
-    path = sys.argv[1]
+    path = Path(sys.argv[1])
+# multi-teensy setups: the board to create the configuration for (see configurators.on_board), None for the primary board
+board = None
+if len(sys.argv) > 2:
+    board = sys.argv[2]
 
 if path is None:
     import textwrap
@@ -44,8 +48,10 @@ spec = importlib.util.spec_from_file_location(name='', location=config_file)
 config = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(config)
 
-serial_in = config.serial_in
-serial_out = config.serial_out
+serial_in = {name: params for name, params in config.serial_in.items() if params.get('board') == board}
+serial_out = {name: params for name, params in config.serial_out.items() if params.get('board') == board}
+if board is not None:
+    print(f'creating the configuration of board "{board}" with {len(serial_in)} sensors and {len(serial_out)} controls')
 
 if not 't_ms' in serial_in.keys():
     serial_in = {'t_ms': {'value': 0, 'encoding': 'uint', 'byte_length': 4, 'logging': False,
@@ -60,6 +66,8 @@ if not 'start_stop' in serial_out.keys():
 
 controls:list[tuple[str,str,any]] = [(name, params['arduino_class'], params.get('arduino_args', None)) for name, params in serial_out.items()]
 sensors:list[tuple[str,str,any]] = [(name, params['arduino_class'], params.get('arduino_args', None)) for name, params in serial_in.items()]
+# sensors sending delta/varint encoded archivist histories - applied in teensy.ino's setup()
+compact_sensors:list[bool] = [params.get('compact', False) for params in serial_in.values()]
 
 # pair arduino devices with their files to include
 
@@ -147,6 +155,8 @@ for device in (*controls, *sensors):
 for f in files:
     config_code += f'#include "{f}"\n'
 config_code += '\n'
+if any(compact_sensors):
+    config_code += '#define COMPACT_SENSORS\n\n'
 config_code += 'namespace config{\n'
 
 for device in sensors:
@@ -176,6 +186,8 @@ for device in controls:
 config_code += '\n'
 
 config_code += f'  Sensor* sensors[] = {{{', '.join([d[0] for d in sensors])}}};\n'
+if any(compact_sensors):
+    config_code += f'  bool compactSensors[] = {{{', '.join(['true' if c else 'false' for c in compact_sensors])}}};\n'
 config_code += f'  Control* controls[] = {{{', '.join([d[0] for d in controls])}}};\n'
 config_code += f'  Process* processes[] = {{{', '.join([d[0] for d in (*sensors, *controls) if device_isprocess[d[1]]])}}};\n'
 config_code += '}\n'
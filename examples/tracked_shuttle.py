@@ -81,12 +81,17 @@ def parallel_predict():
     # cutie will keep predicting frames in this loop. In a proper experiment we might also save the created masks,
     # calculate information like the center of mass, and add relevant data for the experiment to get.log
     global processed_frame, masks
+    seq = 0
     while True:
         if get.quitting:
             break
-        frame = get.camera(0)
+        # wait for a frame newer than the last predicted one instead of predicting the same frame again
+        new = get.wait_for_frame(0, after_seq=seq, timeout=1)
+        if new is None:
+            continue
+        seq = new.seq
         # cutie works on RGB images => turn the frame from greyscale i.e. (720, 1280) into RGB (720, 1280, 3)
-        frame = np.stack([frame, frame, frame], axis=-1)
+        frame = np.stack([new.frame, new.frame, new.frame], axis=-1)
         processed_frame, masks = cutils.predict_frame(frame, apply_pallete=True)
 
 class UI(Sketch):
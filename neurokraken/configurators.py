@@ -50,6 +50,19 @@ class Camera:
         fps (int): Targeted frames per second.
             If the target cannot be reached, frames will be captured at the highest possible framerate. Defaults to 30.
         cv2_backend: OpenCV capture backend constant. Defaults to cv2.CAP_DSHOW.
+        engine (str): 'sketch' captures in a py5 sketch thread of the main process. 'process' captures, converts and
+            saves in a dedicated worker process - only the frame log, the latest frame and the preview (as numpy, also
+            for ui_view_format='py5') return to the main process. The worker imports the task script, which then has to
+            start the task under if __name__ == '__main__':. Streaming requires 'sketch'. Defaults to 'sketch'.
+        roi (tuple[int, int, int, int]|None): (x, y, width, height) region of the captured frames to keep, in pixels of
+            the full width/height. Applied right after capture, before the conversion, preview, streaming and saving,
+            which then only handle the region. GenICams (capturer='harvesters') crop on the sensor, other capturers
+            crop in software. The frames' width/height are reported as the region's. Defaults to None (full frames).
+        decimation (int): Bin blocks of decimation x decimation pixels into their average, i.e. 2 halves width and
+            height. Applied after the roi - GenICams bin on the sensor when supported. Defaults to 1.
+        capture_step (int): Keep only every capture_step-th frame delivered by the camera - the others are discarded
+            without being decoded (cv2) or copied (harvesters). For cameras delivering at a fixed rate above the
+            needed one. Defaults to 1.
 
         turn_image (bool): Whether to turn images 180 degree. Can have slight performance impact. Defaults to False.
         color2grey (bool): Frames are internally received as RGB color even with greyscale cameras. 
@@ -62,11 +75,41 @@ class Camera:
         ui_view_format (str): 'py5' or 'numpy'. the data type of the frame provided by get_camera(). Defaults to 'py5'
         ui_view_scale (float): Resolution caling factor for UI view display. Defaults to 0.5.
         ui_view_step (int): Frame skip interval for UI view. Defaults to 1.
+        recent_frames (int): Number of most recent frames kept in a preallocated ring, read without copies by
+            get.camera_frames(i, n) and get.wait_for_frame(i, after_seq). With 0, engine='sketch' cameras only keep
+            frames once one of them (or get_camera(i)) was called. Defaults to 4.
 
         save_as_vid (bool): Whether to save output as video file. Defaults to True.
-        vid_codec (str): Video codec for saving. Defaults to 'mp4v'.
+        vid_codec (str): Video codec (fourcc) for saving with vid_writer='cv2'. Defaults to 'mp4v'.
         vid_container (str): Video container format. Defaults to 'mp4'.
-        save_as_images (bool): Whether to save frames as individual images. Defaults to False.
+        vid_writer (str): 'cv2' encodes in the capture loop with cv2.VideoWriter. 'ffmpeg' queues the frames for an
+            ffmpeg process (the binary of imageio_ffmpeg) fed by a writer thread - encoding doesn't stall the capture,
+            frames are dropped if the queue is full. Queued and dropped frames are shown in
+            threads_info['video_writers']. Defaults to 'cv2'.
+        vid_ffmpeg_codec (str): ffmpeg encoder with vid_writer='ffmpeg', i.e. 'libx264', 'libx265' or 'h264_nvenc'.
+            Defaults to 'libx264'.
+        vid_preset (str|None): ffmpeg encoder preset, None to omit it. Slower presets compress better with more CPU
+            load. Defaults to 'ultrafast'.
+        vid_crf (int|None): ffmpeg constant rate factor - lower is higher quality, None to omit it. Defaults to 23.
+        vid_pix_fmt (str): Pixel format of the ffmpeg video file. Defaults to 'yuv420p'.
+        vid_queue_size (int): Frames waiting for the ffmpeg encoder before frames are dropped. Defaults to 120.
+        save_as_images (bool): Whether to save frames as individual images in <log>/<name>. A pool of writer threads takes them from a bounded queue - frames are dropped if the queue is
+            full. Queued, written and dropped frames are shown in threads_info['image_writers'], drops are counted in
+            the log's 'camera dropped frames'. Defaults to False.
+        image_format (str): 'png' (lossless compressed, slowest), 'tiff' (uncompressed, fastest), 'jpg' (lossy, see
+            image_jpeg_quality) or 'npy' (chunks of image_chunk_frames frames per .npy file). Defaults to 'png'.
+        image_naming (str): 'vid_time' names images by frame number and video time, i.e. '1234_0h;0m;41s;133ms.png'.
+            'index' names them by the zero padded frame number, i.e. '001234.png', which sorts by name - the times of
+            a frame number are in the camera's log. Defaults to 'vid_time'.
+        image_jpeg_quality (int): JPEG quality 0-100 with image_format='jpg'. Defaults to 95.
+        image_chunk_frames (int): Frames per .npy file with image_format='npy'. Defaults to 100.
+        image_queue_size (int): Frames waiting for the image writers before frames are dropped. Defaults to 64.
+        image_workers (int|None): Image writer threads, None for half the CPUs (up to 8), 1 with 'npy'.
+            Defaults to None.
+        save_as_raw (bool): Copy the frames uncompressed into memory-mapped .npy segment files in <log>/<name>_raw
+            instead of encoding them during the session. After the session a background process transcodes them with
+            the vid_ settings (if save_as_vid) and deletes them once the video is verified. Defaults to False.
+        raw_segment_frames (int): Frames per raw segment file - segments are transcoded in parallel. Defaults to 1000.
 
         stream_active (bool): Whether to enable streaming. Experimental feature. Defaults to False.
         stream_port (int): Network port for streaming. Defaults to 50000.
@@ -84,6 +127,10 @@ class Camera:
     cv2_backend:any = cv2.CAP_DSHOW
     cv2_fps:int = 500
     harvesters_path_GenTL_cti:str = None
+    engine:str = 'sketch'
+    roi:tuple[int, int, int, int]|None = None
+    decimation:int = 1
+    capture_step:int = 1
 
     # image processing
     turn_image:bool = False
@@ -95,12 +142,27 @@ class Camera:
     ui_view_format:str = 'py5'
     ui_view_scale:float = 0.5
     ui_view_step:int = 1
+    recent_frames:int = 4
 
     # recording
     save_as_vid:bool = True
     vid_codec:str = 'mp4v'
     vid_container:str = 'mp4'
+    vid_writer:str = 'cv2'
+    vid_ffmpeg_codec:str = 'libx264'
+    vid_preset:str|None = 'ultrafast'
+    vid_crf:int|None = 23
+    vid_pix_fmt:str = 'yuv420p'
+    vid_queue_size:int = 120
     save_as_images:bool = False
+    image_format:str = 'png'
+    image_naming:str = 'vid_time'
+    image_jpeg_quality:int = 95
+    image_chunk_frames:int = 100
+    image_queue_size:int = 64
+    image_workers:int|None = None
+    save_as_raw:bool = False
+    raw_segment_frames:int = 1000
 
     # streaming
     stream_active:bool = False
@@ -137,11 +199,17 @@ class Microphone:
 
 @dataclass 
 class _Devices:
-    """These devices can be added to serial_in or serial_out of your task configuration."""
+    """These devices can be added to serial_in or serial_out of your task configuration.
+
+    Sensors with a compact argument can send their archivist mode histories compact: every entry after the
+    first is sent as the varint encoded difference to the previous entry's timestamp and value. This reduces
+    the serial bandwidth of sensors that change often by small steps, at a higher python decoding cost.
+    Changing compact requires rerunning config2teensy.
+    """
 
     # Sensors
 
-    def binary_read(self, pin:int, logging=True,
+    def binary_read(self, pin:int, logging=True, compact=False,
                     keys:list=('F14',), keys_control=lambda keys : 1 if keys[0] else 0):
         """A digital read of a pin (HIGH or Low), (True or False). Many devices can provide a suitable
         input to an arduino pin from simple buttons to integrated touch sensors. Provides 0 or 1
@@ -149,16 +217,18 @@ class _Devices:
 
         Args:
             logging:bool - log changes in value for future usage. Defaults to True.
+            compact:bool - send compact histories (see _Devices). Mostly shortens the timestamps, i.e. of the
+                           bursts of a lick sensor. Defaults to False.
 
         Example:
             >>> serial_in = {'licking_sensor': true_false_sensor(pin=3)}
             >>> print(get.read_in('licking_sensor')) # 0 or 1
         """
-        return {'value': 0, 'encoding': 'uint', 'byte_length': 1, 'logging': logging,
+        return {'value': 0, 'encoding': 'uint', 'byte_length': 1, 'logging': logging, 'compact': compact,
                 'arduino_class': 'DigitalSensor', 'arduino_args': pin,
                 'keys': keys, 'keys_control': keys_control}
 
-    def analog_read(self, pin:int, logging=True,
+    def analog_read(self, pin:int, logging=True, compact=False,
                     keys:list=('F13', 'F14'), 
                     keys_control=lambda keys : 256 if keys[0] else 768 if keys[1] else 512):
         """Analog read of a pin. Provides a continuous value 0 to 1023 upon get.read_in(<device name>).
@@ -166,16 +236,18 @@ class _Devices:
         
         Args:
             logging:bool - log changes in value for future usage. Defaults to True.
+            compact:bool - send compact histories (see _Devices). A noisy reading changing by a few steps every
+                           millisecond then takes about 2 instead of 6 bytes per change. Defaults to False.
         
         Example:
             >>> serial_in = {'rotation_potentiometer': continuous_sensor(pin=3)}
             >>> print(get.read_in('rotation_potentiometer')) # 387
         """
-        return {'value': 0, 'encoding': 'uint', 'byte_length': 2, 'logging': logging,
+        return {'value': 0, 'encoding': 'uint', 'byte_length': 2, 'logging': logging, 'compact': compact,
                 'arduino_class': 'AnalogSensor', 'arduino_args': pin,
                 'keys': keys, 'keys_control': keys_control}
     
-    def rotary_encoder(self, pins:tuple[int,int], logging=True, controls=False,
+    def rotary_encoder(self, pins:tuple[int,int], logging=True, controls=False, compact=False,
                        keys=['F13', 'F14'], 
                        keys_control=lambda keys, value : value - 0.3 if keys[0] else value + 0.3 if keys[1] else value):
         """Rotation position of rotary encoder. Returns -2,147,483,648 to +2,147,483,647 upon 
@@ -185,6 +257,8 @@ class _Devices:
         
         Args:
             logging:bool - log changes in value for future usage. Defaults to True.
+            compact:bool - send compact histories (see _Devices). A turning wheel changes by a few counts every
+                           millisecond, which then takes about 2 instead of 8 bytes per change. Defaults to False.
             controls:bool - return the optional control entry for serial_out instead of the sensor_value for
                             serial_in. When adding the control running get.send_out(<device_name>) allows
                             resetting the wheel position to 0. Defaults to False
@@ -195,7 +269,7 @@ class _Devices:
         >>> get.send_out('wheel_pos', True) # reset the wheel position to 0 (only if control provided to serial_out)
         """
         if not controls:
-            return {'value': 0, 'encoding': int, 'byte_length': 4, 'logging': logging,
+            return {'value': 0, 'encoding': int, 'byte_length': 4, 'logging': logging, 'compact': compact,
                     'arduino_class': 'RotEnc', 'arduino_args': pins,
                     'keys': keys, 'keys_control': keys_control}
         else:
@@ -203,7 +277,7 @@ class _Devices:
                     'default': False, 'reset_after_send': True,
                     'arduino_class': 'RotEnc', 'arduino_args': pins}
                                             
-    def capacitive_touch(self, pins:list[int, int], logging=True,
+    def capacitive_touch(self, pins:list[int, int], logging=True, compact=False,
                          keys=['F13'], keys_control=lambda keys : 40000 if keys[0] else 200):
         """Capacitance Sensing of a connected object. Provides a 0 to 4,294,967,295. upon get.read_in(<device name>).
         The range depends on the resistors used with the connection. See documentation for example wiring.
@@ -212,12 +286,14 @@ class _Devices:
         
         Args:
             logging:bool - log changes in value for future usage. Defaults to True.
+            compact:bool - send compact histories (see _Devices). Capacitance readings fluctuate continuously by
+                           small amounts and then take about 3 instead of 8 bytes per change. Defaults to False.
         
         Example:
             >>> serial_in = {'touch': capacitive_touch(pins=[3,4])}
             >>> print(get.read_in('touch')) # 481
         """
-        return {'value': 0, 'encoding': int, 'byte_length': 4, 'logging': logging,
+        return {'value': 0, 'encoding': int, 'byte_length': 4, 'logging': logging, 'compact': compact,
                 'arduino_class': 'CapacitiveRead', 'arduino_args': pins,
                 'keys': keys, 'keys_control': keys_control}
     
@@ -368,3 +444,18 @@ class _Devices:
     
 devices = _Devices()
 
+
+def on_board(board:str, entries:dict) -> dict:
+    """Assign serial_in or serial_out entries to an additional teensy board of a multi-teensy setup
+    (see Neurokraken(boards=...)). Entries without a board belong to the primary teensy.
+
+    Args:
+        board (str): The board name as provided in Neurokraken(boards={board: serial_key})
+        entries (dict): The serial_in or serial_out entries connected to this board
+
+    Example
+        >>> serial_in = {'lick': devices.binary_read(0),
+        >>>              **on_board('aux', {'wheel': devices.rotary_encoder((2, 3))})}
+        >>> nk = Neurokraken(serial_in=serial_in, serial_key='KRAKEN', boards={'aux': '12345670'})
+    """
+    return {name: {**entry, 'board': board} for name, entry in entries.items()}
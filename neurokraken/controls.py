@@ -1,6 +1,8 @@
 
 from typing import Callable
 from core.state_machine import State_Machine as _State_Machine
+from core.log_store import frame_index_at as _frame_index_at, audio_sample_at as _audio_sample_at
+from core.camera_capture import Camera_Frame as _Camera_Frame
 import numpy as np
 import py5
 
@@ -30,7 +32,11 @@ class Get:
         log['serial_in]:dict Current and historical readings of all sensors
         log['controls']:dict Current and historical values of all send_out/serial_out changes enacted
         log['cameras (t_ms/#frame/vid_time)'] camera frame timing
-        log['microphones (t_ms/audio_time)'] microphone frame timing
+        log['camera dropped frames'] per camera, the frames its image and ffmpeg video writers couldn't keep up with
+        log['microphones (t_ms/#sample/audio_time)'] microphone sample timing, an entry per recorded audio block
+        log['microphones (t_ms/audio_time)'] the (t_ms, audio_time) keyframes every 10 s of earlier versions
+        Sensor, control, camera and microphone histories are Log_History columns that read like lists of (t, value)
+        entries, i.e. log['controls']['reward_valve'][-1]. Their .times and .values provide them as numpy arrays.
         """
         self.camera:Callable[[int, bool], np.ndarray|py5.Py5Image] = camera
         """
@@ -56,7 +62,17 @@ class Get:
         """A dictionary containing 'framerate_main', 'framerate_visual' and 'framerate_cams'
         
         Useful for development and maximizing a camera's viable fps.
-        framerate_cams is a dict[str:float] with individual cameras accessible by their configured name"""
+        framerate_cams is a dict[str:float] with individual cameras accessible by their configured name.
+        With networker_thread=True 'framerate_networker' contains the teensy communications per second.
+        With log_performance=True 'latency_networker' contains live p50/p99/max microseconds of the
+        communication stages 'answer', 'read', 'decode' and 'round_trip'.
+        In teensy mode 'cpu_process' and 'cpu_networker' contain the percent of one CPU core used by the
+        process and by the thread communicating with the teensy.
+        With multiple boards (Neurokraken(boards=...)) these networker values are provided per board in
+        'boards'[board name or 'main'], alongside 'kB/s_networker' and the board's clock offset 't_offset_ms'.
+        Cameras saving with vid_writer='ffmpeg' report their encoder's 'queue' and 'dropped' frames in
+        'video_writers'[camera name], cameras with save_as_images=True their image writers' 'queue', 'written' and
+        'dropped' frames in 'image_writers'[camera name]"""
         self.log_dir:str = log_dir
         """The log Path - can be used to save additional files"""
         self.mode:str = mode
@@ -169,6 +185,83 @@ class Get:
         """
         self.serial_out[name]['value'] = value
 
+    def frame_index_at(self, camera:int|str, t_ms:int) -> int|None:
+        """The number of the camera frame captured most recently at or before t_ms - its frame in the video
+        file or the number of its saved image. A binary search in the camera's log, usable live and fast
+        even for long sessions.
+
+        Args:
+            camera (int | str): The camera's index or its configured name
+            t_ms (int): The task time, i.e. of a logged event
+
+        Returns:
+            int | None: the frame number, None before the first frame
+
+        Example:
+            >>> lick_t = get.log['events'][-1][0]
+            >>> frame = get.frame_index_at('side_cam', lick_t)
+        """
+        name = self.cameras[camera].properties.name if isinstance(camera, int) else camera
+        return _frame_index_at(self.log['cameras (t_ms/#frame/vid_time)'][name], t_ms)
+
+    def camera_frames(self, camera:int|str, n:int=1) -> list[_Camera_Frame]:
+        """The camera's up to n most recent frames from its ring of recent frames (configurators.Camera(recent_frames=...)),
+        oldest first. The frames are read-only views without copies - a view is overwritten once the camera has
+        captured recent_frames further frames, so copy frames you keep longer.
+
+        Args:
+            camera (int | str): The camera's index or its configured name
+            n (int, optional): The number of frames. Defaults to 1.
+
+        Returns:
+            list[Camera_Frame]: frames with their .seq (sequence number), .t_ms (capture time) and .frame (np.ndarray)
+
+        Example:
+            >>> previous, current = get.camera_frames(0, 2)
+            >>> motion = cv2.absdiff(previous.frame, current.frame)
+        """
+        return self._camera(camera).frame_ring.latest(n)
+
+    def wait_for_frame(self, camera:int|str, after_seq:int=0, timeout:float|None=None) -> _Camera_Frame|None:
+        """Block until the camera has a frame newer than after_seq and return its latest frame - to process
+        every new frame once instead of the same frame again and again.
+
+        Args:
+            camera (int | str): The camera's index or its configured name
+            after_seq (int, optional): The sequence number of the last processed frame. Defaults to 0.
+            timeout (float | None, optional): Seconds to wait at most. Defaults to None (no limit).
+
+        Returns:
+            Camera_Frame | None: the latest frame as a read-only view (see camera_frames()), None at a timeout
+
+        Example:
+            >>> seq = 0
+            >>> while not get.quitting:
+            >>>     new = get.wait_for_frame(0, seq, timeout=1)
+            >>>     if new is not None:
+            >>>         seq = new.seq
+            >>>         masks = predict(new.frame)
+        """
+        return self._camera(camera).frame_ring.wait(after_seq, timeout)
+
+    def _camera(self, camera:int|str):
+        if isinstance(camera, int):
+            return self.cameras[camera]
+        return next(cam for cam in self.cameras if cam.properties.name == camera)
+
+    def audio_sample_at(self, microphone:str, t_ms:int) -> int|None:
+        """The number of the sample in the microphone's audio file recorded at t_ms. A binary search in
+        the microphone's log of recorded audio blocks, usable live.
+
+        Args:
+            microphone (str): The microphone's configured name
+            t_ms (int): The task time, i.e. of a logged event
+
+        Returns:
+            int | None: the sample number (divide by the sample rate for seconds), None before the first audio block
+        """
+        return _audio_sample_at(self.log['microphones (t_ms/#sample/audio_time)'][microphone], t_ms)
+
     #------------------------- STATES AND BLOCKS PROPERTIES -------------------------
     # the state_machine class will overwrite many of its variables like current_block throughout
     # a task, outdating references created at program start => property() allows get.current_block
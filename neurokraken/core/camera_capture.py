@@ -0,0 +1,462 @@
+"""Camera capture and frame saving without py5, shared by the camera sketches (cameras.py) and the
+camera worker processes (camera_process.py)."""
+
+import numpy as np
+import cv2
+import time
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from core.print0 import print0
+from core.video_writers import open_video_writer
+from core.image_writers import Image_Sequence_Writer
+
+@dataclass
+class Camera_Frame:
+    """A captured frame in a camera's ring of recent frames"""
+    seq:int
+    """The frame's sequence number, counting every captured frame from 1 (also before the task's start)"""
+    t_ms:int
+    """The task time of the frame's capture"""
+    frame:np.ndarray
+    """A read-only view into the ring - it is overwritten after recent_frames further captures, copy what you keep"""
+
+class Frame_Ring:
+    """The most recent frames of a camera in preallocated slots, numbered by sequence numbers. Readers
+    get views into the slots and can wait for the next frame.
+
+    Args:
+        size (int): The number of readable frames - one more slot is kept for the frame being written. With 0 the
+                    ring is only filled once a reader asked for a frame.
+        condition (threading.Condition | multiprocessing.Condition | None, optional): Notified at every new frame.
+            Defaults to None (a threading.Condition).
+        keep_frames (bool, optional): Keep the pushed arrays themselves in the slots instead of copying them into
+                                      preallocated ones - for frames that are never modified after the push.
+                                      Defaults to False.
+    """
+    def __init__(self, size:int, condition=None, keep_frames:bool=False):
+        self.size = max(size, 1)
+        self.keep_frames = keep_frames
+        # whether push() is needed - set by the first reader of a ring of size 0
+        self.wanted = size > 0
+        self.slots = self.size + 1
+        self.condition = condition if condition is not None else threading.Condition()
+        self.frames:np.ndarray|None = None
+        self.times:np.ndarray|None = None
+        # [started, published]: the sequence number of the frame being written and the last complete one
+        self.counters = np.zeros(2, dtype=np.int64)
+
+    def attach(self, frames:np.ndarray, times:np.ndarray, counters:np.ndarray):
+        """Use provided slots, i.e. in shared memory, instead of allocating them at the first frame"""
+        self.frames, self.times, self.counters = frames, times, counters
+
+    @property
+    def seq(self) -> int:
+        """The sequence number of the latest frame, 0 before the first"""
+        return int(self.counters[1])
+
+    def push(self, frame:np.ndarray, t_ms:int):
+        if self.frames is None:
+            self.frames = [frame] * self.slots if self.keep_frames else \
+                          np.zeros((self.slots, *frame.shape), dtype=frame.dtype)
+            self.times = np.zeros(self.slots, dtype=np.int64)
+        n = int(self.counters[1]) + 1
+        self.counters[0] = n
+        slot = n % self.slots
+        # a reference with keep_frames, else a copy into the slot
+        self.frames[slot] = frame
+        self.times[slot] = t_ms
+        self.counters[1] = n
+        with self.condition:
+            self.condition.notify_all()
+
+    def view(self, seq:int) -> Camera_Frame:
+        frame = self.frames[seq % self.slots].view()
+        frame.flags.writeable = False
+        return Camera_Frame(seq, int(self.times[seq % self.slots]), frame)
+
+    def latest(self, n:int=1) -> list[Camera_Frame]:
+        """The up to n most recent frames, oldest first"""
+        self.wanted = True
+        seq = self.seq
+        n = min(n, seq, self.size)
+        return [self.view(s) for s in range(seq - n + 1, seq + 1)]
+
+    def copy_latest(self) -> np.ndarray|None:
+        """A copy of the latest frame, None before the first"""
+        self.wanted = True
+        while True:
+            seq = self.seq
+            if seq == 0:
+                return None
+            frame = self.frames[seq % self.slots].copy()
+            # the copied slot is only rewritten for frame seq + slots
+            if self.counters[0] < seq + self.slots:
+                return frame
+
+    def wait(self, after_seq:int=0, timeout:float|None=None) -> Camera_Frame|None:
+        """The latest frame once its sequence number is above after_seq, None at a timeout"""
+        self.wanted = True
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.seq > after_seq, timeout):
+                return None
+        return self.view(self.seq)
+
+class Camera_Capture:
+    """Opens the configured camera and reads and converts its frames.
+
+    Args:
+        properties (configurators.Camera): The camera configuration
+        show_cv2_backends (bool, optional): Print the available cv2 backends. Defaults to False.
+    """
+    def __init__(self, properties, show_cv2_backends=False):
+        self.properties = properties
+        self.capturer = properties.capturer
+        self.reverse_BGR = False
+        match self.capturer:
+            case 'cv2':
+                self.reverse_BGR = True
+                self.cap = cv2.VideoCapture(properties.idx, properties.cv2_backend)
+
+                if properties.width is not None and self.properties.height is not None:
+                    self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, properties.width)
+                    self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, properties.height)
+                    height, width = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                else:
+                    height, width = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                    print0(f'No width/height provided - using {width}, {height}. Your camera may be able to support' +
+                           'higher resolution if provided in the camera config', priority=2, color='blue', topic='camera')
+
+                self.cap.set(cv2.CAP_PROP_FPS, properties.cv2_fps)
+
+                if show_cv2_backends:
+                    self.show_available_backends()
+
+                print0(f'using cv2 with backend: {self.cap.getBackendName()} for {properties.name}',
+                       priority=4, color='blue', topic='camera')
+
+            case 'iio':
+                self.reverse_BGR = False
+                # imageio will automatically find suitable settings and return the most current frame.
+                # As a result the practical capturing involves filtering frames that are the same as the last.
+                # To reduce the number of these checks and thus compute the max_capture_fps can be reduced.
+                import imageio as iio
+                found_wh = False
+                if properties.width is not None and properties.height is not None:
+                    found_wh = True
+                    self.iio_cam = iio.get_reader(f'<video{properties.idx}>',
+                                                  size=(properties.width, properties.height))
+                else:
+                    self.iio_cam = iio.get_reader(f'<video{properties.idx}>')
+                first_frame = np.array(self.iio_cam.get_data(0))
+                self.iio_last = np.copy(first_frame)
+                print0(f'using imageio for {properties.name}', priority=4, color='blue', topic='camera')
+                if not found_wh:
+                        print0(f'no width/height provided - using {first_frame.shape[0], first_frame.shape[1]}',
+                               priority=2, color='blue', topic='camera')
+                height, width = first_frame.shape[0], first_frame.shape[1]
+
+            case 'harvesters':
+                from harvesters.core import Harvester # type: ignore  - for python versions newer than harvesters supports
+                path_GenTL_cti = properties.harvesters_path_GenTL_cti
+                # note that if the path is wrong it will fail silently and detected cameras will simply be []
+                self.h = Harvester()
+                self.h.add_file(path_GenTL_cti)
+                self.h.update()
+                if len(self.h.device_info_list) == 0:
+                    print0(f'no GenICams found. Please make sure your provided path_GenTL_cti is correct',
+                           priority=1, color='red', topic='camera')
+                print0(f'found the following GenICams: {self.h.device_info_list} - using GenICam at idx: {properties.idx}',
+                        priority=3, color='blue', topic='camera')
+                self.ia = self.h.create(properties.idx)
+                # the region and binning can only be changed while the camera isn't acquiring
+                offset, sensor_binning = self.set_sensor_region(self.ia.remote_device.node_map)
+                self.ia.start()
+                # check height and width of a retrieved frame
+                self.buffer = self.ia.fetch()
+                self.buffer.queue()
+                height, width = self.buffer.height, self.buffer.width
+
+        # the camera's frames are cropped to the roi and binned by the decimation in process() - as far as the
+        # sensor didn't already. self.height and self.width are the size of the processed frames
+        if self.capturer != 'harvesters':
+            offset, sensor_binning = (0, 0), 1
+        self.height, self.width = self.set_software_region(height, width, offset, sensor_binning)
+
+        self.greyscaling = True if self.properties.color2grey else False
+        self.single_channel_to_grey = False
+        if self.greyscaling and self.properties.color2grey_use_single_RGB_channel is not None:
+            self.single_channel_to_grey = True
+            self.channel2grey = 2 - self.properties.color2grey_use_single_RGB_channel
+
+    def set_sensor_region(self, node_map) -> tuple[tuple[int, int], int]:
+        """Apply the decimation and roi to a GenICam's binning and region nodes, as far as it supports them.
+        Returns the (x, y) offset of the delivered region and the binning, both as applied by the camera"""
+        decimation = max(self.properties.decimation, 1)
+        binning = 1
+        if decimation > 1:
+            for horizontal, vertical in (('BinningHorizontal', 'BinningVertical'),
+                                         ('DecimationHorizontal', 'DecimationVertical')):
+                try:
+                    getattr(node_map, horizontal).value = decimation
+                    getattr(node_map, vertical).value = decimation
+                except Exception:
+                    for name in (horizontal, vertical):
+                        try:
+                            getattr(node_map, name).value = 1
+                        except Exception:
+                            pass
+                    continue
+                binning = decimation
+                break
+            if binning == 1:
+                print0(f'{self.properties.name} does not support binning by {decimation} - binning in software',
+                       priority=2, color='yellow', topic='camera')
+
+        if self.properties.roi is not None:
+            x, y, w, h = (value // binning for value in self.properties.roi)
+            try:
+                # offsets first to 0, so that any width and height fits
+                node_map.OffsetX.value, node_map.OffsetY.value = 0, 0
+                offset_x, offset_y = x - x % node_map.OffsetX.inc, y - y % node_map.OffsetY.inc
+                # the smallest region of valid increments containing the roi
+                width = min(-(-(x + w - offset_x) // node_map.Width.inc) * node_map.Width.inc, node_map.Width.max)
+                height = min(-(-(y + h - offset_y) // node_map.Height.inc) * node_map.Height.inc, node_map.Height.max)
+                node_map.Width.value, node_map.Height.value = width, height
+                node_map.OffsetX.value, node_map.OffsetY.value = offset_x, offset_y
+            except Exception as e:
+                print0(f'{self.properties.name} could not apply the roi on the sensor ({e}) - cropping in software',
+                       priority=2, color='yellow', topic='camera')
+        try:
+            offset = (node_map.OffsetX.value, node_map.OffsetY.value)
+        except Exception:
+            offset = (0, 0)
+        return offset, binning
+
+    def set_software_region(self, height:int, width:int, offset:tuple[int, int]=(0, 0),
+                            sensor_binning:int=1) -> tuple[int, int]:
+        """Set up the cropping and binning process() applies to the camera's frames of height x width, which
+        start at offset in the sensor's (binned) pixels. Returns the height and width of the processed frames"""
+        self.binning = max(self.properties.decimation, 1) // sensor_binning
+        x, y, w, h = 0, 0, width, height
+        if self.properties.roi is not None:
+            x, y, w, h = (value // sensor_binning for value in self.properties.roi)
+            x, y = x - offset[0], y - offset[1]
+            x1, y1 = min(x + w, width), min(y + h, height)
+            x, y = max(x, 0), max(y, 0)
+            if (x1 - x, y1 - y) != (w, h):
+                print0(f'the roi of {self.properties.name} exceeds its {width}x{height} frames - cropped to them',
+                       priority=2, color='yellow', topic='camera')
+            w, h = x1 - x, y1 - y
+        # whole blocks of binned pixels
+        w, h = w - w % self.binning, h - h % self.binning
+        if w <= 0 or h <= 0:
+            raise ValueError(f'the roi {self.properties.roi} of {self.properties.name} leaves no pixels of its '
+                             f'{width}x{height} frames at decimation {self.properties.decimation}')
+        self.crop = None if (x, y, w, h) == (0, 0, width, height) else (x, y, w, h)
+        return h // self.binning, w // self.binning
+
+    def skip(self):
+        """Discard a frame of the camera without decoding or copying it where possible"""
+        match self.capturer:
+            case 'cv2':
+                self.cap.grab()
+            case 'iio':
+                self.iio_cam.get_next_data()
+            case 'harvesters':
+                self.ia.fetch().queue()
+
+    def read(self) -> np.ndarray|None:
+        """The next frame from the camera, None if no new frame is available"""
+        for _ in range(self.properties.capture_step - 1):
+            self.skip()
+        match self.capturer:
+            case 'cv2':
+                ret, frame_read = self.cap.read()
+                # the frame_read.shape will have 3 color channels even for greyscale cameras
+                if not ret:
+                    return None
+            case 'iio':
+                frame_read = self.iio_cam.get_next_data()
+                # get_next_data() will return the most recent frame. Check whether this frame is actually new
+                if np.array_equal(frame_read[:,0], self.iio_last[:,0]):
+                    return None
+                else:
+                    self.iio_last = np.copy(frame_read)
+            case 'harvesters':
+                self.buffer = self.ia.fetch()
+                self.component = self.buffer.payload.components[0].data
+                # the buffer will start to be overwritten at queue() - use a copy saved beforehand
+                frame_read = np.reshape(np.copy(self.component), (self.buffer.height ,self.buffer.width))
+                self.buffer.queue()
+        return frame_read
+
+    def process(self, frame_read:np.ndarray) -> cv2.UMat:
+        """The read frame cropped, binned, converted to grey and turned as configured"""
+        if self.crop is not None:
+            # a view - only the roi is uploaded into the UMat and processed further
+            x, y, w, h = self.crop
+            frame_read = frame_read[y:y + h, x:x + w]
+        if self.binning > 1:
+            # area interpolation at an integer factor averages binning x binning blocks. Binned before the
+            # UMat upload, which then moves the smaller frame
+            frame_read = cv2.resize(frame_read, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        # reduce the cpu load a bit by using UMat (opencv transparent API) (use .get() to get np array)
+        frame = cv2.UMat(frame_read)
+        if self.greyscaling and frame_read.ndim==3:
+            # don't try to convert if the frame is already single channel
+            if self.single_channel_to_grey:
+                frame = cv2.extractChannel(frame, self.channel2grey)
+            elif self.reverse_BGR:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            else:
+                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+            # the frame is now 2-dimensional, i.e. .shape = 720, 1280
+        if self.properties.turn_image:
+            frame = cv2.rotate(frame, cv2.ROTATE_180)
+        return frame
+
+    def show_available_backends(self):
+        def get_names(identifier_number):
+            return [cv2.videoio_registry.getBackendName(i) for i in identifier_number]
+        print(f'available backends with webcam {self.properties.name}')
+        print(f'available cv2 install backends: {get_names(cv2.videoio_registry.getBackends())}')
+        print(f'available camera backends: {get_names(cv2.videoio_registry.getCameraBackends())}')
+        print(f'available writer backends: {get_names(cv2.videoio_registry.getWriterBackends())}')
+
+    def close(self):
+        match self.capturer:
+            case 'cv2':
+                self.cap.release()
+            case 'iio':
+                self.iio_cam.close()
+            case 'harvesters':
+                self.ia.stop()
+                self.ia.destroy()
+
+class Frame_Saver:
+    """Saves the captured frames as a video and/or as single images.
+
+    Args:
+        properties (configurators.Camera): The camera configuration
+        log_dir (str | None): The session's log folder
+        width (int): The frame width
+        height (int): The frame height
+        greyscaling (bool): Whether the frames are greyscale
+        reverse_BGR (bool): Whether the frames are in BGR order already (cv2)
+        show_cv2_backends (bool, optional): Print the available video writer codecs. Defaults to False.
+    """
+    def __init__(self, properties, log_dir, width:int, height:int, greyscaling:bool, reverse_BGR:bool,
+                 show_cv2_backends=False):
+        self.properties = properties
+        self.greyscaling = greyscaling
+        self.reverse_BGR = reverse_BGR
+        self.save_raw = properties.save_as_raw
+        # with save_as_raw the video is transcoded from the raw frames after the session
+        self.save_vid = properties.save_as_vid and not self.save_raw
+        self.save_images = properties.save_as_images
+
+        if log_dir == None:
+            self.log_name = str(datetime.now()).replace(':', ';').replace(' ', '_')
+            dir = os.path.dirname(os.path.abspath(__file__))
+            self.log_dir = os.path.join(dir, 'logs', f'{self.log_name}')
+        else:
+            self.log_dir = log_dir
+        if not os.path.exists(self.log_dir):
+            os.mkdir(self.log_dir)
+
+        #-------------------------SET UP IMAGE SAVING-------------------------
+        if self.save_images:
+            self.frame_dir = os.path.join(self.log_dir, properties.name)
+            os.mkdir(self.frame_dir)
+            self.images = Image_Sequence_Writer(self.frame_dir, properties.image_format, properties.image_jpeg_quality,
+                                                properties.image_chunk_frames, properties.image_queue_size,
+                                                properties.image_workers, properties.image_naming, properties.fps)
+
+        #-------------------------VIDEO SAVING-------------------------
+        if self.save_vid:
+            if show_cv2_backends:
+                # Set fourcc to -1 to show available video writer codecs. Since this runs the
+                # VideoWriter it creates a useless video file that can immediately be deleted
+                print('available video writer codecs:')
+                time.sleep(0.001)
+                cv2.VideoWriter('useless.mp4', -1, 120.0, (1280, 720))
+                os.remove('useless.mp4')
+
+        self.ffmpeg_writer = False
+        if self.save_vid:
+            file_type = self.properties.vid_container
+            save_path = os.path.join(self.log_dir, self.properties.name + '.' + file_type)
+            self.ffmpeg_writer = self.properties.vid_writer == 'ffmpeg'
+            self.out = open_video_writer(vars(self.properties), save_path, width, height, self.greyscaling,
+                                         self.reverse_BGR)
+
+        #-------------------------RAW SAVING-------------------------
+        if self.save_raw:
+            from core.raw_recording import Raw_Writer
+            self.raw = Raw_Writer(os.path.join(self.log_dir, f'{properties.name}_raw'), vars(properties),
+                                  properties.raw_segment_frames, self.reverse_BGR)
+
+    def save(self, frame, frame_idx:int, t_ms:int=0) -> bool:
+        """Save the frame as frame number frame_idx. Returns whether the frame was numbered - False if it
+        couldn't be saved or nothing is saved, the next frame then takes its number"""
+        if self.save_raw:
+            if self.save_images and not self.queue_image(frame, frame_idx):
+                return False
+            return self.raw.write(frame, frame_idx, t_ms)
+        if self.save_vid and not self.save_images:
+            return self.write_vid(frame)
+        elif self.save_images:
+            if self.queue_image(frame, frame_idx):
+                if self.save_vid:
+                    self.write_vid(frame)
+                return True
+        return False
+
+    def queue_image(self, frame, frame_idx:int) -> bool:
+        """Queue the frame for the image writers. Returns False if their queue was full and it was dropped"""
+        return self.images.write(frame, frame_idx)
+
+    def write_vid(self, frame) -> bool:
+        """Add the frame to the video. Returns False if the ffmpeg writer's queue was full and it was dropped"""
+        if self.ffmpeg_writer:
+            # ffmpeg is told the frames' channel order - no conversion needed
+            return self.out.write(frame)
+        if not self.reverse_BGR:
+            # reverse RGB it for the cv2 video writer if necessary
+            self.out.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+        else:
+            self.out.write(frame)
+        return True
+
+    def writer_info(self) -> dict|None:
+        """The ffmpeg writer's queued and dropped frames, None for other writers"""
+        if not self.ffmpeg_writer:
+            return None
+        return {'queue': self.out.queue_depth, 'dropped': self.out.dropped}
+
+    def image_info(self) -> dict|None:
+        """The image writers' queued, written and dropped frames, None without save_as_images"""
+        if not self.save_images:
+            return None
+        return {'queue': self.images.queue_depth, 'written': self.images.written, 'dropped': self.images.dropped}
+
+    def dropped(self) -> dict:
+        """The frames dropped by the image writers and the ffmpeg video writer, for the session log"""
+        dropped = {}
+        if self.save_images:
+            dropped['images'] = self.images.dropped
+        if self.ffmpeg_writer:
+            dropped['video'] = self.out.dropped
+        return dropped
+
+    def close(self):
+        if self.save_images:
+            # finish writing the pending images
+            self.images.close()
+        if self.save_vid:
+            # the camera was recording a video
+            self.out.release()
+        if self.save_raw:
+            self.raw.close()
@@ -0,0 +1,375 @@
+"""Cameras running in worker processes - configurators.Camera(engine='process').
+
+Every camera captures, converts and saves its frames in its own OS process, so its work competes neither
+for the main process' GIL nor with the py5 sketches' scheduling. Only the frame log (t_ms, #frame), the
+ring of recent frames and the preview come back to the main process, through shared memory.
+
+The workers are spawned processes, which import the task script before running the camera. Like any
+multiprocessing script, a task with engine='process' cameras has to start under if __name__ == '__main__':
+- Neurokraken() refuses to run inside a camera worker.
+"""
+
+import sys
+import time
+import threading
+import multiprocessing as mp
+from pathlib import Path
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+from core.print0 import print0
+from core.log_store import Log_History, Vid_Time_Row
+from core.camera_capture import Camera_Capture, Frame_Saver, Frame_Ring
+
+# int64 control slots at the start of the shared memory
+ACTIVE, QUITTING, SYNC_SEQ, T_SYNC_MS, T_SYNC_NS, FRAMERATE, WRITTEN, \
+    FRAME_STARTED, FRAME_PUBLISHED, PREVIEW_STARTED, PREVIEW_PUBLISHED, VID_QUEUE, VID_DROPPED, \
+    IMG_QUEUE, IMG_WRITTEN, IMG_DROPPED = range(16)
+NUM_CONTROLS = 16
+# (t_ms, #frame) entries the worker can log ahead of the relay
+LOG_RING_SIZE = 8192
+RELAY_INTERVAL_S = 0.01
+# process names of the camera workers
+WORKER_NAME_PREFIX = 'neurokraken_cam_'
+
+class Shared_Frames:
+    """numpy views of a camera's shared memory: control slots, the (t_ms, #frame) log ring, the slots of
+    the Frame_Ring and a double buffer of the preview.
+
+    Args:
+        buffer (memoryview): The shared memory's buffer
+        frame_slots (int): Slots of the Frame_Ring
+        frame_shape (tuple): Shape of a processed frame
+        frame_dtype (str): dtype of a processed frame
+        preview_shape (tuple): Shape of a preview
+    """
+    def __init__(self, buffer, frame_slots:int, frame_shape:tuple, frame_dtype:str, preview_shape:tuple):
+        offset = 0
+        def view(shape, dtype):
+            nonlocal offset
+            array = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            offset += array.nbytes
+            return array
+        self.control = view((NUM_CONTROLS,), np.int64)
+        self.log_ring = view((LOG_RING_SIZE, 2), np.int64)
+        self.frame_times = view((frame_slots,), np.int64)
+        self.frames = view((frame_slots, *frame_shape), frame_dtype)
+        self.previews = view((2, *preview_shape), frame_dtype)
+
+    @staticmethod
+    def size(frame_slots:int, frame_shape:tuple, frame_dtype:str, preview_shape:tuple) -> int:
+        itemsize = np.dtype(frame_dtype).itemsize
+        return 8 * (NUM_CONTROLS + 2 * LOG_RING_SIZE + frame_slots) + \
+               itemsize * (frame_slots * int(np.prod(frame_shape)) + 2 * int(np.prod(preview_shape)))
+
+    def attach_ring(self, ring:Frame_Ring):
+        ring.attach(self.frames, self.frame_times, self.control[FRAME_STARTED:FRAME_PUBLISHED + 1])
+
+    # the main process writes the task time with a perf_counter_ns stamp - guarded by a sequence number
+    def write_sync(self, active:bool, t_ms:int, t_ns:int):
+        control = self.control
+        control[SYNC_SEQ] += 1
+        control[ACTIVE], control[T_SYNC_MS], control[T_SYNC_NS] = active, t_ms, t_ns
+        control[SYNC_SEQ] += 1
+
+    def read_sync(self) -> tuple[bool, int, int]|None:
+        """(active, t_ms, perf_counter_ns at t_ms), None before the first sync"""
+        control = self.control
+        while True:
+            seq = int(control[SYNC_SEQ])
+            if seq == 0:
+                return None
+            if seq % 2 == 1:
+                continue
+            sync = bool(control[ACTIVE]), int(control[T_SYNC_MS]), int(control[T_SYNC_NS])
+            if control[SYNC_SEQ] == seq:
+                return sync
+
+    # the worker writes the previews into alternating slots
+    def publish(self, buffers:np.ndarray, started:int, published:int, image:np.ndarray):
+        control = self.control
+        n = int(control[published]) + 1
+        control[started] = n
+        buffers[n % 2] = image
+        control[published] = n
+
+    def latest(self, buffers:np.ndarray, started:int, published:int) -> np.ndarray:
+        """A copy of the most recently published image"""
+        control = self.control
+        while True:
+            n = int(control[published])
+            image = buffers[n % 2].copy()
+            # the copied slot is only rewritten for image n + 2
+            if control[started] <= n + 1:
+                return image
+
+def _capture_worker(properties, log_dir, pipe, condition, extrapolate_time:bool, verbose:int):
+    """The camera process: opens the camera, reports the frame shapes, then captures until quitting"""
+    print0.set_topic_threshold('camera', verbose)
+    try:
+        capture = Camera_Capture(properties)
+        first = None
+        t_start = time.perf_counter()
+        while first is None:
+            frame_read = capture.read()
+            if frame_read is not None:
+                first = capture.process(frame_read).get()
+            elif time.perf_counter() - t_start > 10:
+                raise RuntimeError(f'no frame received from camera {properties.name} within 10 s')
+        preview_size = (int(capture.width * properties.ui_view_scale), int(capture.height * properties.ui_view_scale))
+        preview_shape = cv2.resize(first, preview_size).shape
+        saver = Frame_Saver(properties, log_dir, capture.width, capture.height, capture.greyscaling,
+                            capture.reverse_BGR)
+    except Exception as e:
+        pipe.send(('error', repr(e)))
+        return
+    pipe.send(('shapes', first.shape, first.dtype.str, preview_shape))
+    shm = shared_memory.SharedMemory(name=pipe.recv(), track=False)
+    frame_ring = Frame_Ring(properties.recent_frames, condition)
+    shared = Shared_Frames(shm.buf, frame_ring.slots, first.shape, first.dtype.str, preview_shape)
+    shared.attach_ring(frame_ring)
+    control, ring = shared.control, shared.log_ring
+    pipe.close()
+
+    frame_ms = 1000 / properties.fps
+    current_frame, t_last_frame_while_inactive, num_captured = 0, -1000, 0
+    t_last_capture, framerate = None, 0.0
+    while not control[QUITTING]:
+        sync = shared.read_sync()
+        if sync is None:
+            time.sleep(0.001)
+            continue
+        active, t_sync_ms, t_sync_ns = sync
+        # the task time, advanced since its last sync by the (system wide) performance counter
+        t_ms = t_sync_ms + (time.perf_counter_ns() - t_sync_ns) // 1_000_000 if extrapolate_time else t_sync_ms
+
+        # frame capture timing as in Cam_Sketch.draw() - but sleeping until the next frame instead of polling
+        if active:
+            time_next_frame = current_frame * frame_ms
+            capture_frame = t_ms >= time_next_frame
+        else:
+            time_next_frame = t_last_frame_while_inactive + frame_ms
+            capture_frame = t_ms >= time_next_frame or time_next_frame - t_ms > 10_000
+            if capture_frame:
+                t_last_frame_while_inactive = t_ms
+        if not capture_frame:
+            time.sleep(min(max(time_next_frame - t_ms, 0.2), 5) / 1000)
+            continue
+
+        frame_read = capture.read()
+        if frame_read is None:
+            time.sleep(frame_ms / 10_000)
+            continue
+        frame = capture.process(frame_read)
+        image = frame.get()
+        frame_ring.push(image, t_ms)
+
+        if properties.ui_view_enabled and num_captured % properties.ui_view_step == 0:
+            preview = cv2.resize(frame, preview_size)
+            if capture.reverse_BGR and not capture.greyscaling:
+                preview = cv2.cvtColor(preview, cv2.COLOR_BGR2RGB)
+            shared.publish(shared.previews, PREVIEW_STARTED, PREVIEW_PUBLISHED, preview.get())
+        num_captured += 1
+
+        t_capture = time.perf_counter()
+        if t_last_capture is not None:
+            framerate = 0.9 * framerate + 0.1 / max(t_capture - t_last_capture, 1e-6)
+            control[FRAMERATE] = int(framerate * 1000)
+        t_last_capture = t_capture
+
+        if not active:
+            continue
+
+        written = int(control[WRITTEN])
+        ring[written % LOG_RING_SIZE] = t_ms, current_frame
+        control[WRITTEN] = written + 1
+
+        # Save the frame
+        if saver.save(image, current_frame, t_ms):
+            current_frame += 1
+        _publish_writer_counters(saver, control)
+
+    capture.close()
+    saver.close()
+    # the images written while closing
+    _publish_writer_counters(saver, control)
+    del frame_ring, shared, control, ring
+    shm.close()
+
+def _publish_writer_counters(saver:Frame_Saver, control:np.ndarray):
+    writer_info = saver.writer_info()
+    if writer_info is not None:
+        control[VID_QUEUE], control[VID_DROPPED] = writer_info['queue'], writer_info['dropped']
+    image_info = saver.image_info()
+    if image_info is not None:
+        control[IMG_QUEUE], control[IMG_WRITTEN], control[IMG_DROPPED] = \
+            image_info['queue'], image_info['written'], image_info['dropped']
+
+def in_camera_worker() -> bool:
+    """Whether this is a camera worker process, i.e. importing the task script before its capture starts"""
+    return mp.current_process().name.startswith(WORKER_NAME_PREFIX)
+
+class Cam_Process:
+    """A camera capturing in its own worker process, with the interface of Cam_Sketch.
+
+    The worker doesn't see the main loop's t_ms directly. A relay thread of the main process passes it
+    the current t_ms with a performance counter stamp every few milliseconds, from which the worker
+    advances the time itself (not with a virtual clock, which doesn't follow the wall clock).
+    The relay also moves the worker's (t_ms, #frame) entries into the log.
+
+    Args:
+        properties (configurators.Camera): The camera configuration
+        run_controls (Run_Controls): The task's start and end controls
+        log_dict (dict): log['cameras (t_ms/#frame/vid_time)']
+        time_ms (dict): serial_in['t_ms']
+        log_dir (str | None, optional): The session's log folder. Defaults to None.
+        threads_info (dict, optional): receives the capture framerate in ['framerate_cams'] and the writers' queues
+                                       in ['video_writers'] and ['image_writers']. Defaults to {}.
+        dropped_log (dict, optional): log['camera dropped frames'], receives the writers' dropped frames. Defaults to {}.
+        extrapolate_time (bool, optional): Advance t_ms between syncs by the wall clock. Defaults to True.
+        verbose (int, optional): print0 threshold of the 'camera' topic. Defaults to 3.
+    """
+    def __init__(self, properties, run_controls, log_dict:dict, time_ms:dict, log_dir=None,
+                 threads_info:dict={}, dropped_log:dict={}, extrapolate_time:bool=True, verbose=3):
+        self.log_list = log_dict.setdefault(f'{properties.name}', Log_History(
+            'i4', row_format=Vid_Time_Row(properties.fps)))
+        self.time_ms = time_ms
+        self.run_controls = run_controls
+        self.threads_info = threads_info
+        self.dropped_log = dropped_log
+        self.properties = properties
+
+        print0.set_topic_threshold('camera', verbose)
+        if properties.stream_active:
+            print0(f'streaming is not supported for cameras with engine="process" - {properties.name} will not stream',
+                   priority=1, color='red', topic='camera')
+        if properties.ui_view_enabled and properties.ui_view_format == 'py5':
+            print0(f'the preview of {properties.name} (engine="process") is a numpy array, not a py5 image',
+                   priority=2, color='yellow', topic='camera')
+
+        # spawn rather than fork - the parent may already run java (py5) or serial threads
+        context = mp.get_context('spawn')
+        pipe, child_pipe = context.Pipe()
+        # notified by the worker at every new frame, for wait_for_frame()
+        self.frame_ring = Frame_Ring(properties.recent_frames, context.Condition())
+        self.process = context.Process(target=_capture_worker, name=f'{WORKER_NAME_PREFIX}{properties.name}',
+                                       daemon=True, args=(properties, log_dir, child_pipe, self.frame_ring.condition,
+                                                          extrapolate_time, verbose))
+        # the worker imports the task script, whose 'neurokraken' has to be the package - not neurokraken.py of the
+        # package folder that neurokraken.py puts first on sys.path (see vector_env)
+        package_dir = str(Path(__file__).parent.parent.resolve())
+        original_path = list(sys.path)
+        sys.path[:] = [p for p in sys.path if p != package_dir] + [package_dir]
+        try:
+            self.process.start()
+        finally:
+            sys.path[:] = original_path
+        child_pipe.close()
+
+        try:
+            reply = pipe.recv()
+        except EOFError:
+            self.process.join()
+            raise RuntimeError(f'the worker process of camera {properties.name} ended while starting. Scripts with ' +
+                               'engine="process" cameras have to start the task under if __name__ == \'__main__\':')
+        if reply[0] == 'error':
+            self.process.join()
+            raise RuntimeError(f'camera {properties.name} failed to start: {reply[1]}')
+        _, frame_shape, frame_dtype, preview_shape = reply
+        # the main process owns the shared memory - it outlives the worker until the last entries are relayed
+        self.shm = shared_memory.SharedMemory(create=True, size=Shared_Frames.size(self.frame_ring.slots, frame_shape,
+                                                                                   frame_dtype, preview_shape))
+        self.shared = Shared_Frames(self.shm.buf, self.frame_ring.slots, frame_shape, frame_dtype, preview_shape)
+        self.shared.control[:] = 0
+        self.shared.attach_ring(self.frame_ring)
+        self.blank_frame = np.zeros(frame_shape, dtype=frame_dtype)
+        pipe.send(self.shm.name)
+        pipe.close()
+
+        self.relayed = 0
+        self.relay_thread = None
+
+    @property
+    def preview(self) -> np.ndarray:
+        """The latest preview (ui_view_enabled=True) as numpy array"""
+        if self.shared is None:
+            return self.last_preview
+        return self.shared.latest(self.shared.previews, PREVIEW_STARTED, PREVIEW_PUBLISHED)
+
+    def get_current_frame(self) -> np.ndarray:
+        """returns the last frame as a np.array"""
+        frame = self.frame_ring.copy_latest()
+        return frame if frame is not None else self.blank_frame
+
+    def run_sketch(self, block=False):
+        """Start relaying time and log entries - named like Sketch.run_sketch() to be started like a Cam_Sketch"""
+        # not a daemon - the interpreter awaits the worker's last frames and log entries before exiting
+        self.relay_thread = threading.Thread(target=self.relay, name=f'relay_cam_{self.properties.name}')
+        self.relay_thread.start()
+        if block:
+            self.relay_thread.join()
+
+    def relay(self):
+        control = self.shared.control
+        name = self.properties.name
+        while not self.run_controls.quitting and threading.main_thread().is_alive():
+            self.shared.write_sync(self.run_controls.active, self.time_ms['value'], time.perf_counter_ns())
+            self.drain()
+            self.threads_info['framerate_cams'][name] = int(control[FRAMERATE]) / 1000
+            self.report_writers()
+            if not self.process.is_alive():
+                print0(f'the process of camera {name} ended unexpectedly', priority=1, color='red', topic='camera')
+                break
+            time.sleep(RELAY_INTERVAL_S)
+
+        control[QUITTING] = 1
+        self.process.join(timeout=30)
+        if self.process.is_alive():
+            print0(f'camera {name} did not finish within 30 s - terminating its process',
+                   priority=1, color='red', topic='camera')
+            self.process.terminate()
+        self.drain()
+        self.report_writers()
+        # keep the recent frames readable after the shared memory is released
+        self.last_preview = self.preview
+        ring = self.frame_ring
+        ring.attach(ring.frames.copy(), ring.times.copy(), ring.counters.copy())
+        del control, ring
+        self.shared = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # views of camera_frames() are still referenced - the memory is released with them
+            pass
+        self.shm.unlink()
+
+    def report_writers(self):
+        """Pass the worker's counters of queued, written and dropped frames to threads_info and the log"""
+        control = self.shared.control
+        name, properties = self.properties.name, self.properties
+        dropped = {}
+        if properties.save_as_images:
+            self.threads_info.setdefault('image_writers', {})[name] = {'queue': int(control[IMG_QUEUE]),
+                                                                       'written': int(control[IMG_WRITTEN]),
+                                                                       'dropped': int(control[IMG_DROPPED])}
+            dropped['images'] = int(control[IMG_DROPPED])
+        if properties.save_as_vid and not properties.save_as_raw and properties.vid_writer == 'ffmpeg':
+            self.threads_info.setdefault('video_writers', {})[name] = {'queue': int(control[VID_QUEUE]),
+                                                                       'dropped': int(control[VID_DROPPED])}
+            dropped['video'] = int(control[VID_DROPPED])
+        if dropped:
+            self.dropped_log[name] = dropped
+
+    def drain(self):
+        """Move the worker's new (t_ms, #frame) entries into the log"""
+        written = int(self.shared.control[WRITTEN])
+        if written == self.relayed:
+            return
+        if written - self.relayed > LOG_RING_SIZE:
+            print0(f'camera {self.properties.name} logged {written - self.relayed - LOG_RING_SIZE} frames faster than '
+                   'they could be relayed - their log entries are lost', priority=1, color='red', topic='camera')
+            self.relayed = written - LOG_RING_SIZE
+        indices = np.arange(self.relayed, written) % LOG_RING_SIZE
+        entries = self.shared.log_ring[indices]
+        self.log_list.extend_arrays(entries[:, 0].astype(np.int32), entries[:, 1].astype(np.int32))
+        self.relayed = written
@@ -0,0 +1,182 @@
+"""Image sequence writing - configurators.Camera(save_as_images=True).
+
+Frames are handed to a small pool of writer threads through a bounded queue. The capture loop never waits
+for a write: when the queue is full the frame is dropped and counted. Workers take every frame waiting in
+the queue (up to a batch) per wake-up.
+
+Formats:
+    'png': lossless, but its compression is the slowest format
+    'tiff': uncompressed TIFF, the fastest single image format
+    'jpg': JPEG with image_jpeg_quality - small files, lossy
+    'npy': frames copied into chunks of image_chunk_frames frames, each saved as one .npy file named like
+           its first frame (np.load(path) returns an array of shape (frames, height, width[, 3]))
+
+Naming:
+    'vid_time': '<frame number>_<video time>', i.e. '1234_0h;0m;41s;133ms.png' (':' is no valid file name character)
+    'index': the zero padded frame number, i.e. '001234.png' - sorts by name. The task time and video time of a
+             frame number are in the camera's log.
+"""
+
+import os
+import queue
+import threading
+import numpy as np
+import cv2
+from core.print0 import print0
+from core.log_store import vid_time
+
+IMAGE_FORMATS = ('png', 'tiff', 'jpg', 'npy')
+IMAGE_NAMINGS = ('vid_time', 'index')
+# frames a worker takes from the queue per wake-up
+BATCH_SIZE = 16
+
+def default_workers() -> int:
+    """Half the CPUs, up to 8 - the capture, main loop and video encoding need the rest"""
+    return min(8, max(1, (os.cpu_count() or 2) // 2))
+
+class Image_Sequence_Writer:
+    """Write frames as numbered files in worker threads.
+
+    Args:
+        folder (str): The folder of the images
+        image_format (str, optional): 'png', 'tiff', 'jpg' or 'npy'. Defaults to 'png'.
+        naming (str, optional): 'vid_time' or 'index' file names. Defaults to 'vid_time'.
+        fps (float, optional): The frame rate for the video times of naming='vid_time'. Defaults to 30.
+        jpeg_quality (int, optional): The JPEG quality 0-100 with image_format='jpg'. Defaults to 95.
+        chunk_frames (int, optional): Frames per .npy file with image_format='npy'. Defaults to 100.
+        queue_size (int, optional): Frames waiting for a writer before new frames are dropped. With 'npy'
+                                    two full chunks can wait instead. Defaults to 64.
+        workers (int | None, optional): Writer threads, None for half the CPUs (up to 8). Defaults to None.
+    """
+    def __init__(self, folder:str, image_format:str='png', jpeg_quality:int=95, chunk_frames:int=100,
+                 queue_size:int=64, workers:int|None=None, naming:str='vid_time', fps:float=30):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f'image_format must be one of {IMAGE_FORMATS}, not {image_format!r}')
+        if naming not in IMAGE_NAMINGS:
+            raise ValueError(f'naming must be one of {IMAGE_NAMINGS}, not {naming!r}')
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.image_format = image_format
+        self.naming = naming
+        self.fps = fps
+        # cv2 compresses TIFF with LZW unless told otherwise
+        self.params = {'jpg': [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality],
+                       'tiff': [cv2.IMWRITE_TIFF_COMPRESSION, 1]}.get(image_format, [])
+        self.chunk_frames = max(chunk_frames, 1)
+        self.written = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+        if image_format == 'npy':
+            # a chunk fills in the capture loop while the previous ones are saved - the chunk is the work item
+            self.queue:queue.Queue = queue.Queue()
+            # the chunk buffers, allocated with the first frame
+            self.free_chunks:queue.Queue|None = None
+            self.chunk:np.ndarray|None = None
+            self.chunk_start = 0
+            self.chunk_rows = 0
+            workers = 1 if workers is None else workers
+        else:
+            self.queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.threads = [threading.Thread(target=self.work, name=f'image_writer_{i}', daemon=True)
+                        for i in range(workers or default_workers())]
+        for thread in self.threads:
+            thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """Frames waiting to be written"""
+        if self.image_format == 'npy':
+            return self.queue.qsize() * self.chunk_frames + self.chunk_rows
+        return self.queue.qsize()
+
+    def write(self, frame:np.ndarray, frame_idx:int) -> bool:
+        """Queue the frame as number frame_idx. Returns False if it was dropped"""
+        if self.image_format == 'npy':
+            return self.add_to_chunk(frame, frame_idx)
+        try:
+            self.queue.put_nowait((frame_idx, frame))
+        except queue.Full:
+            self.drop()
+            return False
+        return True
+
+    def add_to_chunk(self, frame:np.ndarray, frame_idx:int) -> bool:
+        if self.free_chunks is None:
+            # one chunk filling and up to two being saved
+            self.free_chunks = queue.Queue()
+            for _ in range(3):
+                self.free_chunks.put(np.empty((self.chunk_frames, *frame.shape), dtype=frame.dtype))
+        if self.chunk is None:
+            try:
+                self.chunk = self.free_chunks.get_nowait()
+            except queue.Empty:
+                # every chunk is still being saved
+                self.drop()
+                return False
+            self.chunk_start, self.chunk_rows = frame_idx, 0
+        self.chunk[self.chunk_rows] = frame
+        self.chunk_rows += 1
+        if self.chunk_rows == self.chunk_frames:
+            self.submit_chunk()
+        return True
+
+    def submit_chunk(self):
+        self.queue.put((self.chunk_start, self.chunk, self.chunk_rows))
+        self.chunk, self.chunk_rows = None, 0
+
+    def drop(self):
+        if self.dropped == 0:
+            print0(f'the image writers of {self.folder} fall behind - frames are dropped',
+                   priority=1, color='red', topic='camera')
+        self.dropped += 1
+
+    def work(self):
+        """A writer thread: write batches of the queued frames until close()"""
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    # let the other workers see the end too
+                    self.queue.put(None)
+                    continue
+                written = self.write_chunk(*item) if self.image_format == 'npy' else self.write_image(*item)
+                with self.lock:
+                    self.written += written
+            if None in batch:
+                return
+
+    def file_name(self, frame_idx:int) -> str:
+        if self.naming == 'index':
+            return f'{frame_idx:06d}.{self.image_format}'
+        return f'{frame_idx}_{vid_time(frame_idx, self.fps)}.{self.image_format}'.replace(':', ';')
+
+    def write_image(self, frame_idx:int, frame:np.ndarray) -> int:
+        path = os.path.join(self.folder, self.file_name(frame_idx))
+        if not cv2.imwrite(path, frame, self.params):
+            print0(f'failed to write {path}', priority=1, color='red', topic='camera')
+            return 0
+        return 1
+
+    def write_chunk(self, chunk_start:int, chunk:np.ndarray, rows:int) -> int:
+        np.save(os.path.join(self.folder, self.file_name(chunk_start)), chunk[:rows])
+        self.free_chunks.put(chunk)
+        return rows
+
+    def close(self):
+        """Write the queued frames and end the writer threads"""
+        if self.image_format == 'npy' and self.chunk is not None:
+            self.submit_chunk()
+        self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        # the end marker passed on by the last worker
+        self.queue.get_nowait()
+        if self.dropped != 0:
+            print0(f'{self.dropped} frames were dropped from {self.folder} because the image writers could not keep up',
+                   priority=1, color='red', topic='camera')
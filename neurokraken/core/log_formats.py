@@ -0,0 +1,352 @@
+"""Serializers for saving the session log, selected with Neurokraken(log_format=...).
+
+    'json'      log.json with indent=2, readable by everything (default)
+    'json.gz'   compact JSON, gzip compressed
+    'json.zst'  compact JSON, Zstandard compressed - requires the zstandard package
+    'msgpack'   MessagePack - requires the msgpack package
+    'npz'       NumPy archive: every numeric history as a times and a values array, everything else as JSON
+    'pickle'    python pickle with histories as plain lists
+
+A Log_Saver writes the log with one of them in a worker thread and reports the progress. load_log() reads
+any of them back into the dict json.load() gives for a log.json. Own formats can be provided as a
+Log_Serializer subclass instance instead of a name.
+"""
+
+import json, gzip, pickle, time, zipfile
+import numpy as np
+from pathlib import Path
+from threading import Thread
+from typing import Callable
+from core.log_store import Log_History, row_format_spec, row_format_from, to_builtin
+from core.print0 import print0
+
+class Log_Serializer:
+    """Writes a log to a file. Subclasses set the file suffix and implement write()"""
+    suffix = '.json'
+
+    def write(self, log:dict, file_path:Path, progress:Callable[[float], None]):
+        """Write the log to file_path, calling progress() with the written fraction (0 to 1) along the way"""
+        raise NotImplementedError
+
+    def load(self, file_path:Path) -> dict:
+        """Read a written log back as the dict json.load() gives for a log.json"""
+        raise NotImplementedError
+
+    def check(self):
+        """Raise an error if the format can't be written, i.e. a missing package - called before the session starts
+        instead of failing at its end"""
+        pass
+
+def _rows(item) -> int:
+    # the work of serializing a log item, for progress reporting
+    if isinstance(item, (Log_History, list)):
+        return len(item) + 1
+    if isinstance(item, dict):
+        return sum(_rows(v) for v in item.values()) + 1
+    return 1
+
+def _weighted(log:dict, progress:Callable[[float], None]):
+    """The log's items, calling progress() with the fraction of the log's rows before each item"""
+    items = list(log.items())
+    total, done = max(1, sum(_rows(item) for _, item in items)), 0
+    for key, item in items:
+        progress(done / total)
+        yield key, item
+        done += _rows(item)
+    progress(1.0)
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("log_format 'json.zst' requires the zstandard package - pip install zstandard") from None
+    return zstandard
+
+class Json_Serializer(Log_Serializer):
+    """JSON, with indentation or compact and compressed.
+
+    Args:
+        indent (int | None, optional): Indentation, None for compact JSON. Defaults to 2.
+        compression (str | None, optional): None, 'gzip' or 'zstd'. Defaults to None.
+        level (int | None, optional): Compression level. Defaults to a fast level.
+    """
+    def __init__(self, indent:int|None=2, compression:str|None=None, level:int|None=None):
+        self.indent = indent
+        self.compression = compression
+        self.level = level
+        self.suffix = {None: '.json', 'gzip': '.json.gz', 'zstd': '.json.zst'}[compression]
+
+    def open(self, file_path:Path, mode:str):
+        if self.compression == 'gzip':
+            return gzip.open(file_path, mode + 't', encoding='utf-8',
+                             compresslevel=self.level if self.level is not None else 3)
+        if self.compression == 'zstd':
+            zstandard = _zstandard()
+            if mode == 'w':
+                compressor = zstandard.ZstdCompressor(level=self.level if self.level is not None else 3)
+                return _Text_Stream(compressor.stream_writer(open(file_path, 'wb')))
+            return _Text_Stream(zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb')))
+        return open(file_path, mode, encoding='utf-8')
+
+    def check(self):
+        if self.compression == 'zstd':
+            _zstandard()
+
+    def write(self, log:dict, file_path:Path, progress:Callable[[float], None]):
+        # encoded item by item for progress reports - the result equals a single json.dump()
+        separators = None if self.indent is not None else (',', ':')
+        with self.open(file_path, 'w') as f:
+            first = True
+            for key, item in _weighted(log, progress):
+                if self.indent is None:
+                    text = ('{' if first else ',') + json.dumps(key) + ':' + \
+                           json.dumps(item, separators=separators, default=to_builtin)
+                else:
+                    # the item at the nesting level of the whole log
+                    text = json.dumps({key: item}, indent=self.indent, default=to_builtin)[1:-2]
+                    text = ('{' if first else ',') + text
+                f.write(text)
+                first = False
+            f.write('{}' if first else ('\n}' if self.indent is not None else '}'))
+
+    def load(self, file_path:Path) -> dict:
+        with self.open(file_path, 'r') as f:
+            return json.load(f)
+
+class _Text_Stream:
+    """Text access to a binary zstandard stream"""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text:str):
+        self.stream.write(text.encode('utf-8'))
+
+    def read(self, size:int=-1) -> str:
+        chunks = []
+        while chunk := self.stream.read(1 << 20):
+            chunks.append(chunk)
+        return b''.join(chunks).decode('utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stream.close()
+
+class Msgpack_Serializer(Log_Serializer):
+    """MessagePack, a binary JSON equivalent - tuples are saved as lists as in JSON"""
+    suffix = '.msgpack'
+
+    def msgpack(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("log_format 'msgpack' requires the msgpack package - pip install msgpack") from None
+        return msgpack
+
+    def check(self):
+        self.msgpack()
+
+    def write(self, log:dict, file_path:Path, progress:Callable[[float], None]):
+        msgpack = self.msgpack()
+        packer = msgpack.Packer(default=to_builtin)
+        items = list(log.items())
+        with open(file_path, 'wb') as f:
+            f.write(packer.pack_map_header(len(items)))
+            for key, item in _weighted(dict(items), progress):
+                f.write(packer.pack(key))
+                f.write(packer.pack(item))
+
+    def load(self, file_path:Path) -> dict:
+        with open(file_path, 'rb') as f:
+            return self.msgpack().unpack(f, strict_map_key=False)
+
+class Npz_Serializer(Log_Serializer):
+    """NumPy .npz archive. Numeric histories are saved as '<n>.times' and '<n>.values' arrays in their
+    column dtypes, loadable without parsing, the rest of the log as JSON in the '__log__' array with
+    the paths of the histories in its '__arrays__' entry and the order of the log's keys in '__order__'.
+
+    Args:
+        compress (bool, optional): zip compress the arrays. Smaller, but far slower to save. Defaults to False.
+    """
+    suffix = '.npz'
+
+    def __init__(self, compress:bool=False):
+        self.compress = compress
+
+    def write(self, log:dict, file_path:Path, progress:Callable[[float], None]):
+        rest, columns = {}, []
+        for key, item in list(log.items()):
+            if isinstance(item, dict) and len(item) != 0 and any(self.is_column(v) for v in item.values()):
+                rest[key] = {}
+                for name, history in list(item.items()):
+                    if self.is_column(history):
+                        columns.append(([key, name], history))
+                    else:
+                        rest[key][name] = history
+            elif self.is_column(item):
+                columns.append(([key], item))
+            else:
+                rest[key] = item
+
+        arrays_info = []
+        total, done = max(1, sum(len(history) for _, history in columns) + _rows(rest)), 0
+        compression = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        with zipfile.ZipFile(file_path, 'w', compression=compression, allowZip64=True) as archive:
+            for index, (path, history) in enumerate(columns):
+                progress(done / total)
+                times, values = history.times, history.values
+                info = {'path': path, 'index': index, 'num_values': history.num_values,
+                        'row_format': row_format_spec(history.row_format)}
+                self.write_array(archive, f'{index}.times', times)
+                if values is not None:
+                    self.write_array(archive, f'{index}.values', values)
+                info['has_values'] = values is not None
+                arrays_info.append(info)
+                done += len(history)
+            progress(done / total)
+            rest['__arrays__'] = arrays_info
+            rest['__order__'] = list(log.keys())
+            text = json.dumps(rest, separators=(',', ':'), default=to_builtin)
+            self.write_array(archive, '__log__', np.frombuffer(text.encode('utf-8'), dtype=np.uint8))
+        progress(1.0)
+
+    def is_column(self, item) -> bool:
+        return isinstance(item, Log_History) and (not item.has_values or item.values.dtype != object)
+
+    def write_array(self, archive:zipfile.ZipFile, name:str, array:np.ndarray):
+        with archive.open(name + '.npy', 'w', force_zip64=True) as f:
+            np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+
+    def load(self, file_path:Path) -> dict:
+        with np.load(file_path, allow_pickle=False) as archive:
+            log = json.loads(archive['__log__'].tobytes().decode('utf-8'))
+            arrays_info = log.pop('__arrays__')
+            order = log.pop('__order__')
+            for info in arrays_info:
+                times = archive[f'{info["index"]}.times'].tolist()
+                if not info['has_values']:
+                    items = times
+                else:
+                    items = [list(row) for row in zip(times, archive[f'{info["index"]}.values'].tolist())]
+                    row_format = row_format_from(info['row_format'])
+                    if row_format is not None:
+                        items = [list(row_format(t, v)) for t, v in items]
+                parent = log
+                for key in info['path'][:-1]:
+                    parent = parent.setdefault(key, {})
+                parent[info['path'][-1]] = items
+        # the original order of the log's keys
+        return {key: log[key] for key in order if key in log}
+
+class Pickle_Serializer(Log_Serializer):
+    """python pickle - fast, but only readable with python and unsafe to load from untrusted sources"""
+    suffix = '.pickle'
+
+    def write(self, log:dict, file_path:Path, progress:Callable[[float], None]):
+        progress(0.0)
+        with open(file_path, 'wb') as f:
+            pickle.dump(log, f, protocol=pickle.HIGHEST_PROTOCOL)
+        progress(1.0)
+
+    def load(self, file_path:Path) -> dict:
+        with open(file_path, 'rb') as f:
+            return json.loads(json.dumps(pickle.load(f)))
+
+LOG_FORMATS:dict[str, Callable[[], Log_Serializer]] = {
+    'json': lambda: Json_Serializer(indent=2),
+    'json.gz': lambda: Json_Serializer(indent=None, compression='gzip'),
+    'json.zst': lambda: Json_Serializer(indent=None, compression='zstd'),
+    'msgpack': lambda: Msgpack_Serializer(),
+    'npz': lambda: Npz_Serializer(),
+    'pickle': lambda: Pickle_Serializer(),
+}
+
+def serializer_for(log_format:'str|Log_Serializer') -> Log_Serializer:
+    """The serializer of a log format name (see LOG_FORMATS, a leading '.' is ignored) or the provided serializer"""
+    if isinstance(log_format, Log_Serializer):
+        return log_format
+    name = log_format.lstrip('.')
+    if name not in LOG_FORMATS:
+        raise ValueError(f'unknown log_format {log_format!r} - available are {list(LOG_FORMATS)} or a Log_Serializer')
+    return LOG_FORMATS[name]()
+
+def find_log(folder:str|Path, filename:str='log') -> Path|None:
+    """The saved log file in a session folder in any of the LOG_FORMATS, None if there is none"""
+    for name in LOG_FORMATS:
+        file_path = Path(folder) / (filename + serializer_for(name).suffix)
+        if file_path.is_file():
+            return file_path
+    return None
+
+def load_log(file_path:str|Path) -> dict:
+    """Load a log saved in any of the LOG_FORMATS, or the log file in a session folder
+
+    Args:
+        file_path (str | Path): The log file, or the session folder containing it
+
+    Returns:
+        dict: the log as json.load() gives it for a log.json
+    """
+    file_path = Path(file_path)
+    if file_path.is_dir():
+        found = find_log(file_path)
+        if found is None:
+            raise FileNotFoundError(f'no saved log in {file_path}')
+        file_path = found
+    # the longest matching suffix - .json.gz before .json
+    for name in sorted(LOG_FORMATS, key=lambda name: -len(serializer_for(name).suffix)):
+        serializer = serializer_for(name)
+        if file_path.name.endswith(serializer.suffix):
+            return serializer.load(file_path)
+    raise ValueError(f'{file_path.name} is not in one of the log formats {list(LOG_FORMATS)}')
+
+class Log_Saver:
+    """Writes the log with a serializer in a worker thread and reports the progress.
+
+    Args:
+        log (dict): The session log
+        file_path (Path): The file to write
+        serializer (Log_Serializer): The format to write
+        report_after_s (float, optional): Progress is printed when writing takes longer than this. Defaults to 1.0.
+    """
+    def __init__(self, log:dict, file_path:Path, serializer:Log_Serializer, report_after_s:float=1.0):
+        self.log = log
+        self.file_path = Path(file_path)
+        self.serializer = serializer
+        self.report_after_s = report_after_s
+        self.progress = 0.0
+        """fraction of the log written, 0 to 1"""
+        self.done = False
+        self.thread:Thread|None = None
+        self.t_start = 0.0
+        self.t_reported = 0.0
+
+    def start(self):
+        """Write the log in a worker thread. It is no daemon - the interpreter waits for the file before exiting"""
+        self.thread = Thread(target=self.save, name='log_saver')
+        self.thread.start()
+        return self
+
+    def join(self, timeout_s:float|None=None):
+        if self.thread is not None:
+            self.thread.join(timeout_s)
+
+    def report(self, progress:float):
+        self.progress = progress
+        t_now = time.perf_counter()
+        if t_now - self.t_start > self.report_after_s and t_now - self.t_reported > self.report_after_s and progress < 1:
+            self.t_reported = t_now
+            print0(f'saving {self.file_path.name}: {progress:.0%}', priority=2, color='blue', topic='configuration')
+
+    def save(self):
+        """Write the log in the calling thread"""
+        self.t_start = self.t_reported = time.perf_counter()
+        try:
+            self.serializer.write(self.log, self.file_path, self.report)
+        except Exception as e:
+            print0(f'saving {self.file_path.name} failed: {e}', priority=1, color='red', topic='configuration')
+            raise
+        self.done = True
+        print0(f'saved {self.file_path.name} ({self.file_path.stat().st_size / 1e6:.1f} MB) in ' +
+               f'{time.perf_counter() - self.t_start:.2f} s', priority=3, color='blue', topic='configuration')
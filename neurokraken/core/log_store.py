@@ -0,0 +1,467 @@
+"""Columnar in-memory storage of the log's histories.
+
+A list of (t, value) tuples costs more than 100 bytes per entry. Log_History keeps the times and values of
+a history in typed numpy columns instead (i.e. 4 + 2 bytes for an analog_read entry), while still behaving
+like the list for reading: len(), indexing, slicing and iterating return the same (t, value) tuples.
+
+Entries appended one by one are collected in a small python list and moved into the columns in chunks,
+so appending costs about as much as a list.append(). Decoded archivist histories are copied in as whole
+arrays with extend_arrays(). Histories are written by a single thread (the main loop, the networker or
+a camera) and can be read from any other thread.
+"""
+
+import math
+import numpy as np
+from bisect import bisect_right
+from operator import itemgetter
+from typing import Callable
+
+# entries collected before they are moved into the columns
+CHUNK = 1024
+# shorter extend_arrays() go through the pending list - copying few entries into numpy columns costs more
+SMALL_EXTEND = 16
+# smallest column capacity - capacities double as histories grow
+MIN_CAPACITY = 4096
+
+_entry_time = itemgetter(0)
+
+def search_times(times:np.ndarray, t:float, side:str='right') -> int:
+    """np.searchsorted(times, t, side) of an integer time column. The key is converted to the column's dtype -
+    searching with a python int would convert the whole column to int64 first, turning an O(log n) search into O(n)"""
+    if times.dtype.kind in 'iu':
+        info = np.iinfo(times.dtype)
+        if t < info.min:
+            return 0
+        if t > info.max:
+            return len(times)
+        # the same position for a fractional t
+        t = times.dtype.type(math.floor(t) if side == 'right' else math.ceil(t))
+    return int(np.searchsorted(times, t, side=side))
+
+def entry_dtype(entry:dict) -> np.dtype:
+    """The smallest numpy dtype holding a serial_in/serial_out entry's integer values. Histories switch to the
+    values' own dtype for other values, i.e. floats of keyboard controls or bools"""
+    itemsize = 1
+    while itemsize < entry['byte_length']:
+        itemsize *= 2
+    signed = entry['encoding'] == int
+    return np.dtype(f'{"i" if signed else "u"}{itemsize}')
+
+_fits:dict[tuple[np.dtype, np.dtype], bool] = {}
+
+def fits(new:np.dtype, column:np.dtype) -> bool:
+    """Whether a column of dtype column can take values of dtype new without widening"""
+    result = _fits.get((new, column))
+    if result is None:
+        result = _fits[(new, column)] = (np.can_cast(new, column, casting='same_kind') and
+                                         not (new.itemsize > column.itemsize and new.kind in 'iu') and
+                                         # bools stay bools - an int column would turn them into 0/1
+                                         (new.kind == 'b') == (column.kind == 'b'))
+    return result
+
+def joined_dtype(column:np.dtype, new:np.dtype, filled:int) -> np.dtype:
+    """The dtype of a column of filled entries of dtype column, continued with entries of dtype new"""
+    if fits(new, column):
+        return column
+    if filled == 0:
+        # nothing stored yet - the declared dtype gives way to the values' own
+        return new
+    if new.kind == 'O' or column.kind == 'O' or (new.kind == 'b') != (column.kind == 'b'):
+        # i.e. bools after ints - kept as they were logged
+        return np.dtype(object)
+    return np.result_type(column, new)
+
+def join(column:np.ndarray, new:np.ndarray) -> np.ndarray:
+    """column followed by new, in their joined_dtype()"""
+    return np.concatenate((column, new), dtype=joined_dtype(column.dtype, new.dtype, len(column)))
+
+def builtin(value):
+    """A value read from a column as python value - object columns already hold them"""
+    return value.tolist() if isinstance(value, (np.ndarray, np.generic)) else value
+
+class Log_History:
+    """A growable history of (t, value) entries stored in typed numpy columns with list-like read access.
+
+    Args:
+        value_dtype (np.dtype | str | None, optional): dtype of the values. None stores times only and the
+            entries are plain ints, like log['t_main_loop']. Defaults to None.
+        num_values (int, optional): Values per entry of multi-value sensors, which are provided as lists. Defaults to 1.
+        row_format (Callable[[int, int], tuple] | None, optional): Turns a stored (t, value) into the entry returned
+            when reading, i.e. to add columns derived from the value. Defaults to None.
+    """
+    def __init__(self, value_dtype:np.dtype|str|None=None, num_values:int=1,
+                 row_format:Callable[[int, int], tuple]|None=None):
+        self.time_dtype = np.dtype('i4')
+        self.value_dtype = np.dtype(value_dtype) if value_dtype is not None else None
+        self.num_values = num_values
+        self.row_format = row_format
+        self.has_values = value_dtype is not None
+        times = np.empty(0, dtype=self.time_dtype)
+        values = self.empty_values(0) if self.has_values else None
+        # (times, values, number of filled rows, pending entries) - replaced as a whole by the writer
+        # so readers always see consistent columns
+        self.pending:list = []
+        self.view:tuple[np.ndarray, np.ndarray|None, int, list] = (times, values, 0, self.pending)
+
+    @classmethod
+    def for_entry(cls, entry:dict) -> 'Log_History':
+        """An empty history for the values of a serial_in/serial_out entry"""
+        num_values = len(entry['value']) if type(entry['value']) == list else 1
+        return cls(entry_dtype(entry), num_values)
+
+    def empty_values(self, capacity:int) -> np.ndarray:
+        shape = (capacity,) if self.num_values == 1 else (capacity, self.num_values)
+        return np.empty(shape, dtype=self.value_dtype)
+
+    #------------------------- WRITING -------------------------
+
+    def append(self, entry):
+        """Add a (t, value) entry, or a t for histories without values"""
+        pending = self.pending
+        pending.append(entry)
+        if len(pending) >= CHUNK:
+            self.flush()
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def extend_arrays(self, times:np.ndarray, values:np.ndarray|None=None):
+        """Add whole columns of entries, i.e. a decoded archivist history"""
+        pending = self.pending
+        if len(times) < SMALL_EXTEND:
+            pending.extend(zip(times.tolist(), values.tolist()) if values is not None else times.tolist())
+            if len(pending) >= CHUNK:
+                self.flush()
+            return
+        if len(pending) != 0:
+            self.flush()
+        self.write(times, values)
+
+    def flush(self):
+        """Move the pending entries into the columns"""
+        pending = self.pending
+        if len(pending) == 0:
+            return
+        if self.has_values:
+            times, values = zip(*pending)
+            self.write(self.to_array(times, self.view[0].dtype), self.to_array(values, self.view[1].dtype))
+        else:
+            self.write(self.to_array(pending, self.view[0].dtype), None)
+
+    def to_array(self, entries, dtype:np.dtype) -> np.ndarray:
+        """The entries as array of the column's dtype where their values fit it, else of their own dtype
+        (i.e. float64 for floats or int64 for values outside of the entry's byte_length) to widen the column"""
+        try:
+            array = np.asarray(entries)
+        except (OverflowError, ValueError):
+            # i.e. ints beyond int64 or multi-value entries of differing lengths
+            array = None
+        if array is None or array.dtype.kind not in 'biuf':
+            # strings (numpy would turn numbers logged with them into strings too) or other python objects
+            array = np.empty(len(entries), dtype=object)
+            for i, entry in enumerate(entries):
+                array[i] = entry
+            return array
+        if array.dtype.kind in 'iu' and dtype.kind in 'iu' and array.dtype != dtype and len(array) != 0:
+            info = np.iinfo(dtype)
+            if info.min <= array.min() and array.max() <= info.max:
+                return array.astype(dtype)
+        return array
+
+    def write(self, new_times:np.ndarray, new_values:np.ndarray|None):
+        times, values, filled, _ = self.view
+        end = filled + len(new_times)
+        if end == filled:
+            return
+        if end > len(times) or not fits(new_times.dtype, times.dtype):
+            times = self.fit(times, new_times, filled)
+        times[filled:end] = new_times
+        if values is not None:
+            if end > len(values) or not fits(new_values.dtype, values.dtype):
+                values = self.fit(values, new_values, filled)
+            values[filled:end] = new_values
+        self.pending = []
+        self.view = (times, values, end, self.pending)
+
+    def fit(self, column:np.ndarray, new:np.ndarray, filled:int) -> np.ndarray:
+        """The column, grown and widened as needed to take the new entries after the filled rows"""
+        dtype = joined_dtype(column.dtype, new.dtype, filled)
+        capacity = len(column)
+        if filled + len(new) > capacity or dtype != column.dtype:
+            capacity = max(MIN_CAPACITY, capacity)
+            while capacity < filled + len(new):
+                capacity *= 2
+            grown = np.empty((capacity, *column.shape[1:]), dtype=dtype)
+            grown[:filled] = column[:filled]
+            column = grown
+        return column
+
+    #------------------------- READING -------------------------
+
+    @property
+    def times(self) -> np.ndarray:
+        """All times as an array"""
+        times, _, filled, pending = self.view
+        if len(pending) == 0:
+            return times[:filled]
+        pending_times = [entry[0] for entry in pending] if self.has_values else pending
+        return join(times[:filled], self.to_array(pending_times, times.dtype))
+
+    @property
+    def values(self) -> np.ndarray|None:
+        """All values as an array (None for histories without values)"""
+        _, values, filled, pending = self.view
+        if not self.has_values:
+            return None
+        if len(pending) == 0:
+            return values[:filled]
+        return join(values[:filled], self.to_array([entry[1] for entry in pending], values.dtype))
+
+    def rows_since(self, start:int) -> tuple[np.ndarray, np.ndarray|None]:
+        """The times and values of the entries from index start on, i.e. to stream new entries to a file"""
+        times, values, filled, pending = self.view
+        pending = pending[max(0, start - filled):]
+        new_times = times[start:filled]
+        new_values = values[start:filled] if values is not None else None
+        if len(pending) == 0:
+            return new_times, new_values
+        if not self.has_values:
+            return join(new_times, self.to_array(pending, times.dtype)), None
+        pending_times, pending_values = zip(*pending)
+        return (join(new_times, self.to_array(pending_times, times.dtype)),
+                join(new_values, self.to_array(pending_values, values.dtype)))
+
+    def entry_at(self, t:int):
+        """The most recent stored (t, value) entry at or before t, without row_format (the time for histories
+        without values). None before the first entry. A binary search, usable while the history grows"""
+        times, values, filled, pending = self.view
+        if len(pending) != 0 and t >= (pending[0][0] if self.has_values else pending[0]):
+            return pending[bisect_right(pending, t, key=_entry_time if self.has_values else None) - 1]
+        i = search_times(times[:filled], t) - 1
+        if i < 0:
+            return None
+        if not self.has_values:
+            return times[i].item()
+        return (times[i].item(), builtin(values[i]))
+
+    def row(self, times:np.ndarray, values:np.ndarray|None, i:int):
+        if not self.has_values:
+            return times[i].item()
+        if self.row_format is not None:
+            return self.row_format(times[i].item(), builtin(values[i]))
+        return (times[i].item(), builtin(values[i]))
+
+    def to_list(self) -> list:
+        """The history as a list of entries, as saved to the log file"""
+        times, values, filled, pending = self.view
+        if not self.has_values:
+            entries = times[:filled].tolist()
+        elif self.row_format is not None:
+            entries = [self.row_format(t, v) for t, v in zip(times[:filled].tolist(), values[:filled].tolist())]
+        else:
+            entries = list(zip(times[:filled].tolist(), values[:filled].tolist()))
+        if self.row_format is not None:
+            return entries + [self.row_format(*entry) for entry in pending]
+        return entries + pending
+
+    def __len__(self) -> int:
+        _, _, filled, pending = self.view
+        return filled + len(pending)
+
+    def __getitem__(self, index):
+        times, values, filled, pending = self.view
+        if index == -1 and len(pending) != 0:
+            # the most common access - comparing with the last entry
+            return pending[-1] if self.row_format is None else self.row_format(*pending[-1])
+        if isinstance(index, slice):
+            return [self.row(times, values, i) if i < filled else self.pending_row(pending[i - filled])
+                    for i in range(*index.indices(filled + len(pending)))]
+        if index < 0:
+            index += filled + len(pending)
+        if index < 0 or index >= filled + len(pending):
+            raise IndexError('log history index out of range')
+        if index >= filled:
+            return self.pending_row(pending[index - filled])
+        return self.row(times, values, index)
+
+    def pending_row(self, entry):
+        if self.row_format is not None:
+            return self.row_format(*entry)
+        return entry
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __bool__(self) -> bool:
+        return len(self) != 0
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Log_History):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def __repr__(self) -> str:
+        return f'Log_History({len(self)} entries)'
+
+    def __reduce__(self):
+        # pickled logs contain plain lists, readable without neurokraken
+        return (list, (self.to_list(),))
+
+class Vid_Time_Row:
+    """row_format of camera frame histories - adds the frame's video time to the stored (t_ms, #frame)"""
+    def __init__(self, fps:float):
+        self.fps = fps
+
+    def __call__(self, t_ms:int, frame_idx:int) -> tuple[int, int, str]:
+        return (t_ms, frame_idx, vid_time(frame_idx, self.fps))
+
+def vid_time(frame_idx:int, fps:float) -> str:
+    """The time of a frame in a video file, i.e. '0h:1m:23s:450ms'"""
+    millis = frame_idx * (1./fps) * 1000
+    secs = millis / 1000
+    mins = secs / 60
+    hours = mins / 60
+
+    millis %= 1000
+    secs %= 60
+    mins %= 60
+    return f'{int(hours)}h:{int(mins)}m:{int(secs)}s:{int(millis)}ms'
+
+class Audio_Time_Row:
+    """row_format of microphone histories - adds the audio file time to the stored (t_ms, #sample)"""
+    def __init__(self, sample_rate:int):
+        self.sample_rate = sample_rate
+
+    def __call__(self, t_ms:int, sample_idx:int) -> tuple[int, int, str]:
+        return (t_ms, sample_idx, audio_time(sample_idx, self.sample_rate))
+
+def audio_time(sample_idx:int, sample_rate:int) -> str:
+    """The time of a sample in an audio file, i.e. '1m:23.450s'"""
+    secs = sample_idx / sample_rate
+    return f'{int(secs // 60)}m:{secs % 60:.3f}s'
+
+def row_format_spec(row_format) -> dict|None:
+    """The row_format of a history as saved with the log's binary columns"""
+    if isinstance(row_format, Vid_Time_Row):
+        return {'vid_time_fps': row_format.fps}
+    if isinstance(row_format, Audio_Time_Row):
+        return {'audio_time_rate': row_format.sample_rate}
+    return None
+
+def row_format_from(spec:dict|None):
+    """The row_format saved as row_format_spec()"""
+    if spec is None:
+        return None
+    if 'vid_time_fps' in spec:
+        return Vid_Time_Row(spec['vid_time_fps'])
+    if 'audio_time_rate' in spec:
+        return Audio_Time_Row(spec['audio_time_rate'])
+    return None
+
+def frame_index_at(history, t_ms:int) -> int|None:
+    """The number of the camera frame captured most recently at or before t_ms. None before the first frame.
+
+    Args:
+        history (Log_History | logs.Column | list): The camera's (t_ms, #frame) history, or its list of
+            (t_ms, #frame, vid_time) entries of a log.json
+        t_ms (int): The task time
+    """
+    if isinstance(history, list):
+        i = bisect_right(history, t_ms, key=_entry_time) - 1
+        return None if i < 0 else history[i][1]
+    entry = history.entry_at(t_ms)
+    return None if entry is None else entry[1]
+
+def audio_sample_at(history, t_ms:int) -> int|None:
+    """The number of the audio file's sample recorded at t_ms, from the most recent audio block at or before
+    t_ms and the sample rate. None before the first block.
+
+    Args:
+        history (Log_History | logs.Column): The microphone's (t_ms, #sample) history with an Audio_Time_Row
+        t_ms (int): The task time
+    """
+    entry = history.entry_at(t_ms)
+    if entry is None:
+        return None
+    t_block, sample_idx = entry
+    return sample_idx + round((t_ms - t_block) * history.row_format.sample_rate / 1000)
+
+def to_builtin(obj):
+    """json.dump(default=...) hook saving histories as lists"""
+    if isinstance(obj, Log_History):
+        return obj.to_list()
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+def history_for(log:dict, key:str, entry:dict) -> Log_History|list:
+    """The log's history of a serial_in/serial_out entry, created if it doesn't exist yet"""
+    history = log.get(key)
+    if history is None:
+        history = log[key] = Log_History.for_entry(entry)
+    return history
+
+# last value of a logged entry that hasn't been logged yet - unequal to every value
+_UNLOGGED = object()
+
+class Change_Log_Plan:
+    """A precompiled plan for logging the changes of serial_in entries, i.e. for direct mode.
+    The logged entries are resolved once into slots of (entry dict, history) plus a list of their last
+    logged values, so every call gathers the current values and compares them with the last ones in a
+    single list comparison. Only if any value changed the changed entries are looked up and appended.
+
+    Args:
+        serial_in (dict): The serial_in dictionary whose entries with 'logging'=True are logged
+        log (dict): The log holding the histories, missing histories are created
+    """
+    def __init__(self, serial_in:dict, log:dict):
+        self.source, self.log = serial_in, log
+        self.num_entries = len(serial_in)
+        logged = [(key, data) for key, data in serial_in.items() if data['logging']]
+        self.slots:tuple[tuple[dict, Log_History|list], ...] = tuple(
+            (data, history_for(log, key, data)) for key, data in logged)
+        self.data_points = tuple(data for data, _ in self.slots)
+        self.histories = tuple(history for _, history in self.slots)
+        # continue after entries already in the histories
+        self.last:list = [history[-1][1] if len(history) != 0 else _UNLOGGED for history in self.histories]
+        self.last_array:np.ndarray|None = None
+
+    def matches(self, serial_in:dict, log:dict) -> bool:
+        """Whether this plan was compiled for the provided serial_in and log. Entries added or removed
+        trigger a recompile, in place changes of an entry's 'logging' require a new plan"""
+        return serial_in is self.source and log is self.log and len(serial_in) == self.num_entries
+
+    def log_changes(self, t_ms:int) -> int:
+        """Append (t_ms, value) to the histories of all entries whose value changed since they were
+        last logged. Returns the number of appended entries"""
+        current = [data['value'] for data in self.data_points]
+        last = self.last
+        if current == last:
+            return 0
+        self.last, self.last_array = current, None
+        changes = 0
+        for history, value, previous in zip(self.histories, current, last):
+            if value != previous:
+                history.append((t_ms, value))
+                changes += 1
+        return changes
+
+    def log_array(self, t_ms:int, values:np.ndarray) -> int:
+        """log_changes() for a serial_in backed by an array - values holds the current values of the
+        logged entries in slot order, shape (entries,) or (entries, values per entry). The changed entries
+        are found with one vectorized comparison. Returns the number of appended entries"""
+        last = self.last_array
+        if last is None or last.shape != values.shape:
+            changed = np.array([value != previous for value, previous in zip(values.tolist(), self.last)])
+        else:
+            changed = values != last
+            if changed.ndim > 1:
+                changed = changed.any(axis=1)
+        indices = np.flatnonzero(changed)
+        self.last_array = values.copy()
+        if len(indices) == 0:
+            return 0
+        rows = values[indices].tolist()
+        for i, value in zip(indices.tolist(), rows):
+            self.histories[i].append((t_ms, value))
+            self.last[i] = value
+        return len(indices)
@@ -0,0 +1,255 @@
+"""Streams the log to the session's log folder while the task runs.
+
+Every interval the Log_Writer thread appends the entries added since its previous write to an append-only
+store in log_dir/log_stream: Log_History columns (sensors, controls, cameras, microphones, main loop timing) as raw
+binary column files, lists (events, trials, blocks, states) as JSON Lines, and everything
+else (experiment_data, summaries) in the manifest. The manifest is replaced atomically after the data
+files have been flushed and only counts complete entries, so a crash leaves a readable log of everything
+up to the last interval - load_stream() rebuilds it.
+
+The main loop keeps appending to the in-memory log as before and never waits on the disk. At quit,
+finish() writes the remaining entries and the log file (i.e. log.json) in the background.
+
+Stream layout:
+    manifest.json   {'complete': bool, 'entries': [{'path': [...], 'index': n, 'generation': g,
+                     'kind': 'column'|'list', 'rows': ...}], 'values': {...}}
+    <n>.times       column times, dtype and rows in the manifest
+    <n>.values      column values, shape (rows, num_values) for multi-value sensors
+    <n>.jsonl       one JSON list entry per line
+An entry that has to be rewritten as a whole (a column widened to a new dtype or turned into a list) is written
+to new files <n>.<g>.times/.values/.jsonl of its next generation g. The manifest on disk keeps pointing to the
+previous files until it is replaced - they are deleted only then.
+"""
+
+import json, os, time
+import numpy as np
+from pathlib import Path
+from threading import Thread, Event
+from core.log_store import Log_History, row_format_spec, row_format_from, to_builtin
+from core.print0 import print0
+
+STREAM_DIR = 'log_stream'
+MANIFEST = 'manifest.json'
+
+def stream_file(stream_dir:Path, index:int, generation:int, suffix:str) -> Path:
+    """A stream data file, i.e. 3.times for entry 3 or 3.1.times for the entry's first rewrite"""
+    return stream_dir / (f'{index}{suffix}' if generation == 0 else f'{index}.{generation}{suffix}')
+
+class _Stream_Entry:
+    """The stream state of one log entry"""
+    def __init__(self, path:tuple, index:int, stream_dir:Path, generation:int=0):
+        self.path = path
+        self.index = index
+        self.stream_dir = stream_dir
+        self.generation = generation
+        # files of previous generations, deleted once a manifest without them has replaced the previous one
+        self.stale_files:list[Path] = []
+        self.rows = 0
+        self.kind:str|None = None
+        self.time_dtype:np.dtype|None = None
+        self.value_dtype:np.dtype|None = None
+        self.num_values = 1
+        self.row_format:dict|None = None
+
+    def file(self, suffix:str) -> Path:
+        return stream_file(self.stream_dir, self.index, self.generation, suffix)
+
+    def renew(self):
+        """Continue in the files of the next generation for a rewrite. The current files stay in place for the
+        manifest on disk"""
+        if self.kind is not None:
+            self.stale_files += [self.file(suffix) for suffix in ('.times', '.values', '.jsonl')]
+            self.generation += 1
+
+    def remove_stale(self):
+        for path in self.stale_files:
+            path.unlink(missing_ok=True)
+        self.stale_files = []
+
+    def manifest(self) -> dict:
+        entry = {'path': list(self.path), 'index': self.index, 'generation': self.generation, 'kind': self.kind,
+                 'rows': self.rows}
+        if self.kind == 'column':
+            entry['time_dtype'] = self.time_dtype.str
+            entry['value_dtype'] = self.value_dtype.str if self.value_dtype is not None else None
+            entry['num_values'] = self.num_values
+            entry['row_format'] = self.row_format
+        return entry
+
+    def write_column(self, history:Log_History):
+        times, values = history.rows_since(self.rows)
+        if len(times) == 0 and self.kind is not None:
+            return
+        if values is not None and values.dtype == object:
+            # no fixed size binary representation - stream the history as a list instead
+            self.renew()
+            self.kind, self.rows = 'list', 0
+            self.file('.jsonl').write_bytes(b'')
+            self.write_list(history.to_list(), final=True)
+            return
+        if self.kind is None or times.dtype != self.time_dtype or \
+           (values is not None and values.dtype != self.value_dtype):
+            # the first write or a column widened by an unexpected value - (re)write the whole column
+            self.renew()
+            self.kind = 'column'
+            self.num_values = history.num_values
+            self.row_format = row_format_spec(history.row_format)
+            times, values = history.rows_since(0)
+            self.time_dtype, self.value_dtype = times.dtype, values.dtype if values is not None else None
+            self.rows = 0
+            for suffix in ('.times', '.values'):
+                self.file(suffix).write_bytes(b'')
+        with open(self.file('.times'), 'ab') as f:
+            times.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if values is not None:
+            with open(self.file('.values'), 'ab') as f:
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        self.rows += len(times)
+
+    def write_list(self, entries:list, final:bool):
+        # the most recent entry may still be changed, i.e. a trial dict - it is written once the next one exists
+        end = len(entries) if final else len(entries) - 1
+        if self.kind is None:
+            self.kind = 'list'
+            self.file('.jsonl').write_bytes(b'')
+        if end <= self.rows:
+            return
+        lines = ''.join(json.dumps(entry, default=to_builtin) + '\n' for entry in entries[self.rows:end])
+        with open(self.file('.jsonl'), 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.rows = end
+
+class Log_Writer:
+    """Background thread streaming the log to log_dir/log_stream every interval_s.
+
+    Args:
+        log (dict): The session log
+        log_dir (Path): The session's log folder
+        interval_s (float, optional): Seconds between writes. Defaults to 5.0.
+    """
+    def __init__(self, log:dict, log_dir:Path, interval_s:float=5.0):
+        self.log = log
+        self.log_dir = Path(log_dir)
+        self.stream_dir = self.log_dir / STREAM_DIR
+        self.stream_dir.mkdir(exist_ok=True)
+        self.interval_s = interval_s
+        self.entries:dict[tuple, _Stream_Entry] = {}
+        self.stop_event = Event()
+        self.thread = Thread(target=self.run, name='log_writer', daemon=True)
+        self.finisher:Thread|None = None
+
+    def start(self):
+        if not self.thread.is_alive() and not self.stop_event.is_set():
+            self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_s):
+            try:
+                self.write()
+            except Exception as e:
+                print0(f'log streaming failed: {e}', priority=1, color='red', topic='configuration')
+
+    def entry(self, path:tuple) -> _Stream_Entry:
+        stream_entry = self.entries.get(path)
+        if stream_entry is None:
+            stream_entry = self.entries[path] = _Stream_Entry(path, len(self.entries), self.stream_dir)
+        return stream_entry
+
+    def write(self, final:bool=False):
+        """Append the entries added since the previous write and replace the manifest"""
+        values = {}
+        for key, item in list(self.log.items()):
+            if isinstance(item, dict) and len(item) != 0 and \
+               all(isinstance(v, (Log_History, list)) for v in item.values()):
+                # a group of histories, i.e. 'controls' or 'cameras (t_ms/#frame/vid_time)'
+                for name, history in list(item.items()):
+                    self.write_item((key, name), history, final)
+            elif isinstance(item, (Log_History, list)):
+                self.write_item((key,), item, final)
+            else:
+                values[key] = item
+
+        manifest = {'complete': final, 't_written': time.time(),
+                    'entries': [e.manifest() for e in self.entries.values() if e.kind is not None],
+                    'values': values}
+        temp_path = self.stream_dir / (MANIFEST + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, default=to_builtin)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.stream_dir / MANIFEST)
+        for stream_entry in self.entries.values():
+            stream_entry.remove_stale()
+
+    def write_item(self, path:tuple, item:Log_History|list, final:bool):
+        stream_entry = self.entry(path)
+        if isinstance(item, Log_History) and stream_entry.kind != 'list':
+            stream_entry.write_column(item)
+        else:
+            stream_entry.write_list(item.to_list() if isinstance(item, Log_History) else item, final)
+
+    def finish(self, saver=None):
+        """Stop streaming and write the remaining entries in a background thread, followed by the
+        complete log file of the saver (a log_formats.Log_Saver). Returns immediately - use join() to await the files."""
+        self.stop_event.set()
+        def write_remaining():
+            if self.thread.is_alive():
+                self.thread.join()
+            self.write(final=True)
+            if saver is not None:
+                saver.save()
+        # not a daemon - the interpreter waits for the log to be written before exiting
+        self.finisher = Thread(target=write_remaining, name='log_writer_finish')
+        self.finisher.start()
+
+    def join(self, timeout_s:float|None=None):
+        if self.finisher is not None:
+            self.finisher.join(timeout_s)
+
+def load_stream(path:str|Path) -> dict:
+    """Rebuild a log from its log_stream folder, i.e. after a crash prevented saving log.json.
+    Entries appear as they were at the last completed write.
+
+    Args:
+        path (str | Path): The session's log folder or its log_stream folder
+
+    Returns:
+        dict: the log as it would be loaded from log.json
+    """
+    stream_dir = Path(path)
+    if stream_dir.name != STREAM_DIR:
+        stream_dir = stream_dir / STREAM_DIR
+    with open(stream_dir / MANIFEST) as f:
+        manifest = json.load(f)
+
+    log = dict(manifest['values'])
+    for entry in manifest['entries']:
+        stream_entry = _Stream_Entry(tuple(entry['path']), entry['index'], stream_dir, entry.get('generation', 0))
+        rows = entry['rows']
+        if entry['kind'] == 'list':
+            with open(stream_entry.file('.jsonl')) as f:
+                items = [json.loads(line) for _, line in zip(range(rows), f)]
+        else:
+            times = np.fromfile(stream_entry.file('.times'), dtype=entry['time_dtype'], count=rows).tolist()
+            if entry['value_dtype'] is None:
+                items = times
+            else:
+                values = np.fromfile(stream_entry.file('.values'), dtype=entry['value_dtype'],
+                                     count=rows * entry['num_values'])
+                if entry['num_values'] != 1:
+                    values = values.reshape(-1, entry['num_values'])
+                items = [list(row) for row in zip(times, values.tolist())]
+                row_format = row_format_from(entry['row_format'])
+                if row_format is not None:
+                    items = [list(row_format(t, v)) for t, v in items]
+        parent = log
+        for key in entry['path'][:-1]:
+            parent = parent.setdefault(key, {})
+        parent[entry['path'][-1]] = items
+    return log
@@ -1,11 +1,17 @@
 from py5 import Sketch
 from typing import Callable
-import pathlib, json, pickle
+import pathlib
+from core.log_store import Log_History, Change_Log_Plan
+from core.log_formats import Log_Saver, serializer_for
 main, visual = None, None
+# True when the main loop is driven without py5 sketches (vector_env workers):
+# load_task() then skips the pre_task and visual sketches
+headless = False
 
 class Main(Sketch):
     def __init__(self, networker, serial_in, serial_out, run_controls, log:dict, log_dir:str, state_machine, 
                  max_framerate=8_000, permanent_states:list[Callable]=[], threads_info:dict={}, log_performance=False,
+                 log_writer=None, log_format='json',
                  run_at_start:Callable=lambda:None, run_at_quit:Callable=lambda:None, run_post_trial:Callable=lambda:None):
         super().__init__()
         self.netw = networker
@@ -21,6 +27,10 @@ class Main(Sketch):
         self.run_at_start = run_at_start
         self.run_at_quit = run_at_quit
         self.log_performance = log_performance
+        self.log_writer = log_writer
+        self.log_format = log_format
+        self.log_saver:Log_Saver|None = None
+        self.log_plan:Change_Log_Plan|None = None
 
         self.running = True # pulse for standalone no-sketch use
 
@@ -31,12 +41,23 @@ class Main(Sketch):
         self.window_title('Neurokraken Main Thread')
         self.get_surface().set_visible(False)
         self.frame_rate(self.max_framerate)
+        self.initialize()
+
+    def initialize(self):
+        """Prepare the logs and perform the first communication. Called by setup() or directly
+        before a non-sketch loop of draw() calls"""
         if self.log_performance:
-            self.log_dict['t_main_loop'] = []
-            self.log_dict['t_received'] = []
+            self.log_dict['t_main_loop'] = Log_History()
+            self.log_dict['t_received'] = Log_History()
         self.serialout_key_lastval_updated = [[k, v['value'], False] for k, v in self.serial_out.items() if not k == 'start_stop']
         for out in self.serialout_key_lastval_updated:
-            self.log_dict['controls'][out[0]] = [ [0, out[1]] ]
+            self.log_dict['controls'][out[0]] = Log_History.for_entry(self.serial_out[out[0]])
+            self.log_dict['controls'][out[0]].append( (0, out[1]) )
+        if not self.netw.archivist_mode:
+            # compiled once instead of resolving every logged serial_in entry per loop in log_serial()
+            self.log_plan = Change_Log_Plan(self.serial_in, self.log_dict)
+        if self.log_writer is not None:
+            self.log_writer.start()
         # initialize communication
         self.netw.write_teensy_data(self.serial_out)
 
@@ -148,6 +169,9 @@ class Main(Sketch):
                 
                 self.serial_out['start_stop']['value'] = 2 # end clock
                 self.netw.write_teensy_data(self.serial_out)
+                if hasattr(self.netw, 'stop'):
+                    # a networker's I/O thread logs the last communication - await it before saving the log
+                    self.netw.stop()
                 self.save_log()
                 self.netw.close()
                 self.running = False
@@ -164,29 +188,30 @@ class Main(Sketch):
         Args:
             serial_in (dict): Serial Dictionary used by the networker
             time (str): This serial_in key defines the value used as time stamp
+            log (dict): The log to add the histories to
         """
-        time = serial_in[time]['value']
-
-        for key, data in serial_in.items():
-            if data['logging']:
-                history = log.setdefault(key, [])
-
-                current_val = data['value']
-                try:
-                    if current_val != history[-1][1]:
-                        history.append((time, current_val))
-                except IndexError:
-                    # there is no previous list entry yet
-                    history.append((time, current_val))
+        if self.log_plan is None or not self.log_plan.matches(serial_in, log):
+            self.log_plan = Change_Log_Plan(serial_in, log)
+        self.log_plan.log_changes(serial_in[time]['value'])
     
-    def save_log(self, format='.json', filename:str='log'):
-        file_path = (self.log_dir / (filename + format)).resolve()
-        if format == '.json':
-            with open(file_path, 'w') as f:
-                json.dump(self.log_dict, f, indent=2)
-        elif format == '.pickle':
-            with open(file_path, 'wb') as f:
-                pickle.dump(self.log_dict, f, protocol=pickle.HIGHEST_PROTOCOL)
+    def save_log(self, format=None, filename:str='log'):
+        """Write the log file in a worker thread, which the interpreter awaits before exiting - the quitting main
+        loop doesn't wait for the file, but it is complete when the experiment script ends.
+        self.log_saver.progress reports the written fraction.
+
+        Args:
+            format (str | Log_Serializer | None, optional): A log_formats.LOG_FORMATS name or serializer. Defaults
+                                                            to the log_format of the main loop.
+            filename (str, optional): The file name without suffix. Defaults to 'log'.
+        """
+        serializer = serializer_for(format if format is not None else self.log_format)
+        file_path = (self.log_dir / (filename + serializer.suffix)).resolve()
+        self.log_saver = Log_Saver(self.log_dict, file_path, serializer)
+        if self.log_writer is not None:
+            # the remaining stream is written first, followed by the log file
+            self.log_writer.finish(self.log_saver)
+        else:
+            self.log_saver.start()
 
 class Visual(Sketch):
     def __init__(self, state_machine, display_config, run_controls, 
@@ -5,10 +5,11 @@ import numpy as np
 import queue
 from pathlib import Path
 from configurators import Microphone as Microphone_config
+from core.log_store import Log_History, Audio_Time_Row, audio_time
 
 class Microphone(Sketch):
     def __init__(self, properties:Microphone_config, run_controls, log_dict:dict, time_ms:dict, 
-                 log_dir:str|Path, verbose:bool=False):
+                 log_dir:str|Path, verbose:bool=False, keyframe_log_dict:dict|None=None):
         super().__init__()
         self.name = properties.name
         self.idx = properties.idx
@@ -21,13 +22,20 @@ class Microphone(Sketch):
         self.log_dict = log_dict
         self.verbose = verbose
 
-        self.log_dict[self.name] = []
-        self.keyframe_last = 0
-        self.keyframe_interval = 10_000
-
         if self.sample_rate is None:
             self.sample_rate = int(sd.query_devices(self.idx, 'input')['default_framerate'])
 
+        # (t_ms, #sample) after every recorded audio block - maps task times to audio file samples,
+        # see get.audio_sample_at(). The audio file time is derived from the sample number when the log is read
+        self.log_list = self.log_dict[self.name] = Log_History('i8', row_format=Audio_Time_Row(self.sample_rate))
+        # the (t_ms, audio_time) keyframes every 10 s of log['microphones (t_ms/audio_time)'], kept for existing
+        # analysis scripts reading them
+        self.keyframes = None
+        if keyframe_log_dict is not None:
+            self.keyframes = keyframe_log_dict[self.name] = []
+        self.keyframe_last = 0
+        self.keyframe_interval = 10_000
+
         self.q = queue.Queue()    
         self.total_frames = 0
 
@@ -47,11 +55,15 @@ class Microphone(Sketch):
         self.total_frames += frames # +1136
         if self.has_started:
             self.q.put(indata.copy())
-            if self.time_ms['value'] - self.keyframe_last > self.keyframe_interval:
+            # [task time ms, number of samples recorded by now]
+            self.log_list.append((self.time_ms['value'], self.total_frames))
+            if self.keyframes is not None and self.time_ms['value'] - self.keyframe_last > self.keyframe_interval:
                 self.keyframe_last = self.time_ms['value']
-                # [task time ms, audio file time]
-                self.log_dict[self.name].append((self.time_ms['value'], 
-                                                 f'{int((self.total_frames / self.sample_rate) // 60)}m:{(self.total_frames / self.sample_rate) % 60:.3f}s'))
+                self.append_keyframe()
+
+    def append_keyframe(self):
+        # [task time ms, audio file time]
+        self.keyframes.append((self.time_ms['value'], audio_time(self.total_frames, self.sample_rate)))
 
     def settings(self):
         self.size(5, 5)
@@ -75,8 +87,9 @@ class Microphone(Sketch):
             self.save_file.write(self.q.get())
 
     def shutdown(self):
-        self.log_dict[self.name].append((self.time_ms['value'], 
-                                        f'{int((self.total_frames / self.sample_rate) // 60)}m:{(self.total_frames / self.sample_rate) % 60:.3f}s'))
+        self.log_list.append((self.time_ms['value'], self.total_frames))
+        if self.keyframes is not None:
+            self.append_keyframe()
         self.stream.stop()
         total_duration = self.time_ms['value'] - self.t_start
         self.save_file.close()
@@ -3,11 +3,318 @@ import serial.tools.list_ports
 
 from datetime import datetime
 from core.print0 import print0
-import time, platform, inspect
+from core.log_store import history_for, Change_Log_Plan
+import time, platform, inspect, struct, math, select
+import numpy as np
+from threading import Thread
+from collections import deque
+
+# struct format characters for little endian (unsigned, signed) ints of a given byte_length
+_STRUCT_FORMATS = {1: ('B', 'b'), 2: ('H', 'h'), 4: ('I', 'i'), 8: ('Q', 'q')}
+
+# framed protocol: every teensy answer starts with FRAME_MAGIC followed by a 4 byte little endian payload length.
+# Legacy answers can never start with these bytes (archivist: uint16 history length <= 1023, direct: message length > 0)
+FRAME_MAGIC = b'\x00\xff'
+FRAME_HEADER_LENGTH = len(FRAME_MAGIC) + 4
+# start_stop values ignored by legacy firmware that request switching the teensy's answer protocol
+START_STOP_FRAMED = 3
+START_STOP_LEGACY = 4
+# measured durations per communication: write -> first answer byte seen by the polling read_teensy_data(),
+# first byte -> all bytes read, all bytes read -> values decoded (and logged), write -> values decoded
+LATENCY_STAGES = ('answer', 'read', 'decode', 'round_trip')
+# read_teensy_data() wait strategies: return immediately when no answer has arrived yet, or sleep in the kernel
+# until shortly before the expected answer and spin for the rest
+WAIT_MODES = ('poll', 'wait')
+# compact histories up to this many entries are decoded in a python loop, longer ones with numpy
+COMPACT_LOOP_MAX_ENTRIES = 16
+# a closing Threaded_Networker gives up awaiting an answer after this time, i.e. of a teensy that already stopped
+CLOSING_ANSWER_TIMEOUT_NS = 100_000_000
+
+def decode_history(log_times:bytes, log_values:bytes, byte_length:int, signed:bool, num_values:int=1):
+    """Decode an archivist mode history block in bulk.
+
+    Args:
+        log_times (bytes): 4 byte little endian unsigned timestamps, one per history entry
+        log_values (bytes): little endian values, num_values * byte_length bytes per history entry
+        byte_length (int): byte length of a single value
+        signed (bool): whether values are signed ints
+        num_values (int, optional): number of values per history entry. Defaults to 1.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: uint32 times of shape (n,) and values of shape (n,)
+                                       or (n, num_values) for multi-value sensors
+    """
+    # a read timeout can have returned a partial block - only decode complete entries
+    num_entries = min(len(log_times) // 4, len(log_values) // (byte_length * num_values))
+    log_times = log_times[:num_entries * 4]
+    log_values = log_values[:num_entries * byte_length * num_values]
+    times = np.frombuffer(log_times, dtype='<u4')
+    if byte_length in _STRUCT_FORMATS:
+        values = np.frombuffer(log_values, dtype=f'<{"i" if signed else "u"}{byte_length}')
+    else:
+        # no native dtype (i.e. 3 bytes) - pad every value to the next native width
+        width = next(w for w in sorted(_STRUCT_FORMATS) if w > byte_length)
+        raw = np.frombuffer(log_values, dtype=np.uint8).reshape(-1, byte_length)
+        padded = np.zeros((raw.shape[0], width), dtype=np.uint8)
+        padded[:, :byte_length] = raw
+        if signed:
+            # sign extend negative values
+            padded[:, byte_length:] = np.where(raw[:, -1:] & 0x80, 0xFF, 0x00)
+        values = padded.view(f'<{"i" if signed else "u"}{width}').reshape(-1)
+    if num_values != 1:
+        values = values.reshape(-1, num_values)
+    return times, values
+
+def decode_varints(block) -> np.ndarray:
+    """Decode a sequence of unsigned LEB128 varints (7 bits per byte, high bit set on all but the last byte)"""
+    data = np.frombuffer(block, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = (data & 0x80) == 0
+    if ends.all():
+        # every varint is a single byte - the common case for small timestamp and value steps
+        return data.astype(np.uint64)
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    varint_idx = np.concatenate(([0], np.cumsum(ends[:-1])))
+    byte_pos = np.arange(len(data)) - starts[varint_idx]
+    shifted = (data & 0x7F).astype(np.uint64) << (7 * byte_pos).astype(np.uint64)
+    return np.bitwise_or.reduceat(shifted, starts)
+
+def decode_compact_history(block, num_entries:int, byte_length:int, signed:bool, num_values:int=1):
+    """Decode a compact archivist history block in bulk.
+    The block contains the 4 byte timestamp and raw value bytes of the first entry, followed by a varint
+    timestamp delta and zig-zag varint value deltas (one per value) for every further entry.
+    The teensy only precedes the block with a uint16 block length for 2 or more entries.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: uint32 times of shape (n,) and values of shape (n,) or (n, num_values),
+                                       in the dtypes of decode_history()
+    """
+    first_length = 4 + byte_length * num_values
+    if num_entries == 1:
+        return decode_history(block[:4], block[4:first_length], byte_length, signed, num_values)
+    bits = 8 * byte_length
+    if num_entries <= COMPACT_LOOP_MAX_ENTRIES:
+        times, values = _decode_compact_loop(bytes(block), num_entries, byte_length, num_values)
+    else:
+        deltas = decode_varints(block[first_length:])[:(num_entries - 1) * (1 + num_values)]
+        deltas = deltas.astype(np.int64).reshape(-1, 1 + num_values)
+
+        times = np.empty(num_entries, dtype=np.int64)
+        times[0] = int.from_bytes(block[:4], 'little')
+        times[1:] = deltas[:, 0]
+        times = np.cumsum(times) & 0xFFFFFFFF
+
+        values = np.empty((num_entries, num_values), dtype=np.int64)
+        values[0] = [int.from_bytes(block[4 + v*byte_length:4 + (v+1)*byte_length], 'little') for v in range(num_values)]
+        zigzag = deltas[:, 1:]
+        values[1:] = (zigzag >> 1) ^ -(zigzag & 1)
+        values = np.cumsum(values, axis=0)
+        if bits < 64:
+            # the deltas are modular to the value's byte width
+            values &= (1 << bits) - 1
+    if signed and bits < 64:
+        values = np.where(values >= 1 << (bits - 1), values - (1 << bits), values)
+    if num_values == 1:
+        values = values[:, 0]
+    # the dtypes of decode_history() - the int64 of the delta sums would widen the sensor's log columns
+    width = next(w for w in sorted(_STRUCT_FORMATS) if w >= byte_length)
+    return times.astype(np.uint32), values.astype(f'{"i" if signed else "u"}{width}')
+
+def _decode_compact_loop(block:bytes, num_entries:int, byte_length:int, num_values:int):
+    # short histories decode faster in plain python than through the fixed cost of numpy calls
+    t_ms = int.from_bytes(block[:4], 'little')
+    current = [int.from_bytes(block[4 + v*byte_length:4 + (v+1)*byte_length], 'little') for v in range(num_values)]
+    mask = (1 << (8 * byte_length)) - 1
+    times, values = [t_ms], [tuple(current)]
+    position = 4 + byte_length * num_values
+    for _ in range(num_entries - 1):
+        for v in range(-1, num_values):
+            varint, shift = 0, 0
+            while True:
+                b = block[position]
+                position += 1
+                varint |= (b & 0x7F) << shift
+                if b < 0x80:
+                    break
+                shift += 7
+            if v == -1:
+                t_ms = (t_ms + varint) & 0xFFFFFFFF
+            else:
+                current[v] = (current[v] + ((varint >> 1) ^ -(varint & 1))) & mask
+        times.append(t_ms)
+        values.append(tuple(current))
+    return np.array(times, dtype=np.int64), np.array(values, dtype=np.int64 if byte_length < 8 else np.uint64)
+
+class Direct_Decoder():
+    """A precompiled unpacker for direct mode packets.
+    The serial_in layout (order, byte_length and signedness of every entry) is compiled once into a
+    single struct.Struct, so a received packet is decoded with one unpack_from() call instead of
+    slicing and int.from_bytes() per entry. Byte lengths without a native struct format (i.e. 3)
+    are unpacked as raw bytes and converted individually.
+
+    Args:
+        serial_in (dict): The serial_in dictionary whose layout should be compiled
+    """
+    def __init__(self, serial_in:dict):
+        self.source = serial_in
+        self.num_entries = len(serial_in)
+        self.data_points = tuple(serial_in.values())
+        # (index, signed) of entries that need an individual int.from_bytes() conversion
+        self.odd_fields:list[tuple[int,bool]] = []
+        fmt = '<'
+        for i, data_point in enumerate(self.data_points):
+            signed = data_point['encoding'] == int
+            if data_point['byte_length'] in _STRUCT_FORMATS:
+                fmt += _STRUCT_FORMATS[data_point['byte_length']][signed]
+            else:
+                fmt += f'{data_point["byte_length"]}s'
+                self.odd_fields.append((i, signed))
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+
+    def matches(self, serial_in:dict) -> bool:
+        """Whether this decoder was compiled for the provided serial_in. Entries added or removed
+        trigger a recompile, in place changes of an entry's byte_length or encoding require
+        networker.direct_decoder = None"""
+        return serial_in is self.source and len(serial_in) == self.num_entries
+
+    def decode(self, data_in:bytes) -> bool:
+        """Update the 'value' of all serial_in entries from data_in. Returns False if data_in is
+        too short for the compiled layout, in which case no value is updated."""
+        if len(data_in) < self.size:
+            return False
+        values = self.struct.unpack_from(data_in)
+        if self.odd_fields:
+            values = list(values)
+            for i, signed in self.odd_fields:
+                values[i] = int.from_bytes(values[i], 'little', signed=signed)
+        for data_point, value in zip(self.data_points, values):
+            data_point['value'] = value
+        return True
+
+class Out_Buffer():
+    """A preallocated bytearray laid out once from serial_out.
+    At every communication only the fields whose 'value' changed since the last send are rewritten,
+    so unchanged controls cost a single comparison instead of a to_bytes() and a bytes concatenation.
+    Entries with reset_after_send=True are reset to their 'default' after being written.
+
+    Args:
+        serial_out (dict): The serial_out dictionary whose layout should be compiled
+    """
+    def __init__(self, serial_out:dict):
+        self.source = serial_out
+        self.num_entries = len(serial_out)
+        self.buffer = bytearray(sum(data_point['byte_length'] for data_point in serial_out.values()))
+        # [data_point, offset, struct.Struct or None, last written value]
+        self.fields:list[list] = []
+        offset = 0
+        for data_point in serial_out.values():
+            signed = data_point['encoding'] == int
+            packer = None
+            if data_point['byte_length'] in _STRUCT_FORMATS:
+                packer = struct.Struct('<' + _STRUCT_FORMATS[data_point['byte_length']][signed])
+            field = [data_point, offset, packer, None]
+            self.write_field(field, data_point['value'])
+            self.fields.append(field)
+            offset += data_point['byte_length']
+        self.reset_fields = tuple(data_point for data_point in serial_out.values() if data_point['reset_after_send'] == True)
+
+    def matches(self, serial_out:dict) -> bool:
+        """Whether this buffer was laid out for the provided serial_out. Entries added or removed
+        trigger a new layout, in place changes of an entry's byte_length or encoding require
+        networker.out_buffer = None"""
+        return serial_out is self.source and len(serial_out) == self.num_entries
+
+    def write_field(self, field:list, value):
+        data_point, offset, packer = field[0], field[1], field[2]
+        if data_point['encoding'] == bool:
+            # Boolean values will be sent as byte \x01 for True and \x00 for False
+            value_int = 1 if value == True else 0
+        else:
+            value_int = int(value)
+        if packer is not None:
+            packer.pack_into(self.buffer, offset, value_int)
+        else:
+            self.buffer[offset:offset+data_point['byte_length']] = \
+                value_int.to_bytes(data_point['byte_length'], 'little', signed=data_point['encoding'] == int)
+        field[3] = value
+
+    def update(self) -> bytearray:
+        """Rewrite changed fields, reset reset_after_send entries and return the buffer to be sent"""
+        for field in self.fields:
+            value = field[0]['value']
+            if value != field[3]:
+                self.write_field(field, value)
+        for data_point in self.reset_fields:
+            data_point['value'] = data_point['default']
+        return self.buffer
+
+class Latency_Histogram():
+    """A fixed memory histogram of durations with logarithmically spaced bins, so percentiles of any number
+    of recorded durations can be provided without keeping an entry per recording.
+
+    Args:
+        min_ns (int, optional): Upper edge of the first bin. Defaults to 1_000 (1us).
+        max_ns (int, optional): Durations beyond are counted in the last bin. Defaults to 10_000_000_000 (10s).
+        bins_per_decade (int, optional): Resolution - 40 bins per factor 10 are ~6% wide. Defaults to 40.
+    """
+    def __init__(self, min_ns:int=1_000, max_ns:int=10_000_000_000, bins_per_decade:int=40):
+        self.min_ns = min_ns
+        self.bins_per_decade = bins_per_decade
+        self.num_bins = int(math.ceil(math.log10(max_ns / min_ns) * bins_per_decade)) + 1
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.num_bins
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns:int):
+        if duration_ns <= self.min_ns:
+            i = 0
+        else:
+            i = min(int(math.log10(duration_ns / self.min_ns) * self.bins_per_decade) + 1, self.num_bins - 1)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def bin_edge_us(self, i:int) -> float:
+        """upper edge of bin i in microseconds"""
+        return self.min_ns * 10 ** (i / self.bins_per_decade) / 1000
+
+    def percentile_us(self, percent:float) -> float:
+        """the upper edge of the bin containing the percentile (capped at the recorded maximum)"""
+        if self.count == 0:
+            return 0.0
+        threshold = self.count * percent / 100
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return min(self.bin_edge_us(i), self.max_ns / 1000)
+        return self.max_ns / 1000
+
+    def live(self) -> dict:
+        return {'p50': round(self.percentile_us(50), 1), 'p99': round(self.percentile_us(99), 1),
+                'max': round(self.max_ns / 1000, 1)}
+
+    def summary(self) -> dict:
+        """percentiles and the non-empty bins as [upper edge us, count]"""
+        return {'count': self.count,
+                'mean': round(self.sum_ns / self.count / 1000, 1) if self.count else 0.0,
+                'p50': round(self.percentile_us(50), 1), 'p90': round(self.percentile_us(90), 1),
+                'p99': round(self.percentile_us(99), 1), 'max': round(self.max_ns / 1000, 1),
+                'histogram': [[round(self.bin_edge_us(i), 2), c] for i, c in enumerate(self.counts) if c != 0]}
 
 class Networker(object):
     def __init__(self, serial_key:str='COM0', 
-                 archivist_mode:bool=True, serial_in_log:dict={}, run_controls=None,
+                 archivist_mode:bool=True, serial_in_log:dict={}, run_controls=None, framed:bool=False,
+                 measure_latency:bool=False, threads_info:dict={},
+                 wait_mode:str='poll', spin_us:int=300, max_wait_s:float=0.002, name:str|None=None,
                  verbose_connection:int=2, verbose_communication:bool=False, verbose_teensy_debug:bool=True):
         """print(ser.BAUDRATES) provides an incomplete list of valid baudrates that
            can be used for networking. read(size=x) would be blocking without a provided
@@ -32,17 +339,38 @@ class Networker(object):
             Using connection description or ID information can be preferable to a com port, as it is not subject to
             changes between computers. You can use the list_serial() function to check whether a device connection has
             exposes suitable keys for identification. Defaults to 'COM0'.
+            framed (bool, optional): Whether the teensy answers in the framed protocol (a single length header
+                                     ahead of the whole packet) rather than the legacy protocol. Use negotiate_protocol()
+                                     to switch a connected teensy between protocols. Defaults to False.
+            measure_latency (bool, optional): Record every communication's durations in fixed memory histograms
+                                              (see LATENCY_STAGES). Live p50/p99/max values are provided in
+                                              threads_info['latency_networker'] and a session summary is saved to
+                                              serial_in_log['networker latency (us)'] when the run stops. Defaults to False.
+            threads_info (dict, optional): The dictionary to provide live latency values and the CPU usage in.
+                                           'cpu_process' and 'cpu_networker' contain the percent of one core used by
+                                           the process and the thread calling read_teensy_data(). Defaults to {}.
+            wait_mode (str, optional): 'poll' returns from read_teensy_data() immediately if the teensy's answer hasn't
+                                       arrived yet, so the calling loop keeps spinning. 'wait' sleeps in the kernel
+                                       (select on the serial port, a plain sleep on Windows) until spin_us before the
+                                       expected answer, then spins until it arrives or max_wait_s passed. Defaults to 'poll'.
+            spin_us (int, optional): The spin phase around the expected answer time in wait mode. Defaults to 300.
+            max_wait_s (float, optional): The longest wait for a late answer in wait mode. Defaults to 0.002.
+            name (str | None, optional): The board name in multi-teensy setups, used in messages and log keys.
+                                         Defaults to None (the only/primary teensy).
             verbose_connection (int, optional): priority threshold (0 to 5) for printing connection-related information.
                                                 At 0 only the highest priority events will be printed, at 5 all. Defaults to 2
             verbose_communication (bool, optional): print communicated data/bytes for debugging. Defaults to False
             verbose_teensy_debug (bool, optional): print teensy originating debug information. Defaults to True
         """
     
+        self.name = name
         self.connect(serial_key)
     
         print0.set_topic_threshold('teensy_debug', 6 if verbose_teensy_debug else 0)
         print0.set_topic_threshold('communication', 6 if verbose_communication else 0)
         print0.set_topic_threshold('connection', verbose_connection)
+        # formatting the communication messages has a cost even if they don't get printed
+        self.verbose_communication = verbose_communication
 
         # archivist mode logging functionality
         self.archivist_mode = archivist_mode
@@ -54,8 +382,48 @@ class Networker(object):
                     self.active = True
             self.run_controls = Run_Controls()
 
+        # direct mode unpacker - compiled from serial_in at the first communication
+        self.direct_decoder:Direct_Decoder|None = None
+
+        # write_teensy_data() output - laid out from serial_out at the first communication
+        self.out_buffer:Out_Buffer|None = None
+
+        # framed protocol - packets are read into a reusable buffer that grows as needed
+        self.framed = framed
+        self.frame_header = bytearray(FRAME_HEADER_LENGTH)
+        self.frame_buffer = bytearray(1024)
+        # received bytes for bandwidth reports
+        self.bytes_in = 0
+        # added to logged timestamps to place them on another board's timeline (see Multi_Networker)
+        self.t_offset_ms = 0
+
+        # latency measurement - perf_counter_ns timestamps of the last write and the current read
+        self.threads_info = threads_info
+        self.latency:dict[str, Latency_Histogram]|None = None
+        if measure_latency:
+            self.latency = {stage: Latency_Histogram() for stage in LATENCY_STAGES}
+        self.t_write_ns = 0
+        self.t_first_byte_ns = 0
+        self.t_read_ns = 0
+        self.t_latency_published_ns = 0
+
+        # wait strategy
+        if not wait_mode in WAIT_MODES:
+            raise ValueError(f'wait_mode "{wait_mode}" is not one of {WAIT_MODES}')
+        self.wait_mode = wait_mode
+        self.spin_ns = spin_us * 1000
+        self.max_wait_ns = int(max_wait_s * 1_000_000_000)
+        # moving average of write -> first answer byte, to sleep until shortly before the next answer
+        self.expected_answer_ns = 100_000
+        self.fileno = self.ser.fileno() if hasattr(self.ser, 'fileno') and platform.system() != 'Windows' else None
+
+        # cpu usage - reported twice per second
+        self.t_cpu_wall_ns = time.perf_counter_ns()
+        self.t_cpu_process = time.process_time()
+        self.t_cpu_thread = time.thread_time()
+
     def connect(self, serial_key:str='COM0'):
-        if 'COM' in serial_key:
+        if 'COM' in serial_key or serial_key.startswith('/dev/'):
             self.com = serial_key
         else:
             ports = serial.tools.list_ports.comports()
@@ -80,7 +448,7 @@ class Networker(object):
         for i in range(num_bytes_out):
             self.ser.write(b'\x00')
 
-    def reconnect(self, keep_trying=True, device_name='teensy'):
+    def reconnect(self, keep_trying=True, device_name=None):
         """reconnect the serial connection.
 
         Args:
@@ -88,13 +456,15 @@ class Networker(object):
                 Run as a blocking while True: loop until the reconnection attempt succeeds. 
                 If False only try one reconnect. Defaults to True.
             device_name (str, optional): 
-                The device/connection name to be used in log messages. Defaults to 'teensy'.
+                The device/connection name to be used in log messages. Defaults to the board name or 'teensy'.
         Returns:
             bool:
                 reconnection attempt success. True/False when keep_trying=False.
                 If keep_trying=True the function will run forever until it is able to
                 reconnect and return True.
         """
+        if device_name is None:
+            device_name = 'teensy' if self.name is None else f'teensy {self.name}'
         while True:
             try:
                 print0(f'attempting reconnect to {device_name}...', 
@@ -117,7 +487,16 @@ class Networker(object):
         returned in the 2nd argument"""
 
         try:
-            if self.ser.in_waiting != 0:
+            answer_available = self.ser.in_waiting != 0
+            if not answer_available and self.wait_mode == 'wait':
+                answer_available = self.await_answer()
+            self.report_cpu()
+            if answer_available:
+                self.t_first_byte_ns = time.perf_counter_ns()
+                if self.t_write_ns != 0:
+                    self.expected_answer_ns += (self.t_first_byte_ns - self.t_write_ns - self.expected_answer_ns) // 8
+                if self.framed:
+                    return self.read_frame(ordered_in_values)
                 if not self.archivist_mode:
                     # direct mode
                     #The teensy has answered => read the first byte = length of the sent data
@@ -125,66 +504,58 @@ class Networker(object):
                     length_data_in = int.from_bytes(length_data_in, 'little')
                     #get the bytes array with the provided length
                     data_in = self.ser.read(length_data_in)
+                    self.t_read_ns = time.perf_counter_ns()
+                    self.bytes_in += 1 + len(data_in)
                     print0(f'length of data_in from teensy: {length_data_in}, data_in bytes: {data_in}',
                            priority=3, color='green', topic='communication')
                     
                     #update ordered_in_values with the current measurements
-                    byte_position = 0
-                    for data_point in ordered_in_values.values():
-                        bytes = data_in[byte_position:byte_position+data_point['byte_length']]
-                        signed = True if data_point['encoding'] == int else False
-                        #recalculate the signed or unsigned int from little endian ordered bytes
-                        value = int.from_bytes(bytes, 'little', signed=signed)
-                        data_point['value'] = value
-                        byte_position += data_point['byte_length']
+                    if self.direct_decoder is None or not self.direct_decoder.matches(ordered_in_values):
+                        self.direct_decoder = Direct_Decoder(ordered_in_values)
+                    if not self.direct_decoder.decode(data_in):
+                        print0(f'received {len(data_in)} bytes but serial_in expects {self.direct_decoder.size} - ' +
+                               'values were not updated', priority=2, color='red', topic='connection')
                     # --- Data will be logged by the main loop ---
                 else:
                     # archivist mode - read list of changes and timestamps since last communication
+                    # all histories are read before decoding them, so reading and decoding are timed separately
+                    histories = []
                     for sens_name, sens_data in ordered_in_values.items():
                         length_history = self.ser.read(2)
                         length_history = int.from_bytes(length_history, 'little', signed=False)
 
-                        # print(sens_name, length_history)
-                        log_times = self.ser.read(length_history * 4)
                         num_values = 1
                         if type(sens_data['value'])==list:
                             num_values = len(sens_data['value'])
+                        if sens_data.get('compact', False):
+                            if length_history > 1:
+                                length_block = int.from_bytes(self.ser.read(2), 'little', signed=False)
+                            else:
+                                length_block = length_history * (4 + sens_data['byte_length'] * num_values)
+                            block = self.ser.read(length_block)
+                            self.bytes_in += 2 + (2 if length_history > 1 else 0) + len(block)
+                            histories.append((sens_name, sens_data, length_history, num_values, block, None))
+                            continue
+
+                        log_times = self.ser.read(length_history * 4)
                         log_values = self.ser.read(length_history * sens_data['byte_length'] * num_values)
+                        self.bytes_in += 2 + len(log_times) + len(log_values)
+                        histories.append((sens_name, sens_data, length_history, num_values, log_times, log_values))
+                    self.t_read_ns = time.perf_counter_ns()
 
-                        if length_history != 0:
-                            signed = True if sens_data['encoding'] == int else False
-                            if num_values == 1:
-                                value = log_values[-sens_data['byte_length']:]
-                                value = int.from_bytes(value, 'little', signed=signed)
-                                sens_data['value'] = value
-                                # print(sens_data['value'])
-                                # --- Log the data ---
-                                if sens_data['logging'] and self.run_controls.active:
-                                    log_entry = self.serial_in_log.setdefault(sens_name, [])
-                                    for i in range(length_history):
-                                        t = log_times[i*4:i*4+4]
-                                        t = int.from_bytes(t, 'little', signed=False)
-                                        value = log_values[i*sens_data['byte_length']:i*sens_data['byte_length']+sens_data['byte_length']]
-                                        value = int.from_bytes(value, 'little', signed=signed)
-                                        log_entry.append((t, value))
-                            else:
-                                # example encoding for 3 communicated timepoints at 2 values of byte_length 2:
-                                # t0, t1, t2 -> t0_v0b0, t0_v0b1, t0_v1b0, t0_v1b1 -> 
-                                #               t1_v0b0, t1_v0b1, t1_v1b0, t1_v1b1 -> t2_v0b0, t2_v0b1, t2_v1b0, t2_v1b1
-                                if sens_data['logging']:
-                                    log_entry = self.serial_in_log.setdefault(sens_name, [])
-                                for i in range(length_history):
-                                    t = log_times[i*4:i*4+4]
-                                    t = int.from_bytes(t, 'little', signed=False)
-                                    values_bytes = log_values[i*sens_data['byte_length']*num_values:i*sens_data['byte_length']*num_values+(sens_data['byte_length']*num_values)]
-                                    values = []
-                                    for v in range(num_values):
-                                        value = values_bytes[v*sens_data['byte_length']:v*sens_data['byte_length']+sens_data['byte_length']]
-                                        value = int.from_bytes(value, 'little', signed=signed)
-                                        values.append(value)
-                                    if sens_data['logging'] and self.run_controls.active:
-                                        log_entry.append((t, values))
-                                sens_data['value'] = values
+                    for sens_name, sens_data, length_history, num_values, log_times, log_values in histories:
+                        if length_history == 0:
+                            continue
+                        signed = True if sens_data['encoding'] == int else False
+                        if log_values is None:
+                            self.update_history(sens_name, sens_data, *decode_compact_history(
+                                log_times, length_history, sens_data['byte_length'], signed, num_values))
+                        else:
+                            self.update_history(sens_name, sens_data, *decode_history(
+                                log_times, log_values, sens_data['byte_length'], signed, num_values))
+
+                if self.latency is not None:
+                    self.record_latency()
 
                 debug_in = None
                 if self.ser.in_waiting != 0:
@@ -192,6 +563,7 @@ class Networker(object):
                     print0(f'teensy sent {length_debug_in} bytes additional debug information:',
                            priority=3, color='green', topic='communication')
                     debug_in = self.ser.read(length_debug_in)
+                    self.bytes_in += 1 + len(debug_in)
                     debug_in = debug_in.decode()
                     print0(debug_in, priority=3, color='yellow', topic='teensy_debug')
 
@@ -215,27 +587,209 @@ class Networker(object):
             return True, None
 
 
+    def update_history(self, sens_name:str, sens_data:dict, times:np.ndarray, values:np.ndarray):
+        """Update a sensor's value with the most recent entry of a decoded archivist history
+        and add the whole history to the serial_in_log"""
+        if len(times) == 0:
+            return
+        # .tolist() provides python ints (or a list of ints for multi-value sensors)
+        sens_data['value'] = values[-1].tolist()
+        # --- Log the data ---
+        if sens_data['logging'] and self.run_controls.active:
+            if self.t_offset_ms != 0:
+                times = times.astype(np.int32) + self.t_offset_ms
+            history_for(self.serial_in_log, sens_name, sens_data).extend_arrays(times, values)
+
+    def await_answer(self) -> bool:
+        """wait_mode='wait': sleep in the kernel until shortly before the expected answer, then spin.
+        Late answers are awaited in the kernel for up to max_wait_ns.
+
+        Returns:
+            bool: whether the answer has started to arrive
+        """
+        now = time.perf_counter_ns()
+        t_spin_start = self.t_write_ns + self.expected_answer_ns - self.spin_ns
+        t_spin_end = self.t_write_ns + self.expected_answer_ns + self.spin_ns
+        if now < t_spin_start:
+            self.sleep_until_readable((t_spin_start - now) / 1e9)
+            now = time.perf_counter_ns()
+        if now < t_spin_end:
+            while time.perf_counter_ns() < t_spin_end:
+                if self.ser.in_waiting != 0:
+                    return True
+        self.sleep_until_readable(self.max_wait_ns / 1e9)
+        return self.ser.in_waiting != 0
+
+    def sleep_until_readable(self, timeout_s:float):
+        """sleep until the serial port has input or the timeout passed"""
+        if self.ser.in_waiting != 0:
+            return
+        if self.fileno is not None:
+            select.select([self.fileno], [], [], timeout_s)
+        else:
+            # windows serial handles can't be selected
+            time.sleep(timeout_s)
+
+    def report_cpu(self):
+        """Provide the CPU usage of the process and of the thread calling read_teensy_data() in threads_info"""
+        now = time.perf_counter_ns()
+        elapsed_ns = now - self.t_cpu_wall_ns
+        if elapsed_ns < 500_000_000:
+            return
+        process, thread = time.process_time(), time.thread_time()
+        self.threads_info['cpu_process'] = round((process - self.t_cpu_process) * 1e11 / elapsed_ns, 1)
+        self.threads_info['cpu_networker'] = round((thread - self.t_cpu_thread) * 1e11 / elapsed_ns, 1)
+        self.t_cpu_wall_ns, self.t_cpu_process, self.t_cpu_thread = now, process, thread
+
+    def record_latency(self):
+        """Add the durations of the current communication to the latency histograms"""
+        t_done = time.perf_counter_ns()
+        if self.t_write_ns != 0:
+            self.latency['answer'].record(self.t_first_byte_ns - self.t_write_ns)
+            self.latency['round_trip'].record(t_done - self.t_write_ns)
+        self.latency['read'].record(self.t_read_ns - self.t_first_byte_ns)
+        self.latency['decode'].record(t_done - self.t_read_ns)
+        # computing percentiles has a cost - refresh the live values twice per second
+        if t_done - self.t_latency_published_ns > 500_000_000:
+            self.t_latency_published_ns = t_done
+            self.threads_info['latency_networker'] = {stage: hist.live() for stage, hist in self.latency.items()}
+
+    def latency_log_key(self) -> str:
+        return 'networker latency (us)' if self.name is None else f'networker latency {self.name} (us)'
+
+    def latency_summary(self) -> dict:
+        """Summaries (count, mean, p50, p90, p99, max, histogram) of every measured stage in microseconds"""
+        if self.latency is None:
+            return {}
+        return {stage: hist.summary() for stage, hist in self.latency.items()}
+
+    def read_frame(self, ordered_in_values):
+        """Framed protocol counterpart of read_teensy_data(). The whole packet is read with a single
+        call into the reusable frame_buffer and parsed from a memoryview.
+        Packet layout: FRAME_MAGIC, 4 byte payload length, payload. The payload contains the direct mode
+        sensor bytes or the archivist mode histories, followed by a debug length byte and the debug string."""
+        self.ser.readinto(self.frame_header)
+        if self.frame_header[:len(FRAME_MAGIC)] != FRAME_MAGIC:
+            print0(f'received an invalid frame header {bytes(self.frame_header)} - resetting the input buffer',
+                   priority=2, color='red', topic='connection')
+            self.ser.reset_input_buffer()
+            return True, None
+        length = int.from_bytes(self.frame_header[len(FRAME_MAGIC):], 'little')
+        if length > len(self.frame_buffer):
+            self.frame_buffer = bytearray(max(length, 2 * len(self.frame_buffer)))
+        frame = memoryview(self.frame_buffer)[:length]
+        num_read = self.ser.readinto(frame)
+        self.t_read_ns = time.perf_counter_ns()
+        self.bytes_in += FRAME_HEADER_LENGTH + num_read
+        if num_read != length:
+            print0(f'received {num_read} of {length} frame bytes at {datetime.now()}',
+                   priority=1, color='red', topic='connection')
+            return True, None
+        print0(f'length of frame from teensy: {length}, frame bytes: {bytes(frame)}',
+               priority=3, color='green', topic='communication')
+
+        position = 0
+        if not self.archivist_mode:
+            if self.direct_decoder is None or not self.direct_decoder.matches(ordered_in_values):
+                self.direct_decoder = Direct_Decoder(ordered_in_values)
+            self.direct_decoder.decode(frame)
+            position = self.direct_decoder.size
+        else:
+            for sens_name, sens_data in ordered_in_values.items():
+                length_history = int.from_bytes(frame[position:position+2], 'little', signed=False)
+                position += 2
+                num_values = 1
+                if type(sens_data['value'])==list:
+                    num_values = len(sens_data['value'])
+                signed = True if sens_data['encoding'] == int else False
+                if sens_data.get('compact', False):
+                    if length_history > 1:
+                        length_block = int.from_bytes(frame[position:position+2], 'little', signed=False)
+                        position += 2
+                    else:
+                        length_block = length_history * (4 + sens_data['byte_length'] * num_values)
+                    if length_history != 0:
+                        self.update_history(sens_name, sens_data, *decode_compact_history(
+                            frame[position:position+length_block], length_history, sens_data['byte_length'],
+                            signed, num_values))
+                    position += length_block
+                    continue
+                log_times = frame[position:position + length_history*4]
+                position += length_history * 4
+                log_values = frame[position:position + length_history*sens_data['byte_length']*num_values]
+                position += length_history * sens_data['byte_length'] * num_values
+                if length_history != 0:
+                    self.update_history(sens_name, sens_data, *decode_history(
+                        log_times, log_values, sens_data['byte_length'], signed, num_values))
+
+        if self.latency is not None:
+            self.record_latency()
+
+        debug_in = None
+        length_debug_in = frame[position] if position < length else 0
+        if length_debug_in != 0:
+            print0(f'teensy sent {length_debug_in} bytes additional debug information:',
+                   priority=3, color='green', topic='communication')
+            debug_in = bytes(frame[position+1:position+1+length_debug_in]).decode()
+            print0(debug_in, priority=3, color='yellow', topic='teensy_debug')
+        return True, debug_in
+
+    def negotiate_protocol(self, ordered_out_values, framed:bool=True, wait_s:float=1.0):
+        """Ask the teensy to answer in the framed (framed=True) or legacy (framed=False) protocol.
+        The request is sent as a start_stop value that legacy firmware ignores, so older teensy code 
+        keeps working with the legacy protocol. Run this before the first regular write_teensy_data().
+        The answer to the request is consumed.
+
+        Returns:
+            bool: whether the teensy now uses the framed protocol
+        """
+        ordered_out_values['start_stop']['value'] = START_STOP_FRAMED if framed else START_STOP_LEGACY
+        self.framed = False
+        self.write_teensy_data(ordered_out_values)
+        t_start = time.perf_counter()
+        while self.ser.in_waiting == 0 and time.perf_counter() - t_start < wait_s:
+            time.sleep(0.0005)
+
+        if self.ser.read(len(FRAME_MAGIC)) == FRAME_MAGIC:
+            length = int.from_bytes(self.ser.read(4), 'little')
+            self.ser.read(length)
+            self.framed = True
+        else:
+            # legacy answer - let the rest of it arrive and discard it
+            time.sleep(0.05)
+            self.ser.reset_input_buffer()
+        if framed and not self.framed:
+            print0('the teensy did not answer in the framed protocol - it may use older firmware. ' +
+                   'Continuing with the legacy protocol', priority=1, color='yellow', topic='connection')
+        else:
+            print0(f'using the {"framed" if self.framed else "legacy"} protocol',
+                   priority=3, color='green', topic='connection')
+        return self.framed
+
     def write_teensy_data(self, ordered_out_values):
         """write the provided ordered_out_values to the teensy to control its behavior.
         Boolean values will be sent as byte \x01 for True and \x00 for False.
         The function returns a boolean for success or failure of the writing"""
 
-        bytes_out = b''
-        for data_point in ordered_out_values.values():
-            if(data_point['encoding'] == bool):
-                byte_out = b'\x01' if data_point['value'] == True else b'\x00'
-            elif(data_point['encoding'] == 'uint'):
-                byte_out = data_point['value'].to_bytes(data_point['byte_length'], 'little', signed=False)
-            bytes_out += byte_out
-            if data_point['reset_after_send'] == True:
-                data_point['value'] = data_point['default']
+        if self.out_buffer is None or not self.out_buffer.matches(ordered_out_values):
+            self.out_buffer = Out_Buffer(ordered_out_values)
+        if self.latency is not None:
+            start_stop = ordered_out_values['start_stop']['value']
+            if start_stop == 1:
+                # a new session - measure from here on
+                [hist.reset() for hist in self.latency.values()]
+            elif start_stop == 2:
+                self.serial_in_log[self.latency_log_key()] = self.latency_summary()
+        bytes_out = self.out_buffer.update()
 
-        print0(f'sending {len(bytes_out)} bytes to teensy: {bytes_out} '+\
-               f'at {datetime.now()} ({self.ser.out_waiting} bytes out_waiting)',
-               priority=3, color='green', topic='communication')
+        if self.verbose_communication:
+            print0(f'sending {len(bytes_out)} bytes to teensy: {bytes(bytes_out)} '+\
+                   f'at {datetime.now()} ({self.ser.out_waiting} bytes out_waiting)',
+                   priority=3, color='green', topic='communication')
 
         try:
             self.ser.write(bytes_out)
+            self.t_write_ns = time.perf_counter_ns()
             return True
         except serial.SerialTimeoutException as e:
             print0(f'Write timeout at {datetime.now()}', priority=1, color='red', topic='connection')
@@ -248,10 +802,305 @@ class Networker(object):
     def close(self):
         self.ser.close()
 
+class Threaded_Networker():
+    """Runs a Networker in a dedicated I/O thread that owns the serial port and keeps communicating
+    with the teensy at full rate, independent of how long the main loop takes per iteration.
+
+    The I/O thread reads into its own copy of serial_in (the back buffer) and after every communication
+    publishes an immutable snapshot of all values (the front buffer) with a single reference assignment.
+    read_teensy_data() copies the newest snapshot into the main loop's serial_in. write_teensy_data() hands
+    the current serial_out values to the I/O thread through a deque, where pending reset_after_send 
+    commands (i.e. a timed_on reward) are never overwritten by a later reset default. Appending to and 
+    popping from a deque and swapping a reference are atomic, so neither side ever waits on a lock.
+    Logging of serial_in is performed by the I/O thread in both archivist and direct mode.
+
+    Args:
+        networker (Networker): The connected networker to run in the I/O thread
+        serial_in (dict): The serial_in dictionary used by the main loop
+        serial_out (dict): The serial_out dictionary used by the main loop
+        serial_in_log (dict, optional): The log to add direct mode serial_in changes to. Defaults to {}.
+        threads_info (dict, optional): threads_info['framerate_networker'] and ['kB/s_networker'] will be updated
+                                       with the communications and received kilobytes per second. Defaults to {}.
+        poll_interval_s (float, optional): Sleep of the I/O thread while awaiting the teensy's answer. Defaults to 0.0002.
+    """
+    def __init__(self, networker:Networker, serial_in:dict, serial_out:dict, serial_in_log:dict={},
+                 threads_info:dict={}, poll_interval_s:float=0.0002):
+        self.netw = networker
+        self.run_controls = networker.run_controls
+        self.serial_in_log = serial_in_log
+        self.threads_info = threads_info
+        self.poll_interval_s = poll_interval_s
+        # serial_in logging is taken care of by the I/O thread, the main loop doesn't need to log_serial()
+        self.archivist_mode = True
+        self.direct_logging = not networker.archivist_mode
+
+        self.main_in_points = tuple(serial_in.values())
+        self.io_serial_in = {k: dict(v) for k, v in serial_in.items()}
+        self.io_in_points = tuple(self.io_serial_in.values())
+        self.log_plan = Change_Log_Plan(self.io_serial_in, serial_in_log) if self.direct_logging else None
+
+        self.main_reset_points = tuple(v for v in serial_out.values() if v['reset_after_send'] == True)
+        self.io_serial_out = {k: dict(v) for k, v in serial_out.items()}
+        self.io_out_points = tuple(self.io_serial_out.values())
+
+        # (communication number, values) - replaced as a whole by the I/O thread
+        self.snapshot:tuple[int, tuple] = (0, tuple(v['value'] for v in self.io_in_points))
+        self.snapshot_read = 0
+        self.commands:deque[tuple] = deque()
+        self.debug_in:deque[str] = deque()
+
+        # the teensy clock's lead over the host's perf_counter in ns, the maximum within a second of communications.
+        # Answers are only ever delayed, so the maximum is the closest estimate. Used to align multiple boards.
+        self.clock_lead_ns:int|None = None
+        self.clock_lead_window_ns:int|None = None
+        # after a start the answer to it still carries the previous clock's t_ms (stale_t_ms) - clock leads are only
+        # estimated again once t_ms differs from it
+        self.await_restarted_clock = False
+        self.stale_t_ms:int|None = None
+
+        self.running = False
+        self.closing = False
+        name = 'networker' if networker.name is None else f'networker_{networker.name}'
+        self.thread = Thread(target=self.communicate, name=name, daemon=True)
+
+    def initialize_communication(self, num_bytes_out=3):
+        pass
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread.start()
+
+    def communicate(self):
+        """The I/O thread - write, await the answer, publish, repeat"""
+        communications = 0
+        t_rate = time.perf_counter()
+        bytes_in = self.netw.bytes_in
+        self.write_commands()
+        while True:
+            data_updated, debug_in = self.netw.read_teensy_data(self.io_serial_in)
+            if not data_updated:
+                if self.closing and time.perf_counter_ns() - self.netw.t_write_ns > CLOSING_ANSWER_TIMEOUT_NS:
+                    # the teensy doesn't answer anymore - send the pending commands without awaiting it
+                    if len(self.commands) != 0:
+                        self.write_commands()
+                    break
+                time.sleep(self.poll_interval_s)
+                continue
+            self.update_clock_lead()
+            if self.direct_logging and self.run_controls.active:
+                self.log_serial()
+            self.snapshot = (self.snapshot[0] + 1, tuple([v['value'] for v in self.io_in_points]))
+            if debug_in is not None:
+                self.debug_in.append(debug_in)
+
+            if self.closing and len(self.commands) == 0:
+                break
+            self.write_commands()
+
+            communications += 1
+            if time.perf_counter() - t_rate >= 1.0:
+                elapsed = time.perf_counter() - t_rate
+                self.threads_info['framerate_networker'] = communications / elapsed
+                self.threads_info['kB/s_networker'] = round((self.netw.bytes_in - bytes_in) / elapsed / 1000, 2)
+                self.clock_lead_ns, self.clock_lead_window_ns = self.clock_lead_window_ns, None
+                communications, t_rate, bytes_in = 0, time.perf_counter(), self.netw.bytes_in
+        self.running = False
+
+    def write_commands(self):
+        """Send serial_out with the pending commands applied"""
+        self.apply_commands()
+        if self.io_serial_out['start_stop']['value'] == 1:
+            # the teensy clock restarts - earlier clock leads no longer apply
+            self.clock_lead_ns, self.clock_lead_window_ns = None, None
+            self.await_restarted_clock, self.stale_t_ms = True, None
+        self.netw.write_teensy_data(self.io_serial_out)
+
+    def update_clock_lead(self):
+        """Add the teensy clock's lead over the host clock at the received answer to the current window"""
+        t_ms = self.io_serial_in['t_ms']['value']
+        if self.await_restarted_clock:
+            if self.stale_t_ms is None:
+                # the answer to the start
+                self.stale_t_ms = t_ms
+                return
+            if t_ms == self.stale_t_ms:
+                return
+            self.await_restarted_clock = False
+        clock_lead_ns = t_ms * 1_000_000 - self.netw.t_first_byte_ns
+        if self.clock_lead_window_ns is None or clock_lead_ns > self.clock_lead_window_ns:
+            self.clock_lead_window_ns = clock_lead_ns
+
+    def apply_commands(self):
+        while len(self.commands) != 0:
+            values = self.commands.popleft()
+            for data_point, value in zip(self.io_out_points, values):
+                if data_point['reset_after_send'] == True and value == data_point['default']:
+                    # don't let a later reset override a yet unsent command
+                    continue
+                data_point['value'] = value
+
+    def log_serial(self):
+        self.log_plan.log_changes(self.io_serial_in['t_ms']['value'] + self.netw.t_offset_ms)
+
+    def read_teensy_data(self, serial_in):
+        """Update serial_in with the most recent snapshot published by the I/O thread. Returns False
+        if no communication has completed since the last call"""
+        self.start()
+        snapshot = self.snapshot
+        if snapshot[0] == self.snapshot_read:
+            return False, None
+        self.snapshot_read = snapshot[0]
+        for data_point, value in zip(self.main_in_points, snapshot[1]):
+            data_point['value'] = value
+        debug_in = None
+        if len(self.debug_in) != 0:
+            debug_in = ''.join([self.debug_in.popleft() for _ in range(len(self.debug_in))])
+        return True, debug_in
+
+    def write_teensy_data(self, serial_out):
+        """Hand the current serial_out values to the I/O thread for its next communication"""
+        self.start()
+        if serial_out['start_stop']['value'] == 2 and self.netw.latency is not None:
+            # the main loop saves the log right after stopping - provide the summary without awaiting the I/O thread
+            self.serial_in_log[self.netw.latency_log_key()] = self.netw.latency_summary()
+        self.commands.append(tuple([v['value'] for v in serial_out.values()]))
+        for data_point in self.main_reset_points:
+            data_point['value'] = data_point['default']
+        return True
+
+    def stop(self, timeout_s:float=1.0):
+        """Send all pending commands and await the I/O thread's last communication and logging"""
+        self.closing = True
+        if self.running:
+            self.thread.join(timeout_s)
+
+    def close(self, timeout_s:float=1.0):
+        """Send all pending commands, then stop the I/O thread and close the connection"""
+        self.stop(timeout_s)
+        self.netw.close()
+
+class Multi_Networker():
+    """Communicates with several teensy boards concurrently, every board through its own Threaded_Networker.
+
+    Sensors and controls are assigned to a board with the 'board' key of their serial_in/serial_out entry
+    (see configurators.on_board()), entries without it belong to the primary board (None). Every board's
+    Threaded_Networker updates the very entry dicts of serial_in, so the values of all boards share one
+    namespace in get.read_in(). Secondary boards get their own time sensor 't_ms_<board>', added to a copy of
+    serial_in provided as Multi_Networker.serial_in, and their own start_stop control, which mirrors serial_out['start_stop'] so all boards
+    start and stop together.
+    The boards' clocks are aligned to the primary board's t_ms: every board's clock lead over the host clock
+    is estimated from its answers within every second of communications, and the difference to the primary
+    board's lead is added to the timestamps logged for the board's sensors. Per board communication rates, received kB/s, latency and clock offset
+    are provided in threads_info['boards'][board or 'main'].
+
+    Args:
+        networkers (dict[str | None, Networker]): The connected networker of every board. The primary board's key is None.
+        serial_in (dict): The serial_in dictionary used by the main loop, containing the sensors of all boards
+        serial_out (dict): The serial_out dictionary used by the main loop, containing the controls of all boards
+        serial_in_log (dict, optional): The log shared by all boards. Defaults to {}.
+        framed (bool, optional): Negotiate the framed protocol with every board. Defaults to False.
+    """
+    def __init__(self, networkers:dict[str|None, Networker], serial_in:dict, serial_out:dict,
+                 serial_in_log:dict={}, framed:bool=False):
+        if None not in networkers:
+            raise ValueError('Multi_Networker requires a primary board networker with the key None')
+        unknown = {v['board'] for v in (*serial_in.values(), *serial_out.values())
+                   if v.get('board') is not None and v['board'] not in networkers}
+        if len(unknown) != 0:
+            raise ValueError(f'serial_in/serial_out entries are assigned to the unknown boards {unknown}. ' +
+                             f'Available boards: {[b for b in networkers if b is not None]}')
+        self.serial_in_log = serial_in_log
+        self.archivist_mode = True
+        # the caller's serial_in with the secondary boards' times - the caller's dict isn't extended
+        self.serial_in = dict(serial_in)
+        self.serial_out = serial_out
+        self.boards:dict[str|None, Threaded_Networker] = {}
+        self.boards_out:dict[str|None, dict] = {}
+
+        for board, networker in networkers.items():
+            if board is None:
+                board_in = {k: v for k, v in serial_in.items() if v.get('board') is None}
+                board_out = {k: v for k, v in serial_out.items() if v.get('board') is None}
+            else:
+                # the board's own clock and start_stop lead its subsets just like config2teensy lays them out
+                t_ms = {'value': 0, 'encoding': 'uint', 'byte_length': 4, 'logging': False, 'board': board}
+                self.serial_in[f't_ms_{board}'] = t_ms
+                board_in = {'t_ms': t_ms, **{k: v for k, v in serial_in.items() if v.get('board') == board}}
+                start_stop = {'value': 0, 'encoding': 'uint', 'byte_length': 1, 'default': 0,
+                              'reset_after_send': True, 'board': board}
+                board_out = {'start_stop': start_stop, **{k: v for k, v in serial_out.items()
+                                                          if v.get('board') == board}}
+            if framed:
+                networker.negotiate_protocol(board_out)
+            self.boards[board] = Threaded_Networker(networker, board_in, board_out, serial_in_log=serial_in_log,
+                                                    threads_info=networker.threads_info)
+            self.boards_out[board] = board_out
+
+    def initialize_communication(self, num_bytes_out=3):
+        pass
+
+    def align_clocks(self):
+        """Update every secondary board's clock offset to the primary board"""
+        primary_lead_ns = self.boards[None].clock_lead_ns
+        if primary_lead_ns is None:
+            return
+        for board, networker in self.boards.items():
+            if board is None or networker.clock_lead_ns is None:
+                continue
+            t_offset_ms = round((primary_lead_ns - networker.clock_lead_ns) / 1_000_000)
+            networker.netw.t_offset_ms = t_offset_ms
+            networker.threads_info['t_offset_ms'] = t_offset_ms
+
+    def read_teensy_data(self, serial_in):
+        """Update serial_in with the most recent values of every board. Returns False if no board has
+        completed a communication since the last call"""
+        data_updated, debug_in = False, []
+        for board, networker in self.boards.items():
+            board_updated, board_debug_in = networker.read_teensy_data(None)
+            data_updated = data_updated or board_updated
+            if board_debug_in is not None:
+                debug_in.append(board_debug_in if board is None else f'[{board}] {board_debug_in}')
+        if data_updated:
+            self.align_clocks()
+        return data_updated, ''.join(debug_in) if len(debug_in) != 0 else None
+
+    def write_teensy_data(self, serial_out):
+        """Hand every board its serial_out values. The secondary boards' start_stop follows serial_out['start_stop']"""
+        start_stop = serial_out['start_stop']['value']
+        for board, board_out in self.boards_out.items():
+            if board is not None:
+                board_out['start_stop']['value'] = start_stop
+        if start_stop == 2:
+            self.serial_in_log['boards'] = {board or 'main': {'t_offset_ms': networker.netw.t_offset_ms}
+                                            for board, networker in self.boards.items()}
+        for board, networker in self.boards.items():
+            networker.write_teensy_data(self.boards_out[board])
+        return True
+
+    def stop(self, timeout_s:float=1.0):
+        """Await every board's last communication and logging"""
+        for networker in self.boards.values():
+            networker.closing = True
+        for networker in self.boards.values():
+            networker.stop(timeout_s)
+
+    def close(self, timeout_s:float=1.0):
+        self.stop(timeout_s)
+        for networker in self.boards.values():
+            networker.close(timeout_s)
+
 class Dummy_Networker():
-    """A simple Dummy networker that instead of communicating with a teensy allows using local inputs like the keyboard or an agent"""
+    """A simple Dummy networker that instead of communicating with a teensy allows using local inputs like the keyboard or an agent
+
+    Args:
+        mode (str, optional): 'keyboard' or 'agent'. Defaults to 'keyboard'.
+        agent (class, optional): A class with a def act() method and an act_freq to run when mode='agent'.
+        time_step_ms (int | None, optional): Virtual clock - advance t_ms by this fixed step at every read_teensy_data()
+            instead of following the wall clock. Defaults to None (wall clock).
+    """
 
-    def __init__(self, mode='keyboard', agent=None, *args, **kwargs):
+    def __init__(self, mode='keyboard', agent=None, time_step_ms:int|None=None, *args, **kwargs):
         print('running dummy networker for keyboard inputs - no connected teensy needed.\n' +
               'Press ctrl+alt+k to toggle the key input recognition active/inactive')
         self.controlled_serial_in:list[str] = []
@@ -260,18 +1109,31 @@ class Dummy_Networker():
         self.mode=mode
         self.agent = agent
         self.t_last_agent_act = 0
+        self.time_step_ms = time_step_ms
+        self.virtual_t_ms = 0
+        self.wall_start_s = time.perf_counter()
+        if self.time_step_ms is not None:
+            print0(f'virtual clock: t_ms advances {self.time_step_ms} ms per main loop iteration',
+                   priority=3, color='cyan', topic='connection')
 
     def initialize_communication(self, num_bytes_out=3):
         pass
 
     def read_teensy_data(self, serial_in):
         # time
-        if self.start_time is None:
-            self.start_time = time.time_ns() / 1_000_000.
-        if 't_ms' in serial_in.keys():
-            serial_in['t_ms']['value'] = int((time.time_ns() / 1_000_000.) - self.start_time)
-        if 't_us' in serial_in.keys():
-            serial_in['t_us']['value'] = int((time.time_ns() / 1_000.) - self.start_time)
+        if self.time_step_ms is not None:
+            self.virtual_t_ms += self.time_step_ms
+            if 't_ms' in serial_in.keys():
+                serial_in['t_ms']['value'] = self.virtual_t_ms
+            if 't_us' in serial_in.keys():
+                serial_in['t_us']['value'] = self.virtual_t_ms * 1000
+        else:
+            if self.start_time is None:
+                self.start_time = time.time_ns() / 1_000_000.
+            if 't_ms' in serial_in.keys():
+                serial_in['t_ms']['value'] = int((time.time_ns() / 1_000_000.) - self.start_time)
+            if 't_us' in serial_in.keys():
+                serial_in['t_us']['value'] = int((time.time_ns() / 1_000.) - self.start_time)
 
         if self.mode == 'keyboard':
             # custom key presses
@@ -288,7 +1150,8 @@ class Dummy_Networker():
                     serial_in[device]['value'] = serial_in[device]['keys_control'](keys_pressed)
                 elif num_args == 2:
                     serial_in[device]['value'] = serial_in[device]['keys_control'](keys_pressed, serial_in[device]['value'])
-        elif self.mode == 'agent':
+        elif self.mode == 'agent' and self.agent is not None:
+            # without an agent the serial_in values are set externally, i.e. by vector_env
             if serial_in['t_ms']['value'] > self.t_last_agent_act + (1000 / self.agent.act_freq):
                 self.t_last_agent_act = serial_in['t_ms']['value']
                 self.agent.act()
@@ -299,12 +1162,19 @@ class Dummy_Networker():
         for key, data_point in serial_out.items():
             if key == 'start_stop' and data_point['value'] == 1:
                 self.start_time = time.time_ns() / 1_000_000.
+                self.virtual_t_ms = 0
+                self.t_last_agent_act = 0
+                self.wall_start_s = time.perf_counter()
             if data_point['reset_after_send'] == True:
                 data_point['value'] = data_point['default']
         return True
     
     def close(self):
-        pass
+        if self.time_step_ms is not None:
+            wall_s = time.perf_counter() - self.wall_start_s
+            print0(f'virtual clock: simulated {self.virtual_t_ms / 1000:.1f} s in {wall_s:.1f} s ' +
+                   f'({self.virtual_t_ms / 1000 / max(wall_s, 1e-9):.0f}x real time)',
+                   priority=3, color='cyan', topic='connection')
 
 def list_serial():
     """List information of connected serial devices.
@@ -0,0 +1,204 @@
+"""Raw frame recording to memory-mapped files - configurators.Camera(save_as_raw=True) - and its transcoding.
+
+During the session every frame is copied into a preallocated, memory-mapped .npy segment file, alongside
+a sidecar segment of (#frame, t_ms) rows, so no encoding competes with the capture. After the camera has
+shut down, a separate process transcodes the segments in parallel with the camera's vid_ settings,
+joins them into the video file and deletes the raw files once the video's frame count is verified.
+
+The raw folder (<log folder>/<camera name>_raw) of an interrupted session can be transcoded manually from
+the neurokraken package folder with
+    python -m core.raw_recording <raw folder> [--keep]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import threading
+from pathlib import Path
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import cv2
+from core.print0 import print0
+from core.video_writers import open_video_writer
+
+SETTINGS = 'settings.json'
+# the camera configuration values the transcoding needs
+VIDEO_SETTINGS = ('name', 'fps', 'vid_container', 'vid_codec', 'vid_writer', 'vid_ffmpeg_codec', 'vid_preset',
+                  'vid_crf', 'vid_pix_fmt', 'vid_queue_size', 'save_as_vid')
+
+class Raw_Writer:
+    """Copies frames into memory-mapped .npy segments of segment_frames frames each.
+
+    Args:
+        folder (str): The raw folder to create
+        settings (dict): The camera configuration's values (vars(camera)), saved for the transcoding
+        segment_frames (int): Frames per segment file
+        bgr (bool): Whether colored frames are BGR (cv2) rather than RGB
+    """
+    def __init__(self, folder:str, settings:dict, segment_frames:int, bgr:bool):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.settings = {key: settings[key] for key in VIDEO_SETTINGS}
+        self.segment_frames = max(segment_frames, 1)
+        self.bgr = bgr
+        self.segment:tuple[np.ndarray, np.ndarray]|None = None
+        self.next_segment:tuple[np.ndarray, np.ndarray]|None = None
+        self.preparing:threading.Thread|None = None
+        self.num_segments = 0
+        self.row = 0
+
+    def open_segment(self, index:int, shape:tuple, dtype:np.dtype) -> tuple[np.ndarray, np.ndarray]:
+        # .npy files are preallocated sparsely - pages are only written once frames are copied in
+        frames = np.lib.format.open_memmap(os.path.join(self.folder, f'{index:05d}.npy'), mode='w+', dtype=dtype,
+                                           shape=(self.segment_frames, *shape))
+        # (#frame, t_ms) rows, -1 for rows without a frame
+        meta = np.lib.format.open_memmap(os.path.join(self.folder, f'{index:05d}.meta.npy'), mode='w+',
+                                         dtype=np.int64, shape=(self.segment_frames, 2))
+        meta[:] = -1
+        return frames, meta
+
+    def prepare_next(self, shape:tuple, dtype:np.dtype):
+        """Create the following segment in a thread, so switching segments doesn't stall the capture"""
+        def prepare():
+            self.next_segment = self.open_segment(self.num_segments, shape, dtype)
+        self.preparing = threading.Thread(target=prepare, name='raw_segment', daemon=True)
+        self.preparing.start()
+
+    def start(self, frame:np.ndarray):
+        height, width = frame.shape[:2]
+        with open(os.path.join(self.folder, SETTINGS), 'w') as f:
+            json.dump({**self.settings, 'width': width, 'height': height, 'shape': frame.shape,
+                       'dtype': frame.dtype.str, 'bgr': self.bgr, 'segment_frames': self.segment_frames}, f, indent=2)
+        self.segment = self.open_segment(0, frame.shape, frame.dtype)
+        self.num_segments = 1
+        self.prepare_next(frame.shape, frame.dtype)
+
+    def write(self, frame, frame_idx:int, t_ms:int) -> bool:
+        if isinstance(frame, cv2.UMat):
+            frame = frame.get()
+        if self.segment is None:
+            self.start(frame)
+        elif self.row == self.segment_frames:
+            self.preparing.join()
+            self.segment, self.next_segment = self.next_segment, None
+            self.num_segments += 1
+            self.row = 0
+            self.prepare_next(frame.shape, frame.dtype)
+        frames, meta = self.segment
+        frames[self.row] = frame
+        meta[self.row] = frame_idx, t_ms
+        self.row += 1
+        return True
+
+    def close(self, transcode:bool=True):
+        """Close the segments and start transcoding them in a separate process"""
+        if self.segment is None:
+            shutil.rmtree(self.folder, ignore_errors=True)
+            return
+        self.preparing.join()
+        self.segment = self.next_segment = None
+        # the prepared and unused segment
+        for suffix in ('.npy', '.meta.npy'):
+            os.remove(os.path.join(self.folder, f'{self.num_segments:05d}{suffix}'))
+        if transcode and self.settings['save_as_vid']:
+            start_transcoding(self.folder)
+
+def start_transcoding(folder:str) -> subprocess.Popen:
+    """Transcode a raw folder in a separate process that continues after the task's process has ended"""
+    package_dir = Path(__file__).parent.parent
+    print0(f'transcoding the raw frames of {folder} in the background', priority=2, color='blue', topic='camera')
+    return subprocess.Popen([sys.executable, '-m', 'core.raw_recording', str(Path(folder).resolve())],
+                            cwd=package_dir)
+
+def segments(folder:str) -> list[tuple[np.ndarray, np.ndarray]]:
+    """The (frames, meta) of the recorded rows of every segment"""
+    files = sorted(p for p in Path(folder).glob('*.npy') if not p.name.endswith('.meta.npy'))
+    recorded = []
+    for path in files:
+        meta = np.load(path.with_suffix('.meta.npy'), mmap_mode='r')
+        rows = int(np.count_nonzero(meta[:, 0] >= 0))
+        if rows != 0:
+            recorded.append((np.load(path, mmap_mode='r')[:rows], meta[:rows]))
+    return recorded
+
+def transcode_segment(settings:dict, frames:np.ndarray, path:str):
+    greyscale = frames.ndim == 3
+    writer = open_video_writer(settings, path, settings['width'], settings['height'], greyscale, settings['bgr'],
+                               block=True)
+    convert = settings['vid_writer'] != 'ffmpeg' and not settings['bgr'] and not greyscale
+    for frame in frames:
+        # the cv2 writer expects BGR, the ffmpeg writer is told the channel order
+        writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) if convert else frame)
+    writer.release()
+
+def join_videos(parts:list[str], path:str):
+    if len(parts) == 1:
+        os.replace(parts[0], path)
+        return
+    import imageio_ffmpeg
+    list_path = path + '.parts.txt'
+    with open(list_path, 'w') as f:
+        f.writelines(f"file '{Path(part).resolve().as_posix()}'\n" for part in parts)
+    subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                    '-i', list_path, '-c', 'copy', path], check=True)
+    os.remove(list_path)
+    for part in parts:
+        os.remove(part)
+
+def count_frames(path:str) -> int:
+    capture = cv2.VideoCapture(path)
+    num_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return num_frames
+
+def transcode(folder:str, keep:bool=False, workers:int|None=None) -> bool:
+    """Transcode a raw folder into the camera's video file next to it.
+
+    Args:
+        folder (str): The raw folder
+        keep (bool, optional): Keep the raw files after a verified transcoding. Defaults to False.
+        workers (int | None, optional): Segments transcoded in parallel. Defaults to the number of CPUs.
+
+    Returns:
+        bool: whether the video was created and its frame count verified
+    """
+    t_start = time.perf_counter()
+    with open(os.path.join(folder, SETTINGS)) as f:
+        settings = json.load(f)
+    recorded = segments(folder)
+    num_frames = sum(len(frames) for frames, _ in recorded)
+    path = os.path.join(Path(folder).parent, f'{settings["name"]}.{settings["vid_container"]}')
+    if num_frames == 0:
+        print0(f'{folder} contains no frames', priority=1, color='red', topic='camera')
+        return False
+    parts = [os.path.join(folder, f'part{i:05d}.{settings["vid_container"]}') for i in range(len(recorded))]
+    workers = min(len(recorded), workers or os.cpu_count())
+    with ThreadPool(workers) as pool:
+        # cv2 releases the GIL while encoding and ffmpeg runs in its own process
+        pool.starmap(transcode_segment, [(settings, frames, part) for (frames, _), part in zip(recorded, parts)])
+    del recorded
+    join_videos(parts, path)
+
+    video_frames = count_frames(path)
+    if video_frames != num_frames:
+        print0(f'{path} has {video_frames} instead of {num_frames} frames - keeping the raw frames in {folder}',
+               priority=1, color='red', topic='camera')
+        return False
+    if not keep:
+        shutil.rmtree(folder)
+    print0(f'transcoded {num_frames} frames into {path} in {time.perf_counter() - t_start:.1f} s',
+           priority=2, color='green', topic='camera')
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Transcode the raw frames of a camera (save_as_raw=True) into its video')
+    parser.add_argument('folder', help='the <camera name>_raw folder in the session log folder')
+    parser.add_argument('--keep', action='store_true', help='keep the raw files after transcoding')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='segments transcoded in parallel')
+    args = parser.parse_args()
+    print0.set_topic_threshold('camera', 3)
+    sys.exit(0 if transcode(args.folder, args.keep, args.workers) else 1)
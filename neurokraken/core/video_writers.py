@@ -0,0 +1,144 @@
+"""Video writing through an ffmpeg process - configurators.Camera(vid_writer='ffmpeg').
+
+Frames are queued by the capture loop and piped as raw video into the ffmpeg binary bundled with
+imageio_ffmpeg by a writer thread, so encoding runs in parallel and a slow encoder drops frames from a
+bounded queue instead of stalling the capture.
+"""
+
+import subprocess
+import threading
+import queue
+import numpy as np
+import cv2
+from core.print0 import print0
+
+class Ffmpeg_Writer:
+    """Encode frames with ffmpeg, with the write()/release() interface of cv2.VideoWriter.
+
+    Args:
+        path (str): The video file, its container given by the suffix
+        width (int): The frame width
+        height (int): The frame height
+        fps (float): The playback framerate of the video file
+        bgr (bool, optional): Whether colored frames are BGR (cv2) rather than RGB. Defaults to True.
+        codec (str, optional): The ffmpeg encoder, i.e. 'libx264', 'libx265' or 'h264_nvenc'. Defaults to 'libx264'.
+        preset (str | None, optional): The encoder preset, None to not pass one. Defaults to 'ultrafast'.
+        crf (int | None, optional): The constant rate factor (quality, lower is better), None to not pass one. Defaults to 23.
+        pix_fmt (str, optional): The pixel format of the video file. Defaults to 'yuv420p'.
+        queue_size (int, optional): Frames waiting for the encoder before new frames are dropped. Defaults to 120.
+        block (bool, optional): Wait for space in a full queue instead of dropping the frame. Defaults to False.
+    """
+    def __init__(self, path:str, width:int, height:int, fps:float, bgr:bool=True, codec:str='libx264',
+                 preset:str|None='ultrafast', crf:int|None=23, pix_fmt:str='yuv420p', queue_size:int=120,
+                 block:bool=False):
+        import imageio_ffmpeg
+        self.ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        self.path = path
+        self.width, self.height, self.fps = width, height, fps
+        self.bgr = bgr
+        self.codec, self.preset, self.crf, self.pix_fmt = codec, preset, crf, pix_fmt
+        self.queue:queue.Queue = queue.Queue(maxsize=queue_size)
+        self.block = block
+        self.written = 0
+        self.dropped = 0
+        self.failed = False
+        # ffmpeg starts with the first frame, which defines the input pixel format
+        self.process:subprocess.Popen|None = None
+        self.thread:threading.Thread|None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def input_format(self, frame:np.ndarray) -> str:
+        if frame.ndim == 2:
+            return 'gray16le' if frame.dtype == np.uint16 else 'gray'
+        return 'bgr24' if self.bgr else 'rgb24'
+
+    def start(self, frame:np.ndarray):
+        command = [self.ffmpeg, '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', self.input_format(frame), '-s', f'{self.width}x{self.height}',
+                   '-framerate', str(self.fps), '-i', '-', '-an', '-c:v', self.codec]
+        if self.preset is not None:
+            command += ['-preset', self.preset]
+        if self.crf is not None:
+            command += ['-crf', str(self.crf)]
+        if self.width % 2 or self.height % 2:
+            # yuv420 encoders require even dimensions
+            command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+        command += ['-pix_fmt', self.pix_fmt, self.path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.thread = threading.Thread(target=self.encode, name='ffmpeg_writer', daemon=True)
+        self.thread.start()
+
+    def write(self, frame) -> bool:
+        """Queue a frame (np.ndarray or cv2.UMat) for encoding. Returns False if it was dropped"""
+        if isinstance(frame, cv2.UMat):
+            frame = frame.get()
+        if self.process is None:
+            self.start(frame)
+        if self.failed:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put(frame, block=self.block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def encode(self):
+        """The writer thread: pipe the queued frames into ffmpeg until release()"""
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.failed:
+                continue
+            try:
+                self.process.stdin.write(np.ascontiguousarray(frame).data)
+                self.written += 1
+            except (BrokenPipeError, OSError):
+                self.failed = True
+                print0(f'ffmpeg stopped encoding {self.path}: {self.process.stderr.read().decode(errors="replace")}',
+                       priority=1, color='red', topic='camera')
+
+    def release(self):
+        """Encode the queued frames and finish the video file"""
+        if self.process is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.wait()
+        if self.process.returncode != 0 and not self.failed:
+            print0(f'ffmpeg failed to finish {self.path}: {self.process.stderr.read().decode(errors="replace")}',
+                   priority=1, color='red', topic='camera')
+        if self.dropped != 0:
+            print0(f'{self.dropped} frames were dropped from {self.path} because the encoder could not keep up',
+                   priority=1, color='red', topic='camera')
+
+def open_video_writer(settings:dict, path:str, width:int, height:int, greyscale:bool, bgr:bool, block:bool=False):
+    """The video writer configured by the vid_ settings of a configurators.Camera (as dict, i.e. vars(camera))
+
+    Args:
+        settings (dict): The camera configuration's fps and vid_ values
+        path (str): The video file
+        width (int): The frame width
+        height (int): The frame height
+        greyscale (bool): Whether the frames are greyscale
+        bgr (bool): Whether colored frames are BGR (cv2) rather than RGB
+        block (bool, optional): Let the ffmpeg writer wait for its encoder instead of dropping frames. Defaults to False.
+
+    Returns:
+        Ffmpeg_Writer | cv2.VideoWriter: the writer
+    """
+    if settings['vid_writer'] == 'ffmpeg':
+        return Ffmpeg_Writer(path, width, height, settings['fps'], bgr=bgr, codec=settings['vid_ffmpeg_codec'],
+                             preset=settings['vid_preset'], crf=settings['vid_crf'], pix_fmt=settings['vid_pix_fmt'],
+                             queue_size=settings['vid_queue_size'], block=block)
+    fourcc = cv2.VideoWriter_fourcc(*settings['vid_codec'])
+    return cv2.VideoWriter(path, fourcc, settings['fps'], (width, height), isColor=not greyscale)
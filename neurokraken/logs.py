@@ -0,0 +1,274 @@
+"""Lazy reading of session logs without loading them as a whole.
+
+Sensor, control, camera and main loop timing histories are memory-mapped from the session's log_stream
+columns (see Neurokraken(log_stream_s=...)), so only the queried parts are read from disk. Trials, states,
+events and other lists are loaded at their first access. Sessions with only a saved log file (log.json or
+any other log_format) are converted to a log_stream folder once at their first opening.
+
+Example:
+    >>> from neurokraken import logs
+    >>> session = logs.open_session('logs/mouse1_2025-03-01_10;00;00')
+    >>> wheel = session.sensor('wheel').between(60_000, 120_000)
+    >>> print(wheel.times, wheel.values)
+    >>> print(session.trials[-1], session.control('reward_valve').at(90_000))
+    >>> print(session.frame_index_at('cam0', session.trials[-1]['start']))
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+from core.log_store import Log_History, row_format_from, frame_index_at, audio_sample_at, search_times
+from core.log_writer import Log_Writer, STREAM_DIR, MANIFEST, stream_file
+from core.log_formats import find_log, load_log
+
+class Column:
+    """A memory-mapped (t, value) history with binary search over its timestamps.
+
+    Args:
+        times (np.ndarray): The timestamps in ascending order
+        values (np.ndarray | None): The values, None for histories of times only like 't_main_loop'
+        row_format (Callable | None, optional): Formats (t, value) rows, i.e. adding camera video times. Defaults to None.
+    """
+    def __init__(self, times:np.ndarray, values:np.ndarray|None, row_format=None):
+        self.times = times
+        self.values = values
+        self.row_format = row_format
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def slice(self, start:int, end:int) -> 'Column':
+        values = self.values[start:end] if self.values is not None else None
+        return Column(self.times[start:end], values, self.row_format)
+
+    def between(self, t0:float, t1:float) -> 'Column':
+        """The entries with t0 <= t < t1"""
+        start, end = search_times(self.times, t0, side='left'), search_times(self.times, t1, side='left')
+        return self.slice(start, end)
+
+    def at(self, t:float):
+        """The value at time t - the most recent entry at or before t. None before the first entry"""
+        i = search_times(self.times, t) - 1
+        if i < 0:
+            return None
+        return self.times[i].item() if self.values is None else self.values[i].tolist()
+
+    def entry_at(self, t:float):
+        """The most recent (t, value) entry at or before t, without row_format. None before the first entry"""
+        i = search_times(self.times, t) - 1
+        if i < 0:
+            return None
+        return self.times[i].item() if self.values is None else (self.times[i].item(), self.values[i].tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_list()[index] if index.step not in (None, 1) else \
+                   self.slice(*index.indices(len(self))[:2]).to_list()
+        if self.values is None:
+            return self.times[index].item()
+        row = (self.times[index].item(), self.values[index].tolist())
+        return self.row_format(*row) if self.row_format is not None else row
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self) -> list:
+        """The entries as they appear in log.json"""
+        if self.values is None:
+            return self.times.tolist()
+        rows = zip(self.times.tolist(), self.values.tolist())
+        if self.row_format is not None:
+            return [self.row_format(t, v) for t, v in rows]
+        return list(rows)
+
+    def __repr__(self) -> str:
+        return f'Column({len(self)} entries)'
+
+class Session:
+    """A session log folder opened for lazy reading. Use open_session() to create it.
+
+    Args:
+        path (str | Path): The session's log folder
+    """
+    def __init__(self, path:str|Path):
+        self.path = Path(path)
+        self.stream_dir = self.path / STREAM_DIR
+        with open(self.stream_dir / MANIFEST) as f:
+            manifest = json.load(f)
+        self.complete:bool = manifest['complete']
+        """False if the session didn't quit normally - the log then ends at the last streamed interval"""
+        self.values:dict = manifest['values']
+        self.entries:dict[tuple, dict] = {tuple(entry['path']): entry for entry in manifest['entries']}
+        self.loaded:dict[tuple, Column|list] = {}
+
+    @property
+    def experiment_data(self) -> dict:
+        return self.values.get('experiment_data', {})
+
+    def keys(self) -> list:
+        """All top level log keys, as in log.json"""
+        keys = list(self.values.keys())
+        for path in self.entries:
+            if path[0] not in keys:
+                keys.append(path[0])
+        return keys
+
+    def get(self, *path:str) -> Column|list|dict:
+        """A log entry by its keys, i.e. get('controls', 'reward_valve') or get('trials')"""
+        if path in self.entries:
+            if path not in self.loaded:
+                self.loaded[path] = self.load(self.entries[path])
+            return self.loaded[path]
+        if len(path) == 1 and path[0] in self.values:
+            return self.values[path[0]]
+        group = {p[-1]: self.get(*p) for p in self.entries if p[:-1] == path}
+        if len(group) != 0:
+            return group
+        raise KeyError(f'{path} is not in the log of {self.path.name}')
+
+    def __getitem__(self, key:str):
+        return self.get(key)
+
+    def sensor(self, name:str) -> Column:
+        """The history of a logged serial_in entry"""
+        return self.get(name)
+
+    def control(self, name:str) -> Column:
+        """The history of a serial_out entry"""
+        return self.get('controls', name)
+
+    def camera(self, name:str) -> Column:
+        """The (t_ms, #frame, vid_time) history of a camera"""
+        return self.get('cameras (t_ms/#frame/vid_time)', name)
+
+    def microphone(self, name:str) -> Column|list:
+        """The (t_ms, #sample, audio_time) history of a microphone, an entry per recorded audio block. Logs of
+        earlier versions only have the (t_ms, audio_time) keyframes every 10 s, returned as list instead"""
+        if ('microphones (t_ms/#sample/audio_time)', name) in self.entries:
+            return self.get('microphones (t_ms/#sample/audio_time)', name)
+        return self.get('microphones (t_ms/audio_time)', name)
+
+    def frame_index_at(self, camera:str, t_ms:int) -> int|None:
+        """The number of the camera's frame captured most recently at or before t_ms"""
+        return frame_index_at(self.camera(camera), t_ms)
+
+    def audio_sample_at(self, microphone:str, t_ms:int) -> int|None:
+        """The number of the microphone's audio file sample recorded at t_ms"""
+        history = self.microphone(microphone)
+        if isinstance(history, list):
+            raise ValueError(f'the log of {self.path.name} only has 10 s keyframes of audio times for {microphone} - '
+                             'sample numbers are logged since the log key \'microphones (t_ms/#sample/audio_time)\'')
+        return audio_sample_at(history, t_ms)
+
+    @property
+    def trials(self) -> list:
+        return self.get('trials')
+
+    @property
+    def states(self) -> list:
+        return self.get('states')
+
+    @property
+    def blocks(self) -> list:
+        return self.get('blocks')
+
+    @property
+    def events(self) -> list:
+        return self.get('events')
+
+    def file(self, entry:dict, suffix:str) -> Path:
+        return stream_file(self.stream_dir, entry['index'], entry.get('generation', 0), suffix)
+
+    def load(self, entry:dict) -> Column|list:
+        rows = entry['rows']
+        if entry['kind'] == 'list':
+            with open(self.file(entry, '.jsonl')) as f:
+                return [json.loads(line) for _, line in zip(range(rows), f)]
+        times = self.memmap(self.file(entry, '.times'), entry['time_dtype'], (rows,))
+        values = None
+        if entry['value_dtype'] is not None:
+            shape = (rows,) if entry['num_values'] == 1 else (rows, entry['num_values'])
+            values = self.memmap(self.file(entry, '.values'), entry['value_dtype'], shape)
+        return Column(times, values, row_format_from(entry['row_format']))
+
+    def memmap(self, path:Path, dtype:str, shape:tuple) -> np.ndarray:
+        if shape[0] == 0:
+            # empty files can't be mapped
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+    def __repr__(self) -> str:
+        return f'Session({self.path.name}, {len(self.entries)} streamed entries)'
+
+def open_session(path:str|Path) -> Session:
+    """Open a session log folder for lazy reading. A session with only a saved log file is converted once to a
+    log_stream folder (this loads the log file a last time).
+
+    Args:
+        path (str | Path): The session's log folder (or its log file)
+
+    Returns:
+        Session: the opened session
+    """
+    path = Path(path)
+    if path.is_file():
+        path = path.parent
+    if not (path / STREAM_DIR / MANIFEST).exists():
+        convert_legacy(path)
+    return Session(path)
+
+def convert_legacy(path:str|Path):
+    """Convert a session's log file (i.e. log.json) to a log_stream folder with binary columns for the histories"""
+    path = Path(path)
+    log_file = find_log(path)
+    if log_file is None:
+        raise FileNotFoundError(f'{path} contains neither a log_stream nor a saved log')
+    print(f'converting {log_file} to a binary log - this happens once per session')
+    log = load_log(log_file)
+
+    def to_history(entries:list):
+        # histories are lists of [t, value] entries (or plain times) - other lists stay lists
+        if len(entries) == 0:
+            return entries
+        if all(type(e) == int for e in entries):
+            history = Log_History()
+            history.extend_arrays(smallest(np.array(entries, dtype=np.int64)))
+            return history
+        if not all(type(e) == list and len(e) == 2 and type(e[0]) == int for e in entries):
+            # i.e. trials, states or camera histories with their video time strings
+            return entries
+        values = [e[1] for e in entries]
+        try:
+            array = np.array(values)
+        except ValueError:
+            return entries
+        if array.dtype.kind not in 'iubf' or (array.ndim == 2 and array.shape[1] == 0) or array.ndim > 2:
+            return entries
+        if array.dtype.kind in 'iu':
+            array = smallest(array)
+        elif array.dtype.kind == 'f':
+            # i.e. keyboard mode sensors, which keys_control moves in steps of 0.3
+            array = array.astype(np.float64)
+        history = Log_History(array.dtype, num_values=1 if array.ndim == 1 else array.shape[1])
+        history.extend_arrays(smallest(np.array([e[0] for e in entries], dtype=np.int64)), array)
+        return history
+
+    for key, item in log.items():
+        if isinstance(item, list):
+            log[key] = to_history(item)
+        elif isinstance(item, dict) and key in ('controls', 'cameras (t_ms/#frame/vid_time)',
+                                                'microphones (t_ms/#sample/audio_time)'):
+            log[key] = {name: to_history(entries) if isinstance(entries, list) else entries
+                        for name, entries in item.items()}
+
+    writer = Log_Writer(log, path)
+    writer.write(final=True)
+
+def smallest(array:np.ndarray) -> np.ndarray:
+    """The integer array in the smallest dtype holding its values"""
+    if len(array) == 0:
+        return array
+    low, high = int(array.min()), int(array.max())
+    if low >= 0:
+        return array.astype(np.min_scalar_type(high))
+    return array.astype(np.result_type(np.min_scalar_type(low), np.min_scalar_type(-high - 1)))
@@ -32,10 +32,11 @@ class _SerialReady(Exception):
 class Neurokraken:
     def __init__(self, serial_in:dict={}, serial_out:dict={}, log_dir:str|None='./', mode='teensy',
                  display:dict=None, cameras:list=(), microphones:list=(),
-                 subject:dict|str={'ID': '_'}, serial_key:str='KRAKEN',
+                 subject:dict|str={'ID': '_'}, serial_key:str='KRAKEN', boards:dict[str, str]={},
                  autostart=True, max_framerate=8_000, networker_mode='archivist', agent=None,
                  config:Container={}, task_path:Path=None, import_pre_run:str=None,
-                 log_performance=False):
+                 log_performance=False, framed_protocol=False, networker_thread=False, networker_wait='poll',
+                 virtual_clock_ms:int|None=None, log_stream_s:float|None=None, log_format='json'):
         """Create a Neurokraken instance using the provided device configuration.
         This class manages communication with hardware components including serial
         interfaces, camera systems, and data logging. It handles task execution,
@@ -54,9 +55,49 @@ class Neurokraken:
             microphones (list, optional): List of microphone configurations using configurators.Microphone()
             subject (dict|str, optional): Subject identification information. Defaults to {"ID": "_"}
             serial_key (str, optional): Serial communication key identifier. Defaults to 'KRAKEN'
+            boards (dict[str, str], optional): Additional teensy boards as {board name: serial_key}. Sensors and controls
+                                               are assigned to a board with configurators.on_board(), all others belong to
+                                               the primary board at serial_key. All boards are communicated with concurrently
+                                               from their own I/O threads, start and stop together and their sensor values
+                                               share get.read_in(). Logged timestamps are aligned to the primary board's t_ms,
+                                               the secondary boards' own times are available as 't_ms_<board>'. Per board
+                                               framerates, kB/s, latency and clock offsets are provided in
+                                               threads_info['boards']. Flash every board with config2teensy.py <config> <board>.
+                                               Defaults to {} (a single teensy).
             autostart (bool, optional): Whether to automatically start the experiment or wait for get.start(). Defaults to True
             max_framerate (int, optional): Maximum frame rate for the main loop. Defaults to 8000
             log_performance (bool, optional): Set to True to have the main loop log iteration and networking times. Defautls to False.
+                                              The networker then also measures every communication's latency in fixed memory
+                                              histograms, provided live in threads_info['latency_networker'] and saved as a
+                                              summary to the log's 'networker latency (us)'.
+            framed_protocol (bool, optional): Ask the teensy to send every answer as a single length-prefixed packet that is read
+                                              in one call. Teensy firmware without framed protocol support keeps using
+                                              the legacy protocol. Defaults to False.
+            networker_thread (bool, optional): Communicate with the teensy from a dedicated I/O thread at full rate, so that
+                                               the communication latency does not depend on the main loop's workload.
+                                               Sensor values are provided to the main loop as consistent snapshots. Defaults to False.
+            networker_wait (str, optional): 'poll' checks for the teensy's answer and returns immediately, so the main loop spins at
+                                            up to max_framerate. 'wait' sleeps in the kernel until shortly before the expected
+                                            answer and spins only for the last few hundred microseconds, freeing CPU time for
+                                            cameras and visuals. threads_info['cpu_process'] and ['cpu_networker'] report the
+                                            CPU usage to compare both. Defaults to 'poll'.
+            virtual_clock_ms (int|None, optional): Only for mode='keyboard' or 'agent'. Instead of following the wall clock, t_ms
+                                                   advances by this many milliseconds every main loop iteration and the main loop
+                                                   runs as fast as the CPU allows. State timeouts, the agent's act_freq and
+                                                   tools.Timer follow this virtual time, i.e. to check task logic and agent
+                                                   behavior far faster than real time. Provide display=None to run without
+                                                   the visual loop. Defaults to None (wall clock).
+            log_stream_s (float|None, optional): Stream the log to log_dir/log_stream every this many seconds from a
+                                                 background thread, so that a crash only loses the last interval and
+                                                 quitting doesn't wait for writing log.json, which is assembled in the
+                                                 background. core.log_writer.load_stream() rebuilds the log from the stream.
+                                                 Defaults to None (log.json is only written at quit).
+            log_format (str|Log_Serializer, optional): The format of the log file written at quit: 'json' (indented
+                                                       log.json), 'json.gz' or 'json.zst' (compressed compact JSON),
+                                                       'msgpack', 'npz' (numeric histories as NumPy arrays) or 'pickle',
+                                                       or a core.log_formats.Log_Serializer. The file is written in a
+                                                       worker thread. core.log_formats.load_log() reads all formats.
+                                                       Defaults to 'json'.
             config (Container, optional): Useful in runner mode to develop config-dependent experiments.
                                           The provided container (i.e. config.py file) will be accessible as get.config
             task_path (Path, optional): Useful in runner mode, this folder (i.e. tasks/my_task) will be copied to the 
@@ -65,6 +106,11 @@ class Neurokraken:
             import_pre_run (str, optional): Useful in runner mode. 
                                             Path to a .py file to import just before starting the run, i.e. to start a GUI
         """
+        from core.camera_process import in_camera_worker
+        if in_camera_worker():
+            # the camera worker process imports the task script - it must not start a second task
+            raise RuntimeError('Neurokraken() was created while a camera worker process imported the task script. ' +
+                               'With engine="process" cameras, start the task under if __name__ == \'__main__\':')
         self.running_config2teensy = False
         stack = inspect.stack()
         for frame_info in stack:
@@ -80,6 +126,7 @@ class Neurokraken:
         self.task_path = task_path
         self.import_pre_run = import_pre_run
         self.log_performance = log_performance
+        self.virtual_clock_ms = virtual_clock_ms if mode in ('keyboard', 'agent') else None
 
         #------------------------- CHECK CORE SERIAL ENTRIES -------------------------
         if not 't_ms' in self.serial_in.keys():
@@ -127,7 +174,9 @@ class Neurokraken:
         #------------------------- PROCESS PRIORITY -------------------------
 
         import psutil
-        if sys.platform == 'win32':
+        from core import main_loops
+        if sys.platform == 'win32' and not main_loops.headless:
+            # (vector_env runs many headless task instances side by side at normal priority)
             p = psutil.Process(os.getpid())
             orig_priority = p.nice()
             p.nice(psutil.REALTIME_PRIORITY_CLASS)
@@ -146,11 +195,23 @@ class Neurokraken:
                     'blocks': [],
                     'states': [],
                     'cameras (t_ms/#frame/vid_time)': {},
-                    'microphones (t_ms/audio_time)': {},
+                    'camera dropped frames': {}, # per camera: frames its image/ffmpeg writers couldn't keep up with
+                    'microphones (t_ms/#sample/audio_time)': {},
+                    'microphones (t_ms/audio_time)': {}, # 10 s keyframes, as logged by earlier versions
                     'controls': {}, # serial_out changes
                     # serial_in readings
                     }
 
+        from core.log_formats import serializer_for
+        self.log_format = serializer_for(log_format)
+        # i.e. a missing package of the format should fail now, not after the session
+        self.log_format.check()
+
+        self.log_writer = None
+        if log_stream_s is not None and log_dir is not None:
+            from core.log_writer import Log_Writer
+            self.log_writer = Log_Writer(self.log, self.log_dir, interval_s=log_stream_s)
+
         #------------------------- RUN CONTROLS -------------------------
         from dataclasses import dataclass
         @dataclass
@@ -172,6 +233,11 @@ class Neurokraken:
 
         self.run_controls = Run_Controls()
 
+        # sketch info for the UI
+        self.threads_info = {'framerate_main': 0,
+                             'framerate_visual': 0,
+                             'framerate_cams': {}}
+
         #------------------------- NETWORKING -------------------------
         archivist_mode = True if networker_mode == 'archivist' else False
         if mode == 'keyboard' or mode == 'agent':
@@ -180,14 +246,29 @@ class Neurokraken:
         from core import networker as netw       
 
         if mode=='keyboard':
-            self.networker = netw.Dummy_Networker()
+            self.networker = netw.Dummy_Networker(time_step_ms=self.virtual_clock_ms)
         elif mode =='agent':
-            self.networker = netw.Dummy_Networker(mode='agent', agent=agent)
+            self.networker = netw.Dummy_Networker(mode='agent', agent=agent, time_step_ms=self.virtual_clock_ms)
         else:
             try:
-                self.networker = netw.Networker(serial_key=serial_key,
-                                                archivist_mode=archivist_mode, serial_in_log=self.log,
-                                                run_controls=self.run_controls)
+                networkers = {}
+                for board, board_key in {None: serial_key, **boards}.items():
+                    board_info = self.threads_info
+                    if len(boards) != 0:
+                        board_info = self.threads_info.setdefault('boards', {}).setdefault(board or 'main', {})
+                    networkers[board] = netw.Networker(serial_key=board_key,
+                                                       archivist_mode=archivist_mode, serial_in_log=self.log,
+                                                       run_controls=self.run_controls,
+                                                       measure_latency=log_performance, threads_info=board_info,
+                                                       wait_mode=networker_wait, name=board)
+                self.networker = networkers[None]
+                if len(boards) != 0:
+                    self.networker = netw.Multi_Networker(networkers, self.serial_in, self.serial_out,
+                                                          serial_in_log=self.log, framed=framed_protocol)
+                    # including the secondary boards' 't_ms_<board>'
+                    self.serial_in = self.networker.serial_in
+                elif framed_protocol:
+                    self.networker.negotiate_protocol(self.serial_out, framed=True)
             except Exception as e:
                 print0('Unable to start teensy communication. Is the USB cable plugged in? ' +
                        'If you provided a COM port in config.py it may not be correct - Try removing it to use autodetection. ' +
@@ -209,10 +290,9 @@ class Neurokraken:
         if autostart == False:
             self.run_controls.beginning = False
 
-        # sketch info for the UI
-        self.threads_info = {'framerate_main': 0,
-                             'framerate_visual': 0,
-                             'framerate_cams': {}}
+        if networker_thread and mode == 'teensy' and len(boards) == 0:
+            self.networker = netw.Threaded_Networker(self.networker, self.serial_in, self.serial_out,
+                                                     serial_in_log=self.log, threads_info=self.threads_info)
 
         #------------------------- CAMERAS -------------------------
 
@@ -221,17 +301,27 @@ class Neurokraken:
         if not isinstance(cameras, (list, tuple)):
             cameras = [cameras]
         for cam in cameras:
+            if cam.engine == 'process':
+                from core.camera_process import Cam_Process
+                kraken_cam.cameras.append(Cam_Process(cam, self.run_controls, self.log['cameras (t_ms/#frame/vid_time)'],
+                                                      self.serial_in['t_ms'], log_dir=self.log_dir,
+                                                      threads_info=self.threads_info,
+                                                      dropped_log=self.log['camera dropped frames'],
+                                                      extrapolate_time=self.virtual_clock_ms is None))
+                continue
             kraken_cam.cameras.append(kraken_cam.Cam_Sketch(cam, self.run_controls, self.log['cameras (t_ms/#frame/vid_time)'],
                                                             self.serial_in['t_ms'], log_dir=self.log_dir,
-                                                            show_cv2_backends=False, threads_info=self.threads_info))
+                                                            show_cv2_backends=False, threads_info=self.threads_info,
+                                                            dropped_log=self.log['camera dropped frames']))
         [cam.run_sketch(block=False) for cam in kraken_cam.cameras]
 
         if not isinstance(microphones, (list, tuple)):
             microphones = [microphones]
         self.microphones = []
         for mic in microphones:
-            self.microphones.append(kraken_mic.Microphone(mic, self.run_controls, self.log['microphones (t_ms/audio_time)'],
-                                                           self.serial_in['t_ms'], log_dir=self.log_dir))
+            self.microphones.append(kraken_mic.Microphone(mic, self.run_controls, self.log['microphones (t_ms/#sample/audio_time)'],
+                                                           self.serial_in['t_ms'], log_dir=self.log_dir,
+                                                           keyframe_log_dict=self.log['microphones (t_ms/audio_time)']))
         [mic.run_sketch(block=False) for mic in self.microphones]
 
         # loading general configuration elements is now complete
@@ -288,7 +378,13 @@ class Neurokraken:
                                           max_framerate=self.max_framerate, permanent_states=permanent_states,
                                           threads_info=self.threads_info, 
                                           run_at_start=run_at_start, run_at_quit=run_at_quit, run_post_trial=run_post_trial,
-                                          log_performance=self.log_performance)
+                                          log_performance=self.log_performance, log_writer=self.log_writer,
+                                          log_format=self.log_format)
+
+        if main_loops.headless:
+            # the main loop is driven externally (vector_env) without py5 sketches, garbage collection changes
+            # or key listeners
+            return
         
         #------------------------- TASK DISPLAY -------------------------
 
@@ -396,12 +492,15 @@ class Neurokraken:
 
         #------------------------- MAIN LOOP -------------------------
 
-        if self.main_as_sketch:
+        if self.main_as_sketch and self.virtual_clock_ms is None:
             # more priority/consistency amidst parallel processes like camera capturing
             main_loops.main.run_sketch(block=True)
         else:
             # faster but less consistent frame intervals amidst parallel processes
-            self.networker.write_teensy_data(self.serial_out)
+            # - and not limited by a framerate for the virtual clock
+            # setup() doesn't run without a sketch: initialize() prepares the logs draw() appends to and
+            # performs the first write_teensy_data()
+            main_loops.main.initialize()
             while main_loops.main.running:
                 main_loops.main.draw()
 
@@ -0,0 +1,210 @@
+"""A Gym-style vectorized runner hosting many independent task instances in agent mode.
+
+Every Neurokraken instance sets process-wide globals (controls.get, main_loops.main), so every task instance
+runs in its own worker process with its own state machine, log and Dummy_Networker. The main loop is driven
+directly without py5 sketches: one step() advances every instance by steps_per_action main loop iterations of
+its virtual clock.
+
+Example:
+    >>> def make_env():
+    >>>     nk = Neurokraken(serial_in=serial_in, serial_out=serial_out, mode='agent', log_dir=None, virtual_clock_ms=1)
+    >>>     nk.load_task(task)
+    >>>     return nk
+    >>>
+    >>> def reward(get):
+    >>>     return len(get.log['controls']['reward_valve'])
+    >>>
+    >>> if __name__ == '__main__':
+    >>>     envs = Vector_Env(make_env, num_envs=8, steps_per_action=200, reward=reward)
+    >>>     observations, infos = envs.reset()
+    >>>     for _ in range(1000):
+    >>>         actions = [{'touch_left': random.choice([0, 6000])} for _ in range(envs.num_envs)]
+    >>>         observations, rewards, dones, infos = envs.step(actions)
+    >>>     logs = envs.close()
+"""
+
+import sys
+import multiprocessing as mp
+from pathlib import Path
+from typing import Callable, Any
+
+def _observe_serial_out(get) -> dict:
+    return {key: entry['value'] for key, entry in get.serial_out.items()}
+
+class _Task_Instance:
+    """Runs inside a worker process: creates the task with make_env() and drives its main loop"""
+    def __init__(self, make_env:Callable, steps_per_action:int, reward:Callable|None, done:Callable|None,
+                 observe:Callable):
+        self.make_env = make_env
+        self.steps_per_action = steps_per_action
+        self.reward = reward
+        self.done = done
+        self.observe = observe
+        self.nk = None
+        self.main = None
+        self.last_reward = 0.0
+
+        from neurokraken.controls import get
+        from core import main_loops
+        self.get = get
+        self.main_loops = main_loops
+        # no py5 sketches (pre_task assets, visual loop) are run for the task instance
+        main_loops.headless = True
+
+    def observation(self):
+        return self.observe(self.get)
+
+    def info(self) -> dict:
+        return {'t_ms': self.get.time_ms,
+                'state': self.get.current_state.name,
+                'trials': len(self.get.log['trials'])}
+
+    def quit(self) -> dict|None:
+        """Quit the running instance the way get.quit() would - its log is saved to its log_dir"""
+        if self.main is None:
+            return None
+        self.get.quit()
+        while self.main.running:
+            self.main.draw()
+        log = self.main.log_dict
+        self.nk, self.main = None, None
+        return log
+
+    def reset(self):
+        self.quit()
+        self.nk = self.make_env()
+        self.main = self.main_loops.main
+        self.main.initialize()
+        while self.main.run_controls.beginning and self.main.running:
+            self.main.draw()
+        self.last_reward = self.reward(self.get) if self.reward is not None else 0.0
+        return self.observation(), self.info()
+
+    def step(self, action:dict|None):
+        if action is not None:
+            for key, value in action.items():
+                self.get.serial_in[key]['value'] = value
+        for _ in range(self.steps_per_action):
+            self.main.draw()
+            if not self.main.running:
+                break
+        # rewards are the change of the cumulative reward function since the last step
+        reward = 0.0
+        if self.reward is not None:
+            total = self.reward(self.get)
+            reward, self.last_reward = total - self.last_reward, total
+        done = not self.main.running or (self.done is not None and bool(self.done(self.get)))
+        observation, info = self.observation(), self.info()
+        if done:
+            # automatically start a new instance like gym vector environments do
+            info['final_observation'] = observation
+            observation, _ = self.reset()
+        return observation, reward, done, info
+
+def _worker(pipe, make_env, steps_per_action, reward, done, observe):
+    instance = _Task_Instance(make_env, steps_per_action, reward, done, observe)
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == 'reset':
+                pipe.send(instance.reset())
+            elif command == 'step':
+                pipe.send(instance.step(data))
+            elif command == 'close':
+                pipe.send(instance.quit())
+                break
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        pipe.close()
+
+class Vector_Env:
+    """Run num_envs independent instances of a task in parallel worker processes with a batched
+    reset()/step(actions) interface.
+
+    Args:
+        make_env (Callable[[], Neurokraken]): A picklable (module level) function creating the task instance in
+            agent mode with Neurokraken(mode='agent', ...) and nk.load_task(...) and returning the Neurokraken.
+            Provide virtual_clock_ms (i.e. 1) to have every main loop iteration advance t_ms by a fixed step.
+            No agent is needed, actions are provided through step().
+        num_envs (int, optional): The number of task instances/worker processes. Defaults to the number of CPUs.
+        steps_per_action (int, optional): Main loop iterations to run after applying an action. Defaults to 1.
+        reward (Callable[[Get], float] | None, optional): The cumulative reward of a task instance, i.e. the number of
+            reward valve openings in get.log. step() returns its change since the previous step. Defaults to None (0.0).
+        done (Callable[[Get], bool] | None, optional): True ends the instance's episode. An instance also ends
+            when its task calls get.quit(). Ended instances save their log and automatically restart. Defaults to None.
+        observe (Callable[[Get], Any] | None, optional): The observation of a task instance. Defaults to the
+            current serial_out values {key: value}.
+    """
+    def __init__(self, make_env:Callable, num_envs:int|None=None, steps_per_action:int=1,
+                 reward:Callable[[Any], float]|None=None, done:Callable[[Any], bool]|None=None,
+                 observe:Callable[[Any], Any]|None=None):
+        self.num_envs = num_envs if num_envs is not None else mp.cpu_count()
+        observe = observe if observe is not None else _observe_serial_out
+        # spawn rather than fork - the parent may already run java (py5) or serial threads
+        context = mp.get_context('spawn')
+        self.pipes = []
+        self.processes = []
+        # neurokraken.py puts the package folder first on sys.path for its internal imports (core, configurators).
+        # Spawned workers inherit sys.path and would then import neurokraken.py instead of the package
+        # => move the folder to the end while starting the workers
+        package_dir = str(Path(__file__).parent.resolve())
+        original_path = list(sys.path)
+        sys.path[:] = [p for p in sys.path if p != package_dir] + [package_dir]
+        try:
+            for i in range(self.num_envs):
+                parent_pipe, child_pipe = context.Pipe()
+                process = context.Process(target=_worker, name=f'neurokraken_env_{i}', daemon=True,
+                                          args=(child_pipe, make_env, steps_per_action, reward, done, observe))
+                process.start()
+                child_pipe.close()
+                self.pipes.append(parent_pipe)
+                self.processes.append(process)
+        finally:
+            sys.path[:] = original_path
+        self.closed = False
+
+    def reset(self) -> tuple[list, list[dict]]:
+        """(Re)start every task instance.
+
+        Returns:
+            tuple[list, list[dict]]: observations, infos of every instance
+        """
+        for pipe in self.pipes:
+            pipe.send(('reset', None))
+        results = [pipe.recv() for pipe in self.pipes]
+        observations, infos = zip(*results)
+        return list(observations), list(infos)
+
+    def step(self, actions:list[dict|None]) -> tuple[list, list[float], list[bool], list[dict]]:
+        """Apply one action per instance and advance every instance by steps_per_action main loop iterations.
+
+        Args:
+            actions (list[dict | None]): per instance a dict of {serial_in key: value} to set, i.e. a touched
+                sensor {'touch_left': 6000}, or None to keep the current serial_in values.
+
+        Returns:
+            tuple[list, list[float], list[bool], list[dict]]: observations, rewards, dones, infos of every instance.
+                infos contain 't_ms', 'state' and 'trials', and 'final_observation' for ended (restarted) instances.
+        """
+        for pipe, action in zip(self.pipes, actions):
+            pipe.send(('step', action))
+        results = [pipe.recv() for pipe in self.pipes]
+        observations, rewards, dones, infos = zip(*results)
+        return list(observations), list(rewards), list(dones), list(infos)
+
+    def close(self) -> list[dict|None]:
+        """Quit every task instance (saving their logs) and end the worker processes.
+
+        Returns:
+            list[dict | None]: the log of every instance's last episode
+        """
+        if self.closed:
+            return []
+        for pipe in self.pipes:
+            pipe.send(('close', None))
+        logs = [pipe.recv() for pipe in self.pipes]
+        for process in self.processes:
+            process.join()
+        self.closed = True
+        return logs
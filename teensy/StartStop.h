@@ -5,7 +5,8 @@ class StartStop : public Control{
 
     void act(){
       int startStop = intFromByte();
-      // 0 = continue as before, 1 = resetAndStart, 2 = stop
+      // 0 = continue as before, 1 = resetAndStart, 2 = stop,
+      // 3 = answer in the framed protocol, 4 = answer in the legacy protocol
       // The python side
       // only lets startStop be 1 if the setup is not already active and
       // only lets startStop be 2 if the setup is not already inactive
@@ -28,5 +29,11 @@ class StartStop : public Control{
           digitalWrite(krakenVars::pulseClockPins[i], HIGH);
         }
       }
+      if(startStop == 3){
+        krakenVars::framed = true;
+      }
+      if(startStop == 4){
+        krakenVars::framed = false;
+      }
     }
 };
\ No newline at end of file
@@ -78,6 +78,21 @@ class Debug{
       }
     }
 
+    int debugLength(){
+      // number of debug string bytes sent with the next answer (the length is sent as a single byte)
+      if(debugLevel == 1){
+        return min((int)strlen(debugString), 255);
+      }
+      return 0;
+    }
+
+    void serialWriteDebugFramed(){
+      Serial.write(debugLength());
+      if(debugLevel == 1){
+        Serial.write(debugString, debugLength());
+      }
+    }
+
     void serialWriteDebug(){
       if(debugLevel == 1){
         Serial.write(strlen(debugString));
@@ -57,6 +57,8 @@ class Sensor{
     #ifndef DIRECT_MODE
     int lenHistory = 0;
     int numValues = 1;
+    // compact histories are sent as delta/varint encoded blocks (see Networker::writeCompactHistory)
+    bool compact = false;
     // start with a default max of 12 sensBytes so the history has sufficient space.
     // sensBytes can contain a sequence of values if numSensBytes!=1 - v0b0,v0b1,v1b0,v1b1, ...
     // (use a lower default if memory size becomes an issue)
@@ -181,6 +183,12 @@ class Networker{
 
     int numProcesses = 0;
 
+    #ifndef DIRECT_MODE
+    // encoding buffer for compact histories: 4 timestamp bytes + 12 value bytes for the first entry,
+    // then at most 5 varint bytes for each timestamp and for each of up to 3 4-byte values per entry
+    byte compactBuffer[16 + 1023*20];
+    #endif
+
     Networker(Control** controls, int numControls_, Sensor** sensors, int numSensors_,
               Process** processes, int numProcesses_){
       // ** since controls is a pointer to a pointer (Control* inside the array)
@@ -199,4 +207,107 @@ class Networker{
 
       numProcesses = numProcesses_;
     }
+
+    void writeFrameHeader(unsigned long payloadLength){
+      // framed protocol header: 2 magic bytes that a legacy answer can never start with,
+      // followed by the little endian payload length
+      static byte header[6] = {0x00, 0xFF, 0x00, 0x00, 0x00, 0x00};
+      header[2] = payloadLength & 0xFF;
+      header[3] = (payloadLength >> 8) & 0xFF;
+      header[4] = (payloadLength >> 16) & 0xFF;
+      header[5] = (payloadLength >> 24) & 0xFF;
+      Serial.write(header, 6);
+    }
+
+    #ifndef DIRECT_MODE
+    // ------------ compact histories ------------
+    // A compact sensor history block is its uint16 block length (only sent for 2 or more entries, otherwise the
+    // length is known) followed by the 4 byte timestamp and the raw value bytes of the first entry. Every further entry is sent as an unsigned varint of its timestamp
+    // difference and one zig-zag varint per value of the value difference to the previous entry.
+    // Varints carry 7 bits per byte, least significant first, with the highest bit set on all but the last byte.
+
+    static unsigned long littleEndianValue(byte* b, int numBytes){
+      unsigned long value = 0;
+      for(int i=numBytes-1; i>=0; i--){
+        value = (value << 8) | b[i];
+      }
+      return value;
+    }
+
+    static unsigned long zigZagDelta(byte* current, byte* previous, int numBytes){
+      // the difference is modular to the value's byte width, interpret it as a signed numBytes wide int
+      long delta = littleEndianValue(current, numBytes) - littleEndianValue(previous, numBytes);
+      int unusedBits = 32 - 8*numBytes;
+      if (unusedBits > 0){
+        delta = (long)((unsigned long)delta << unusedBits) >> unusedBits;
+      }
+      // small positive and negative differences map onto small unsigned values: 0,-1,1,-2 => 0,1,2,3
+      return ((unsigned long)delta << 1) ^ (unsigned long)(delta >> 31);
+    }
+
+    static int writeVarint(byte* buf, unsigned long value){
+      int n = 0;
+      while (value >= 0x80){
+        buf[n++] = (value & 0x7F) | 0x80;
+        value >>= 7;
+      }
+      buf[n++] = value;
+      return n;
+    }
+
+    static int varintLength(unsigned long value){
+      int n = 1;
+      while (value >= 0x80){
+        value >>= 7;
+        n++;
+      }
+      return n;
+    }
+
+    int compactHistoryLength(Sensor* sensor){
+      // the number of bytes writeCompactHistory will send, including the block length
+      if (sensor->lenHistory == 0){
+        return 0;
+      }
+      int valueBytes = sensor->numSensBytes;
+      int length = 4 + valueBytes*sensor->numValues;
+      if (sensor->lenHistory > 1){
+        length += 2;
+      }
+      for(int entry=1; entry<sensor->lenHistory; entry++){
+        length += varintLength(littleEndianValue(sensor->historyMillis[entry], 4)
+                               - littleEndianValue(sensor->historyMillis[entry-1], 4));
+        for(int v=0; v<sensor->numValues; v++){
+          length += varintLength(zigZagDelta(&sensor->historyBytes[entry][v*valueBytes],
+                                             &sensor->historyBytes[entry-1][v*valueBytes], valueBytes));
+        }
+      }
+      return length;
+    }
+
+    void writeCompactHistory(Sensor* sensor){
+      int valueBytes = sensor->numSensBytes;
+      int length = 0;
+      if (sensor->lenHistory == 0){
+        return;
+      }
+      memcpy(compactBuffer, sensor->historyMillis[0], 4);
+      memcpy(&compactBuffer[4], sensor->historyBytes[0], valueBytes*sensor->numValues);
+      length = 4 + valueBytes*sensor->numValues;
+      for(int entry=1; entry<sensor->lenHistory; entry++){
+        length += writeVarint(&compactBuffer[length], littleEndianValue(sensor->historyMillis[entry], 4)
+                                                      - littleEndianValue(sensor->historyMillis[entry-1], 4));
+        for(int v=0; v<sensor->numValues; v++){
+          length += writeVarint(&compactBuffer[length],
+                                zigZagDelta(&sensor->historyBytes[entry][v*valueBytes],
+                                            &sensor->historyBytes[entry-1][v*valueBytes], valueBytes));
+        }
+      }
+      if (sensor->lenHistory > 1){
+        byte lengthBytes[2] = {(byte)(length & 0xFF), (byte)((length >> 8) & 0xFF)};
+        Serial.write(lengthBytes, 2);
+      }
+      Serial.write(compactBuffer, length);
+    }
+    #endif
 };
\ No newline at end of file
@@ -22,6 +22,9 @@ namespace krakenVars{
   int numPulseClockPins = 0;
   // krakenVars::debugLevel can be overriden to 1 in Config.h
   int debugLevel = 0;
+  // framed protocol - requested by the python side through StartStop. Every answer is sent as
+  // 2 magic bytes 0x00 0xFF, a 4 byte payload length and the payload (sensor data, debug length + string)
+  bool framed = false;
 }
 
 #include "Config.h"
@@ -41,6 +44,12 @@ unsigned long millisLastSensoring = 4000000000;
 #endif
 
 void setup(){
+  #if defined(COMPACT_SENSORS) && !defined(DIRECT_MODE)
+  // config2teensy lists which sensors send their histories delta/varint encoded
+  for(int sens=0; sens<netw->numSensors; sens++){
+    config::sensors[sens]->compact = config::compactSensors[sens];
+  }
+  #endif
   ledBuiltIn->shine(true);
 }
 
@@ -150,8 +159,12 @@ void loop(){
         config::sensors[sens]->read();
       }
 
-      //------------SEND LEADING MESSAGE LENGTH BYTE------------
-      Serial.write(netw->MESSAGELENGTH);
+      //------------SEND LEADING MESSAGE LENGTH BYTE OR FRAME HEADER------------
+      if (krakenVars::framed){
+        netw->writeFrameHeader(netw->MESSAGELENGTH + 1 + debug->debugLength());
+      } else {
+        Serial.write(netw->MESSAGELENGTH);
+      }
 
       //------------FILL UP THE MESSAGE TO BE SEND WITH SENSOR READINGS------------
       netw->currentSendByte = 0;
@@ -170,6 +183,20 @@ void loop(){
     #endif
 
     #ifndef DIRECT_MODE
+      //------------SEND THE FRAME HEADER------------
+      if (krakenVars::framed){
+        unsigned long frameLength = 1 + debug->debugLength();
+        for(int sens=0; sens<netw->numSensors; sens++){
+          Sensor* sensor = config::sensors[sens];
+          if (sensor->compact){
+            frameLength += 2 + netw->compactHistoryLength(sensor);
+          } else {
+            frameLength += 2 + sensor->lenHistory * (4 + sensor->numSensBytes*sensor->numValues);
+          }
+        }
+        netw->writeFrameHeader(frameLength);
+      }
+
       //------------SEND THE DENSE LOG------------
       int historyLength = 0;
       byte historyLengthBytes[2] = {0x00, 0x00};
@@ -183,6 +210,11 @@ void loop(){
         historyLengthBytes[1] = (historyLength >> 8) & 0xFF;
         Serial.write(historyLengthBytes, 2);
 
+        if (sensor->compact){
+          netw->writeCompactHistory(sensor);
+          sensor->lenHistory = 0;
+          continue;
+        }
         for(int entry=0; entry<sensor->lenHistory; entry++){
           Serial.write(sensor->historyMillis[entry], 4); // timestamps
         }
@@ -195,7 +227,12 @@ void loop(){
     #endif
     
     //------------IF DEBUG: SERIAL WRITE DEBUG INFORMATION------------
-    debug->serialWriteDebug();
+    if (krakenVars::framed){
+      // the frame always contains the debug length byte
+      debug->serialWriteDebugFramed();
+    } else {
+      debug->serialWriteDebug();
+    }
 
     //------------SEND THE USB PACKAGE IF IT WASN'T ALREADY SENT------------
     Serial.send_now();
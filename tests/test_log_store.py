@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+import numpy as np
+
+# neurokraken-internal imports (from core.log_store import ...)
+sys.path.insert(0, str(Path(__file__).parent.parent / 'neurokraken'))
+from core.log_store import Log_History, CHUNK
+from core.networker import decode_compact_history, decode_history
+
+def logged(entries:list, entry:dict) -> Log_History:
+    history = Log_History.for_entry(entry)
+    history.extend(entries)
+    return history
+
+def test_float_values_round_trip():
+    # keyboard mode: keys_control adds ±0.3 to an int sensor
+    entries = [(0, 0), (1, 0.3), (2, 0.6)] + [(t, t * 0.3) for t in range(3, 3000)] + [(3000, 900.0)]
+    history = logged(entries, {'value': 0, 'byte_length': 2, 'encoding': int})
+    assert len(entries) > CHUNK
+    assert history.to_list() == entries
+    assert history[1] == (1, 0.3) and history[-1] == (3000, 900.0)
+    assert history.values.dtype == np.float64
+
+def test_bool_values_round_trip():
+    entries = [(t, t % 3 == 0) for t in range(2 * CHUNK + 5)]
+    history = logged(entries, {'value': False, 'byte_length': 1, 'encoding': 'uint'})
+    assert history.to_list() == entries
+    assert all(type(value) is bool for _, value in history)
+    assert history.values.dtype == np.bool_
+
+def test_mixed_values_keep_their_types():
+    entries = [(t, t) for t in range(CHUNK)] + [(CHUNK + t, True) for t in range(CHUNK)] + [(5000, 1.5)]
+    history = logged(entries, {'value': 0, 'byte_length': 1, 'encoding': 'uint'})
+    history.flush()
+    assert history.to_list() == entries
+    assert [type(value) for _, value in history[CHUNK - 1:CHUNK + 1]] == [int, bool]
+
+def test_int_values_keep_the_entry_dtype():
+    entries = [(t, t % 200) for t in range(3 * CHUNK)]
+    history = logged(entries, {'value': 0, 'byte_length': 1, 'encoding': 'uint'})
+    assert history.to_list() == entries
+    assert history.values.dtype == np.uint8
+
+def test_compact_decode_returns_the_sensor_dtype():
+    times, values = decode_history(bytes(range(4)) * 40, np.arange(40, dtype='<i2').tobytes(), 2, True)
+    # first entry raw, then (time delta, zigzag value delta) varints: +1 ms, +1
+    block = times[0].tobytes() + values[0].tobytes() + bytes([1, 2]) * 39
+    compact_times, compact_values = decode_compact_history(block, 40, 2, True)
+    assert compact_times.dtype == np.uint32 and compact_values.dtype == np.int16
+    assert compact_values.tolist() == list(range(40))
+
+def test_strings_after_ints_keep_both():
+    entries = [(t, t) for t in range(10)] + [(10, 'reward'), (11, 12)]
+    history = logged(entries, {'value': 0, 'byte_length': 4, 'encoding': int})
+    assert history.to_list() == entries
+    assert history.values.dtype == object
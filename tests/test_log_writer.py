@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+# neurokraken-internal imports (from core.log_store import ...)
+sys.path.insert(0, str(Path(__file__).parent.parent / 'neurokraken'))
+from core.log_store import Log_History
+from core.log_writer import Log_Writer, load_stream, STREAM_DIR
+
+def test_rewritten_column_survives_a_crash_before_the_manifest(tmp_path:Path):
+    wheel = Log_History('u2')
+    wheel.extend([(t, t) for t in range(100)])
+    log = {'wheel': wheel, 'experiment_data': {}}
+    writer = Log_Writer(log, tmp_path)
+    writer.write()
+    before = load_stream(tmp_path)['wheel']
+
+    # a float widens the column, which is rewritten as a whole
+    wheel.append((100, 0.5))
+    writer.entry(('wheel',)).write_column(wheel)
+    # a crash now leaves the previous manifest, which has to find its files unchanged
+    assert load_stream(tmp_path)['wheel'] == before
+
+    writer.write()
+    assert load_stream(tmp_path)['wheel'] == before + [[100, 0.5]]
+    # only the rewritten generation's files remain
+    assert sorted(p.name for p in (tmp_path / STREAM_DIR).iterdir()) == ['0.1.times', '0.1.values', 'manifest.json']
+
+def test_column_turned_list_survives_a_crash_before_the_manifest(tmp_path:Path):
+    events = Log_History('i4')
+    events.extend([(t, t) for t in range(10)])
+    log = {'events': events}
+    writer = Log_Writer(log, tmp_path)
+    writer.write()
+    before = load_stream(tmp_path)['events']
+
+    # no fixed size representation - the history continues as JSON Lines
+    events.append((10, 'reward'))
+    writer.entry(('events',)).write_column(events)
+    assert load_stream(tmp_path)['events'] == before
+
+    writer.write(final=True)
+    assert load_stream(tmp_path)['events'] == before + [[10, 'reward']]
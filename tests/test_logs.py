@@ -0,0 +1,28 @@
+import sys, json
+from pathlib import Path
+import numpy as np
+
+# neurokraken-internal imports (from core.log_store import ...)
+sys.path.insert(0, str(Path(__file__).parent.parent / 'neurokraken'))
+from logs import open_session, Column
+
+def test_legacy_float_and_bool_histories_become_columns(tmp_path:Path):
+    wheel = [[t, round(t * 0.3, 1)] for t in range(0, 100, 10)]
+    lick = [[t, t % 20 == 0] for t in range(0, 100, 10)]
+    position = [[t, [0.5 * t, -0.25 * t]] for t in range(0, 100, 10)]
+    log = {'wheel': wheel, 'lick': lick, 'position': position, 'controls': {'valve': [[0, 0], [50, 1]]},
+           'trials': [], 'experiment_data': {}}
+    with open(tmp_path / 'log.json', 'w') as f:
+        json.dump(log, f)
+
+    session = open_session(tmp_path)
+    for name, entries, dtype in (('wheel', wheel, np.float64), ('lick', lick, np.bool_),
+                                 ('position', position, np.float64)):
+        history = session.sensor(name)
+        assert isinstance(history, Column)
+        assert history.values.dtype == dtype
+        assert [list(row) for row in history.to_list()] == entries
+    assert session.sensor('wheel').between(20, 50).to_list() == [(20, 6.0), (30, 9.0), (40, 12.0)]
+    assert session.sensor('position').at(55) == [25.0, -12.5]
+    assert session.sensor('lick').entry_at(45) == (40, True)
+    assert session.control('valve').at(60) == 1
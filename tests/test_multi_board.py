@@ -0,0 +1,49 @@
+import sys, time
+from pathlib import Path
+import pytest
+
+# neurokraken-internal imports (from core.networker import ...) and the teensy emulator
+sys.path.insert(0, str(Path(__file__).parent.parent / 'neurokraken'))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'toolkit' / 'teensy_emulator'))
+pytest.importorskip('serial')
+pytest.importorskip('tty')
+from core.networker import Networker, Multi_Networker
+from configurators import devices, on_board
+from teensy_emulator import Teensy_Emulator
+
+class Run_Controls:
+    active = True
+
+def test_secondary_board_timestamps_align_after_start():
+    # the secondary board's sensor reports its own clock - aligned to the primary board's t_ms both must match
+    ramp = {**devices.rotary_encoder(pins=(2, 3)), 'logging': True}
+    emulators = {None: Teensy_Emulator({}, {}),
+                 'aux': Teensy_Emulator({'ramp': ramp}, {}, signals={'ramp': lambda t: t})}
+    # the boards' clocks run 300 ms apart until the start restarts both
+    emulators['aux'].t_sync -= 0.3
+    for emulator in emulators.values():
+        emulator.start()
+    log = {}
+    serial_in = {'t_ms': devices.time_millis(), **on_board('aux', {'ramp': ramp})}
+    serial_out = {'start_stop': devices.start_stop()}
+    networkers = {board: Networker(serial_key=emulator.port, serial_in_log=log, run_controls=Run_Controls(),
+                                   name=board) for board, emulator in emulators.items()}
+    multi = Multi_Networker(networkers, serial_in, serial_out, serial_in_log=log)
+    try:
+        serial_out['start_stop']['value'] = 1
+        multi.write_teensy_data(serial_out)
+        t_end = time.perf_counter() + 2.5
+        while time.perf_counter() < t_end:
+            multi.read_teensy_data(serial_in)
+            time.sleep(0.001)
+        serial_out['start_stop']['value'] = 2
+        multi.write_teensy_data(serial_out)
+    finally:
+        multi.close()
+        for emulator in emulators.values():
+            emulator.stop()
+
+    assert multi.boards['aux'].clock_lead_ns is not None
+    entries = log['ramp'].to_list()
+    assert entries[-1][1] > 2000
+    assert max(abs(t - value) for t, value in entries) < 50
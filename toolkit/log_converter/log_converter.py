@@ -0,0 +1,249 @@
+"""Convert session logs to columnar Parquet (or Arrow IPC) tables for analysis.
+
+Every session folder (containing a log file like log.json or a log_stream) becomes a folder of tables:
+    sensors/<key>      t, value (value_0, value_1, ... for multi-value sensors) - also t_main_loop etc. (t only)
+    controls/<key>     t, value
+    cameras/<name>     t_ms, frame, vid_time
+    states             t, state
+    trials, blocks     one row per dict, nested keys flattened to 'outer.inner' columns
+    microphones/<name> t_ms, sample, audio_time
+    events             one column per tuple position
+    metadata.json      experiment_data and the remaining log values
+Folders are converted in parallel worker processes. A folder is skipped if its log's content hash
+matches the one recorded at its previous conversion.
+
+Requires pyarrow (pip install pyarrow).
+
+Usage:
+    python log_converter.py <session or parent folders...> [-o out_dir] [-j workers] [--format parquet|arrow] [--force]
+"""
+
+import sys, json, time, hashlib, argparse, os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# the log_stream reader uses neurokraken-internal imports (from core.log_store import ...)
+sys.path.insert(0, str((Path(__file__).parent.parent.parent / 'neurokraken').resolve()))
+from logs import Session, Column
+from core.log_writer import STREAM_DIR, MANIFEST
+from core.log_formats import find_log, load_log as load_log_file
+
+CONVERTER_VERSION = 2
+RECORD = '_conversion.json'
+CAMERAS = 'cameras (t_ms/#frame/vid_time)'
+MICROPHONES = 'microphones (t_ms/#sample/audio_time)'
+# the 10 second microphone keyframes - the only microphone timing of older logs, still logged alongside
+LEGACY_MICROPHONES = 'microphones (t_ms/audio_time)'
+
+#------------------------- READING -------------------------
+
+def is_session(folder:Path) -> bool:
+    return find_log(folder) is not None or (folder / STREAM_DIR / MANIFEST).is_file()
+
+def find_sessions(paths:list[Path]) -> list[Path]:
+    """The provided session folders and the session folders inside the provided parent folders"""
+    sessions = []
+    for path in paths:
+        if is_session(path):
+            sessions.append(path)
+        elif path.is_dir():
+            sessions.extend(sorted(p for p in path.iterdir() if p.is_dir() and is_session(p)))
+    return sessions
+
+def log_files(session:Path) -> list[Path]:
+    """The files a session's log is read from - a complete log_stream is preferred over the log file"""
+    stream_dir = session / STREAM_DIR
+    log_file = find_log(session)
+    if (stream_dir / MANIFEST).is_file():
+        with open(stream_dir / MANIFEST) as f:
+            if json.load(f)['complete'] or log_file is None:
+                return sorted(p for p in stream_dir.iterdir() if p.is_file() and not p.name.endswith('.tmp'))
+    return [log_file]
+
+def content_hash(files:list[Path]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for path in files:
+        digest.update(path.name.encode())
+        with open(path, 'rb') as f:
+            while chunk := f.read(1 << 22):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def load_log(session:Path, files:list[Path]) -> dict:
+    """The log with histories as Columns (log_stream) or lists (log file)"""
+    if len(files) == 1 and files[0].parent == session:
+        return load_log_file(files[0])
+    stream = Session(session)
+    return {key: stream.get(key) for key in stream.keys()}
+
+#------------------------- TABLES -------------------------
+
+def history_table(history:Column|list, time_name:str='t') -> dict|None:
+    """columns of a (t, value) history, or of plain times. None if the entries are no such history"""
+    if isinstance(history, Column):
+        if history.values is None:
+            return {time_name: np.asarray(history.times)}
+        return {time_name: np.asarray(history.times), **value_columns(np.asarray(history.values))}
+    if len(history) == 0:
+        return None
+    if all(type(e) == int for e in history):
+        return {time_name: np.array(history, dtype=np.int64)}
+    if not all(type(e) in (list, tuple) and len(e) == 2 and type(e[0]) == int for e in history):
+        return None
+    try:
+        values = np.array([e[1] for e in history])
+    except ValueError:
+        return None
+    if values.dtype.kind not in 'iubf' or values.ndim > 2:
+        return None
+    return {time_name: np.array([e[0] for e in history], dtype=np.int64), **value_columns(values)}
+
+def value_columns(values:np.ndarray) -> dict:
+    if values.ndim == 1:
+        return {'value': values}
+    return {f'value_{i}': values[:, i] for i in range(values.shape[1])}
+
+def row_table(rows:list, names:list[str]|None=None) -> dict:
+    """columns of a list of tuples (one column per position) or dicts (nested keys flattened)"""
+    if len(rows) != 0 and all(isinstance(row, dict) for row in rows):
+        flat_rows = [flatten(row) for row in rows]
+        keys = list(dict.fromkeys(key for row in flat_rows for key in row))
+        return {key: [row.get(key) for row in flat_rows] for key in keys}
+    rows = [tuple(row) if isinstance(row, (list, tuple)) else (row,) for row in rows]
+    width = max((len(row) for row in rows), default=1)
+    names = names if names is not None and len(names) == width else [f'c{i}' for i in range(width)]
+    return {name: [row[i] if i < len(row) else None for row in rows] for i, name in enumerate(names)}
+
+def flatten(item:dict, prefix:str='') -> dict:
+    flat = {}
+    for key, value in item.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+def log_tables(log:dict) -> tuple[dict[str, dict], dict]:
+    """Split a log into tables {relative path: {column: values}} and the remaining metadata"""
+    tables, metadata = {}, {}
+    for key, item in log.items():
+        if key == 'controls':
+            for name, history in item.items():
+                tables[f'controls/{name}'] = history_table(history) or row_table(list(history), ['t', 'value'])
+        elif key == CAMERAS:
+            for name, history in item.items():
+                tables[f'cameras/{name}'] = row_table(list(history), ['t_ms', 'frame', 'vid_time'])
+        elif key == MICROPHONES:
+            for name, history in item.items():
+                tables[f'microphones/{name}'] = row_table(list(history), ['t_ms', 'sample', 'audio_time'])
+        elif key == LEGACY_MICROPHONES:
+            if MICROPHONES in log:
+                # the keyframes still logged next to the per block histories - the same timing, coarser
+                continue
+            for name, history in item.items():
+                tables[f'microphones/{name}'] = row_table(list(history), ['t_ms', 'audio_time'])
+        elif key == 'states':
+            tables['states'] = row_table(list(item), ['t', 'state'])
+        elif key in ('trials', 'blocks', 'events'):
+            tables[key] = row_table(list(item))
+        elif isinstance(item, (list, Column)):
+            table = history_table(item)
+            tables[f'sensors/{key}'] = table if table is not None else row_table(list(item))
+        else:
+            metadata[key] = item
+    return tables, metadata
+
+#------------------------- WRITING -------------------------
+
+def to_arrow(pa, columns:dict):
+    arrays = {}
+    for name, values in columns.items():
+        try:
+            arrays[name] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # free-form entries with mixed types, i.e. a trial key holding ints and strings - keep them as JSON
+            arrays[name] = pa.array([None if v is None else json.dumps(v) for v in values], type=pa.string())
+    return pa.table(arrays)
+
+def convert(session:Path, out_dir:Path, file_format:str='parquet', force:bool=False) -> dict:
+    """Convert one session folder. Returns the conversion's statistics"""
+    import pyarrow as pa
+    t_start = time.perf_counter()
+    files = log_files(session)
+    num_bytes = sum(f.stat().st_size for f in files)
+    source_hash = content_hash(files)
+    record_path = out_dir / RECORD
+    if not force and record_path.is_file():
+        with open(record_path) as f:
+            record = json.load(f)
+        if record.get('source_hash') == source_hash and record.get('converter_version') == CONVERTER_VERSION \
+           and record.get('format') == file_format:
+            return {'session': session.name, 'skipped': True, 'bytes': num_bytes, 'rows': 0,
+                    'seconds': time.perf_counter() - t_start}
+
+    tables, metadata = log_tables(load_log(session, files))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    num_rows = 0
+    suffix = '.parquet' if file_format == 'parquet' else '.arrow'
+    for name, columns in tables.items():
+        table = to_arrow(pa, columns)
+        num_rows += table.num_rows
+        path = out_dir / (name + suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(table, path)
+        else:
+            import pyarrow.feather as feather
+            feather.write_feather(table, path)
+    with open(out_dir / 'metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    # written last - an interrupted conversion is redone
+    with open(record_path, 'w') as f:
+        json.dump({'source_hash': source_hash, 'converter_version': CONVERTER_VERSION, 'format': file_format,
+                   'tables': sorted(tables)}, f, indent=2)
+    return {'session': session.name, 'skipped': False, 'bytes': num_bytes, 'rows': num_rows,
+            'seconds': time.perf_counter() - t_start}
+
+def output_dir(session:Path, out_root:Path|None, file_format:str) -> Path:
+    if out_root is None:
+        return session / file_format
+    return out_root / session.name
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert neurokraken session logs to Parquet/Arrow tables')
+    parser.add_argument('paths', nargs='+', type=Path, help='session folders or folders containing sessions')
+    parser.add_argument('-o', '--out', type=Path, default=None,
+                        help='output folder for <session name> subfolders. Defaults to a folder inside every session')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='parallel worker processes')
+    parser.add_argument('-f', '--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--force', action='store_true', help='convert already converted sessions again')
+    args = parser.parse_args()
+
+    sessions = find_sessions(args.paths)
+    print(f'found {len(sessions)} sessions - converting with {args.jobs} workers')
+    t_start = time.perf_counter()
+    converted, skipped, failed, total_bytes, total_rows = 0, 0, 0, 0, 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(convert, session, output_dir(session, args.out, args.format), args.format, args.force):
+                   session for session in sessions}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f'failed {futures[future].name}: {e!r}')
+                continue
+            total_bytes += result['bytes']
+            if result['skipped']:
+                skipped += 1
+                continue
+            converted += 1
+            total_rows += result['rows']
+            print(f'{result["session"]}: {result["rows"]:,} rows, {result["bytes"] / 1e6:.1f} MB in {result["seconds"]:.2f} s')
+
+    seconds = time.perf_counter() - t_start
+    print(f'\n{converted} converted, {skipped} unchanged and skipped, {failed} failed in {seconds:.1f} s')
+    print(f'throughput: {len(sessions) / seconds:.2f} sessions/s, {total_bytes / 1e6 / seconds:.1f} MB/s of logs, ' +
+          f'{total_rows / seconds:,.0f} rows/s')
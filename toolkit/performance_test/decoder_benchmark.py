@@ -0,0 +1,88 @@
+"""Microbenchmark of the networker's packet decoding.
+Compares the legacy per-entry loop (slicing + int.from_bytes for every serial_in entry) with the
+precompiled struct based Direct_Decoder for serial_in configurations of 5, 20 and 60 sensors.
+Archivist mode histories are compared between the uncompressed and the compact (delta/varint) encoding
+in size and decoding time.
+No teensy is needed, packets are generated locally. Run as python decoder_benchmark.py"""
+
+import sys, random, timeit
+from pathlib import Path
+
+# the networker uses neurokraken-internal imports (from core.print0 import ...)
+sys.path.insert(0, str((Path(__file__).parent.parent.parent / 'neurokraken').resolve()))
+sys.path.insert(0, str((Path(__file__).parent.parent / 'teensy_emulator').resolve()))
+from core.networker import Direct_Decoder, decode_history, decode_compact_history
+from teensy_emulator import encode_compact_history
+
+def make_serial_in(num_sensors:int) -> dict:
+    # a realistic mix of t_ms, binary reads, analog reads and rotary encoders
+    templates = [{'value': 0, 'encoding': 'uint', 'byte_length': 1, 'logging': True},
+                 {'value': 0, 'encoding': 'uint', 'byte_length': 2, 'logging': True},
+                 {'value': 0, 'encoding': int,    'byte_length': 4, 'logging': True}]
+    serial_in = {'t_ms': {'value': 0, 'encoding': 'uint', 'byte_length': 4, 'logging': False}}
+    for i in range(num_sensors - 1):
+        serial_in[f'sensor{i}'] = dict(templates[i % len(templates)])
+    return serial_in
+
+def make_packet(serial_in:dict) -> bytes:
+    return bytes(random.getrandbits(8) for _ in range(sum(d['byte_length'] for d in serial_in.values())))
+
+def legacy_decode(data_in:bytes, ordered_in_values:dict):
+    byte_position = 0
+    for data_point in ordered_in_values.values():
+        bytes = data_in[byte_position:byte_position+data_point['byte_length']]
+        signed = True if data_point['encoding'] == int else False
+        value = int.from_bytes(bytes, 'little', signed=signed)
+        data_point['value'] = value
+        byte_position += data_point['byte_length']
+
+def make_history(num_entries:int, byte_length:int, step:int) -> list[tuple[int, bytes]]:
+    # a sensor changing every millisecond by small steps, like a turning rotary encoder
+    history, value = [], 0
+    for t_ms in range(num_entries):
+        value += random.randint(-step, step) or 1
+        history.append((t_ms, (value & ((1 << (8 * byte_length)) - 1)).to_bytes(byte_length, 'little')))
+    return history
+
+if __name__ == '__main__':
+    repeats = 20_000
+    print(f'direct mode decoding, mean of {repeats} packets')
+    print(f'{"sensors":>8} {"bytes":>6} {"legacy [us]":>12} {"compiled [us]":>14} {"speedup":>8}')
+    for num_sensors in (5, 20, 60):
+        serial_in = make_serial_in(num_sensors)
+        packet = make_packet(serial_in)
+
+        legacy_decode(packet, serial_in)
+        legacy_values = [d['value'] for d in serial_in.values()]
+        decoder = Direct_Decoder(serial_in)
+        decoder.decode(packet)
+        assert legacy_values == [d['value'] for d in serial_in.values()], 'decoders disagree'
+
+        t_legacy = min(timeit.repeat(lambda: legacy_decode(packet, serial_in), number=repeats, repeat=5)) / repeats
+        t_compiled = min(timeit.repeat(lambda: decoder.decode(packet), number=repeats, repeat=5)) / repeats
+        print(f'{num_sensors:>8} {len(packet):>6} {t_legacy*1e6:>12.2f} {t_compiled*1e6:>14.2f} {t_legacy/t_compiled:>7.1f}x')
+
+    repeats = 2_000
+    print(f'\narchivist history decoding, mean of {repeats} histories of a sensor changing every millisecond')
+    print(f'{"sensor":>14} {"entries":>8} {"bytes":>6} {"compact":>8} {"saved [kB/s]":>13} ' +
+          f'{"decode [us]":>12} {"compact [us]":>13}')
+    for sensor, byte_length, step in (('analog_read', 2, 3), ('rotary_encoder', 4, 20)):
+        for num_entries in (10, 100, 1000):
+            history = make_history(num_entries, byte_length, step)
+            log_times = b''.join(t.to_bytes(4, 'little') for t, _ in history)
+            log_values = b''.join(v for _, v in history)
+            block = encode_compact_history(history, byte_length)[2:]
+
+            times, values = decode_history(log_times, log_values, byte_length, True)
+            compact_times, compact_values = decode_compact_history(block, num_entries, byte_length, True)
+            assert times.tolist() == compact_times.tolist() and values.tolist() == compact_values.tolist(), 'decoders disagree'
+
+            t_plain = min(timeit.repeat(lambda: decode_history(log_times, log_values, byte_length, True),
+                                        number=repeats, repeat=5)) / repeats
+            t_compact = min(timeit.repeat(lambda: decode_compact_history(block, num_entries, byte_length, True),
+                                          number=repeats, repeat=5)) / repeats
+            plain_bytes = len(log_times) + len(log_values)
+            compact_bytes = len(block) + 2
+            saved = (plain_bytes - compact_bytes) * 1000 / num_entries / 1000
+            print(f'{sensor:>14} {num_entries:>8} {plain_bytes:>6} {compact_bytes:>8} {saved:>13.1f} ' +
+                  f'{t_plain*1e6:>12.2f} {t_compact*1e6:>13.2f}')
@@ -0,0 +1,83 @@
+"""Benchmark of the log formats of Neurokraken(log_format=...): save time, file size and load time of a
+synthetic session log. Its default is an 8 hour session with an analog sensor changing at 50 Hz, a rotary
+encoder at 20 Hz, a lick sensor, 2 valves, a 30 fps camera, main loop timing at 100 Hz and a trial every
+10 seconds. Formats whose package is not installed are skipped.
+Run as python log_format_benchmark.py [--hours 8] [--formats json npz ...]"""
+
+import sys, time, argparse, tempfile
+from pathlib import Path
+import numpy as np
+
+# the log formats use neurokraken-internal imports
+sys.path.insert(0, str((Path(__file__).parent.parent.parent / 'neurokraken').resolve()))
+from core.log_store import Log_History, Vid_Time_Row
+from core.log_formats import LOG_FORMATS, serializer_for, load_log
+
+def history(duration_ms:int, rate_hz:float, dtype:str, low:int, high:int, rng:np.random.Generator) -> Log_History:
+    """A sensor history with entries at random times at about rate_hz"""
+    num_entries = int(duration_ms / 1000 * rate_hz)
+    times = np.sort(rng.integers(0, duration_ms, num_entries)).astype(np.int32)
+    history = Log_History(dtype)
+    history.extend_arrays(times, rng.integers(low, high, num_entries).astype(dtype))
+    return history
+
+def synthetic_log(hours:float, seed:int=0) -> dict:
+    rng = np.random.default_rng(seed)
+    duration_ms = int(hours * 3600 * 1000)
+    frames = Log_History('u4', row_format=Vid_Time_Row(30))
+    frame_times = np.arange(0, duration_ms, 1000 / 30).astype(np.int32)
+    frames.extend_arrays(frame_times, np.arange(len(frame_times), dtype=np.uint32))
+    t_main_loop = Log_History()
+    t_main_loop.extend_arrays(np.arange(0, duration_ms, 10, dtype=np.int32))
+    trial_starts = range(0, duration_ms, 10_000)
+    log = {'experiment_data': {'subject': {'ID': 'benchmark'}, 'task': 'synthetic'},
+           'events': [(t + 5_000, 'reward') for t in trial_starts],
+           'trials': [{'start': t, 'end': t + 10_000, 'block': 'b', 'correct': bool(i % 3),
+                       'response_ms': int(rng.integers(200, 2_000))} for i, t in enumerate(trial_starts)],
+           'blocks': [{'name': 'b', 'start': 0}],
+           'states': [(t + offset, state) for t in trial_starts for offset, state in ((0, 'iti'), (3_000, 'stim'),
+                                                                                      (5_000, 'reward'))],
+           'cameras (t_ms/#frame/vid_time)': {'cam0': frames},
+           'microphones (t_ms/#sample/audio_time)': {},
+           'controls': {'valve': history(duration_ms, 0.2, 'u1', 0, 2, rng),
+                        'valve2': history(duration_ms, 0.2, 'u1', 0, 2, rng)},
+           'lever': history(duration_ms, 50, 'u2', 0, 1024, rng),
+           'wheel': history(duration_ms, 20, 'i4', -100_000, 100_000, rng),
+           'lick': history(duration_ms, 2, 'u1', 0, 2, rng),
+           't_main_loop': t_main_loop}
+    return log
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=8)
+    parser.add_argument('--formats', nargs='+', default=list(LOG_FORMATS))
+    args = parser.parse_args()
+
+    log = synthetic_log(args.hours)
+    num_rows = sum(len(v) for v in log.values() if isinstance(v, (list, Log_History))) + \
+               sum(len(h) for group in ('controls', 'cameras (t_ms/#frame/vid_time)') for h in log[group].values())
+    print(f'synthetic {args.hours} hour log with {num_rows:,} entries')
+    print(f'{"format":>10} {"save [s]":>9} {"size [MB]":>10} {"load [s]":>9} {"vs json save":>13} {"vs json size":>13}')
+    reference = None
+    with tempfile.TemporaryDirectory() as folder:
+        for name in args.formats:
+            serializer = serializer_for(name)
+            try:
+                serializer.check()
+            except ImportError as e:
+                print(f'{name:>10}  skipped: {e}')
+                continue
+            file_path = Path(folder) / ('log' + serializer.suffix)
+            t_start = time.perf_counter()
+            serializer.write(log, file_path, lambda progress: None)
+            t_save = time.perf_counter() - t_start
+            size = file_path.stat().st_size
+            t_start = time.perf_counter()
+            loaded = load_log(file_path)
+            t_load = time.perf_counter() - t_start
+            assert loaded['lever'][-1] == list(log['lever'][-1]), f'{name} loaded a different log'
+            if reference is None:
+                reference = (t_save, size)
+            print(f'{name:>10} {t_save:>9.2f} {size / 1e6:>10.1f} {t_load:>9.2f} ' +
+                  f'{reference[0] / t_save:>12.1f}x {reference[1] / size:>12.1f}x')
+            file_path.unlink()
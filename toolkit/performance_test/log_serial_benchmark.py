@@ -0,0 +1,84 @@
+"""Microbenchmark of direct mode logging per main loop iteration.
+Compares the legacy Main.log_serial (checking 'logging', resolving the history and comparing with its last
+entry for every serial_in entry) with the precompiled Change_Log_Plan for 5, 20 and 60 logged sensors,
+and the plan's vectorized log_array() for a serial_in backed by an array. Iterations without changed sensors
+(the common case) are measured separately from iterations with 2 changed sensors.
+No teensy is needed. Run as python log_serial_benchmark.py"""
+
+import sys, timeit
+from pathlib import Path
+import numpy as np
+
+# the log store uses neurokraken-internal imports
+sys.path.insert(0, str((Path(__file__).parent.parent.parent / 'neurokraken').resolve()))
+from core.log_store import Change_Log_Plan, history_for
+
+def make_serial_in(num_sensors:int) -> dict:
+    serial_in = {'t_ms': {'value': 0, 'encoding': 'uint', 'byte_length': 4, 'logging': False}}
+    for i in range(num_sensors):
+        serial_in[f'sensor{i}'] = {'value': 0, 'encoding': 'uint', 'byte_length': 2, 'logging': True}
+    return serial_in
+
+def legacy_log_serial(serial_in:dict, time:str='t_ms', log:dict={}):
+    time = serial_in[time]['value']
+    for key, data in serial_in.items():
+        if data['logging']:
+            history = history_for(log, key, data)
+            current_val = data['value']
+            try:
+                if current_val != history[-1][1]:
+                    history.append((time, current_val))
+            except IndexError:
+                history.append((time, current_val))
+
+class Loop:
+    """One main loop iteration: the networker updates serial_in (num_changes sensors change), then it is logged"""
+    def __init__(self, num_sensors:int, num_changes:int):
+        self.serial_in = make_serial_in(num_sensors)
+        self.sensors = [self.serial_in[f'sensor{i}'] for i in range(num_sensors)]
+        self.array = np.zeros(num_sensors, dtype=np.uint16)
+        self.iteration = 0
+        self.num_changes = num_changes
+
+    def update(self):
+        self.iteration += 1
+        self.serial_in['t_ms']['value'] = self.iteration
+        for i in (self.iteration % len(self.sensors), (self.iteration * 7) % len(self.sensors))[:self.num_changes]:
+            self.sensors[i]['value'] = self.iteration & 0xFFFF
+            self.array[i] = self.iteration & 0xFFFF
+
+def measure(num_sensors:int, num_changes:int, repeats:int) -> tuple[float, float, float]:
+    """The legacy, plan and array logging durations per iteration in s"""
+    loop, legacy_log = Loop(num_sensors, num_changes), {}
+    def legacy():
+        loop.update()
+        legacy_log_serial(loop.serial_in, 't_ms', legacy_log)
+
+    plan_loop, plan_log = Loop(num_sensors, num_changes), {}
+    plan = Change_Log_Plan(plan_loop.serial_in, plan_log)
+    def planned():
+        plan_loop.update()
+        plan.log_changes(plan_loop.serial_in['t_ms']['value'])
+
+    array_loop, array_log = Loop(num_sensors, num_changes), {}
+    array_plan = Change_Log_Plan(array_loop.serial_in, array_log)
+    def arrayed():
+        array_loop.update()
+        array_plan.log_array(array_loop.iteration, array_loop.array)
+
+    # the serial_in update is part of every measured iteration - subtract it
+    t_update = min(timeit.repeat(Loop(num_sensors, num_changes).update, number=repeats, repeat=5)) / repeats
+    durations = [min(timeit.repeat(f, number=repeats, repeat=5)) / repeats - t_update for f in (legacy, planned, arrayed)]
+    for key in legacy_log:
+        assert legacy_log[key] == plan_log[key] == array_log[key], f'logs of {key} disagree'
+    return tuple(durations)
+
+if __name__ == '__main__':
+    repeats = 20_000
+    print(f'direct mode logging per main loop iteration, mean of {repeats} iterations')
+    print(f'{"sensors":>8} {"changed":>8} {"legacy [us]":>12} {"plan [us]":>10} {"array [us]":>11} {"speedup":>8}')
+    for num_sensors in (5, 20, 60):
+        for num_changes in (0, 2):
+            t_legacy, t_plan, t_array = measure(num_sensors, num_changes, repeats)
+            print(f'{num_sensors:>8} {num_changes:>8} {t_legacy*1e6:>12.2f} {t_plan*1e6:>10.2f} {t_array*1e6:>11.2f} ' +
+                  f'{t_legacy/t_plan:>7.1f}x')
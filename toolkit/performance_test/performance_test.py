@@ -6,11 +6,15 @@ To use this script run an experiment with an explicitly defined milliseconds and
 serial_in = {'t_ms': devices.time_millis(logging=True), 't_us': devices._time_micros(logging=True)}
 In real experiments these entries do not provide practical benefits and should be excluded to not log thousands of extra events every second"""
 
+import sys
 from pathlib import Path
-import json
 import argparse
 import numpy as np
 
+# the log reader uses neurokraken-internal imports (from core.log_store import ...)
+sys.path.insert(0, str((Path(__file__).parent.parent.parent / 'neurokraken').resolve()))
+from logs import open_session
+
 parser = argparse.ArgumentParser()
 parser.add_argument('-l', '--last', action='store_true', help ='use the last experiment')
 args = parser.parse_args()
@@ -30,16 +34,13 @@ else:
     log = input('> ')
     log = Path(log)
 
-log = log / 'log.json'
 print(f'opening: {log}')
+log = open_session(log)
 
-with open(str(log)) as file:
-    log = json.load(file)
-
-has_main_loop = True if 't_main_loop' in log else False
+has_main_loop = True if 't_main_loop' in log.keys() else False
 if has_main_loop:
     print('found main loop iterations')
-    main_loop_t = log['t_main_loop']
+    main_loop_t = log['t_main_loop'].times
     main_loop_diff = np.diff(main_loop_t)
     main_loop_mean = np.mean(main_loop_diff)
     main_loop_stddev = np.std(main_loop_diff)
@@ -49,7 +50,7 @@ if has_main_loop:
 has_received = True if 't_received' in log.keys() else False
 if has_received:
     print('found communication iterations')
-    received_t = log['t_received']
+    received_t = log['t_received'].times
     received_diff = np.diff(received_t)
     received_mean = np.mean(received_diff)
     received_stddev = np.std(received_diff)
@@ -59,8 +60,7 @@ if has_received:
 has_t_ms = True if 't_ms' in log.keys() else False
 if has_t_ms:
     print('found millisecond changes')
-    t_ms = log['t_ms'] # set logging to True
-    t_ms = [t[1] for t in t_ms]
+    t_ms = log.sensor('t_ms').values # set logging to True
     t_ms_diff = np.diff(t_ms)
     t_ms_mean = np.mean(t_ms_diff)
     t_ms_stddev = np.std(t_ms_diff)
@@ -70,8 +70,7 @@ if has_t_ms:
 has_t_us = True if 't_us' in log.keys() else False
 if has_t_us:
     print('found microsecond precision')
-    t_us = log['t_us']
-    t_us = [t[1] for t in t_us]
+    t_us = log.sensor('t_us').values.astype(np.int64)
     t_us_diff = np.diff(t_us) - 1000 # 1ms has passed between samplings
     t_us_mean = np.mean(t_us_diff)
     t_us_stddev = np.std(t_us_diff)
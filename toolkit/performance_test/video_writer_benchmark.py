@@ -0,0 +1,94 @@
+"""Benchmark of the camera video writers of configurators.Camera(vid_writer=...) and of save_as_raw: the time a
+frame's write blocks the capture loop, the total CPU time (including the ffmpeg process) and the file size.
+The raw recording's transcoding after the session is timed separately.
+Frames are synthetic greyscale frames with moving content, written as fast as possible or at --fps.
+The CPU time of the finished ffmpeg process is only available on Linux and macOS.
+Run as python video_writer_benchmark.py [--frames 600] [--width 1280] [--height 720] [--fps 0]"""
+
+import sys, os, time, argparse, tempfile
+from pathlib import Path
+import numpy as np
+import cv2
+
+# the writers use neurokraken-internal imports
+sys.path.insert(0, str((Path(__file__).parent.parent.parent / 'neurokraken').resolve()))
+from core.video_writers import Ffmpeg_Writer
+from core import raw_recording
+
+def cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def frames(num:int, width:int, height:int) -> list[np.ndarray]:
+    """greyscale frames of a gradient moving over noise, roughly like a camera image"""
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 40, (height, width), dtype=np.uint8)
+    gradient = np.tile(np.linspace(0, 200, width, dtype=np.uint8), (height, 1))
+    return [cv2.add(np.roll(gradient, 8 * i, axis=1), noise) for i in range(num)]
+
+class Raw:
+    """Raw_Writer with the write()/release() interface of the video writers"""
+    def __init__(self, path:str, width:int, height:int):
+        self.folder = path + '_raw'
+        settings = {'name': Path(path).stem, 'fps': 30, 'vid_container': 'mp4', 'vid_codec': 'mp4v', 'vid_writer': 'cv2',
+                    'vid_ffmpeg_codec': 'libx264', 'vid_preset': 'ultrafast', 'vid_crf': 23, 'vid_pix_fmt': 'yuv420p',
+                    'vid_queue_size': 120, 'save_as_vid': True}
+        self.writer = raw_recording.Raw_Writer(self.folder, settings, 200, bgr=True)
+        self.num_frames = 0
+
+    def write(self, image:np.ndarray):
+        self.writer.write(image, self.num_frames, self.num_frames)
+        self.num_frames += 1
+
+    def release(self):
+        self.writer.close(transcode=False)
+
+def run(name:str, writer, images:list[np.ndarray], fps:float) -> dict:
+    blocked = []
+    cpu_start, t_start = cpu_seconds(), time.perf_counter()
+    for i, image in enumerate(images):
+        if fps:
+            time.sleep(max(0, t_start + i / fps - time.perf_counter()))
+        t = time.perf_counter()
+        writer.write(image)
+        blocked.append(time.perf_counter() - t)
+    writer.release()
+    blocked = np.array(blocked) * 1000
+    return {'writer': name, 'seconds': time.perf_counter() - t_start, 'cpu': cpu_seconds() - cpu_start,
+            'p50': np.percentile(blocked, 50), 'p99': np.percentile(blocked, 99), 'max': blocked.max(),
+            'dropped': getattr(writer, 'dropped', 0)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=0, help='write at this rate, 0 for as fast as possible')
+    args = parser.parse_args()
+
+    images = frames(args.frames, args.width, args.height)
+    size = (args.width, args.height)
+    with tempfile.TemporaryDirectory() as folder:
+        writers = {
+            'cv2 mp4v': lambda path: cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30, size, isColor=False),
+            'ffmpeg libx264 veryfast': lambda path: Ffmpeg_Writer(path, *size, 30, preset='veryfast',
+                                                                  queue_size=args.frames),
+            'ffmpeg libx264 ultrafast': lambda path: Ffmpeg_Writer(path, *size, 30, preset='ultrafast',
+                                                                   queue_size=args.frames),
+            'raw memmap': lambda path: Raw(path, *size),
+        }
+        print(f'{args.frames} frames of {args.width}x{args.height}' + (f' at {args.fps} fps' if args.fps else ''))
+        print(f'{"writer":26}{"seconds":>9}{"cpu s":>8}{"write p50":>11}{"p99":>8}{"max ms":>8}{"dropped":>9}{"MB":>8}')
+        for i, (name, make_writer) in enumerate(writers.items()):
+            path = os.path.join(folder, f'{i}.mp4')
+            writer = make_writer(path)
+            result = run(name, writer, images, args.fps)
+            if isinstance(writer, Raw):
+                size_mb = sum(f.stat().st_size for f in Path(writer.folder).iterdir()) / 1e6
+                t_start = time.perf_counter()
+                raw_recording.transcode(writer.folder)
+                transcoding = f'  (transcoded to mp4v after the session in {time.perf_counter() - t_start:.2f} s)'
+            else:
+                size_mb, transcoding = os.path.getsize(path) / 1e6, ''
+            print(f'{name:26}{result["seconds"]:9.2f}{result["cpu"]:8.2f}{result["p50"]:11.3f}{result["p99"]:8.3f}' +
+                  f'{result["max"]:8.2f}{result["dropped"]:9}{size_mb:8.1f}{transcoding}')
@@ -0,0 +1,402 @@
+"""A python Teensy emulator speaking the teensy.ino wire protocol over a pseudo-terminal (Linux/macOS).
+
+The emulator reads the Config.h-equivalent layout from a task's serial_in/serial_out dictionaries and
+answers every communication like teensy.ino would, in direct or archivist mode, legacy or framed protocol,
+including history length words, timestamps, compact (delta/varint) histories, debug bytes and StartStop semantics. The python side connects
+unchanged with Networker(serial_key=emulator.port) or Neurokraken(serial_key=emulator.port).
+Sensor values are generated from configurable signals (functions of the teensy time in ms) and the clock
+can run in real time (speed=1.0) or accelerated (i.e. speed=10.0).
+
+Example:
+    >>> from teensy_emulator import Teensy_Emulator
+    >>> emulator = Teensy_Emulator(config.serial_in, config.serial_out, archivist_mode=True,
+    >>>                            signals={'lick': lambda t: 1 if t % 2000 < 50 else 0})
+    >>> emulator.start()
+    >>> nk = Neurokraken(serial_in=config.serial_in, serial_out=config.serial_out, serial_key=emulator.port)
+
+Running this script directly measures networker throughput and round trip latency against the emulator:
+    python teensy_emulator.py --sensors 20 --seconds 5 --mode archivist [--compact]
+"""
+
+import os, sys, tty, select, time, math, random
+from threading import Thread
+from typing import Callable
+
+# the same limits as the Sensor class in _Networker.h and the Debug class in _DebugUtils.h
+MAX_HISTORY = 1023
+MAX_DEBUG_STRING = 299
+
+FRAME_MAGIC = b'\x00\xff'
+START_STOP_START, START_STOP_STOP, START_STOP_FRAMED, START_STOP_LEGACY = 1, 2, 3, 4
+
+def default_signal(name:str, entry:dict) -> Callable[[int], int|list]:
+    """A synthetic signal matching the device's arduino_class"""
+    arduino_class = entry.get('arduino_class', None)
+    args = entry.get('arduino_args', None)
+    phase = random.random() * 1000
+    match arduino_class:
+        case 'DigitalSensor':
+            return lambda t: 1 if (t + phase) % 1000 < 100 else 0
+        case 'AnalogSensor':
+            return lambda t: int(512 + 400 * math.sin((t + phase) / 250))
+        case 'RotEnc':
+            # a wheel turning back and forth, changing every millisecond
+            return lambda t: int(2000 * math.sin((t + phase) / 1000))
+        case 'CapacitiveRead':
+            return lambda t: 200 + random.randint(0, 20)
+        case 'PulseClock':
+            # handled by the emulator since it depends on the active state
+            return None
+    if isinstance(entry['value'], list):
+        return lambda t: [0] * len(entry['value'])
+    return lambda t: 0
+
+def encode_varint(value:int) -> bytes:
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+def encode_compact_history(history:list[tuple[int, bytes]], byte_length:int, num_values:int=1) -> bytes:
+    """The block Networker::writeCompactHistory in _Networker.h sends after the history length:
+    uint16 block length (only for 2 or more entries), 4 byte timestamp and raw value bytes of the first entry,
+    then per further entry a varint timestamp delta and a zig-zag varint value delta per value"""
+    block = bytearray()
+    bits = 8 * byte_length
+    for i, (t_ms, sensed) in enumerate(history):
+        if i == 0:
+            block += t_ms.to_bytes(4, 'little') + sensed
+            continue
+        previous_t, previous = history[i-1]
+        block += encode_varint((t_ms - previous_t) & 0xFFFFFFFF)
+        for v in range(num_values):
+            value_bytes = slice(v * byte_length, (v+1) * byte_length)
+            delta = (int.from_bytes(sensed[value_bytes], 'little') - int.from_bytes(previous[value_bytes], 'little'))
+            delta &= (1 << bits) - 1
+            if delta >= 1 << (bits - 1):
+                delta -= 1 << bits
+            # zig-zag: 0,-1,1,-2 => 0,1,2,3
+            block += encode_varint(delta << 1 if delta >= 0 else (-delta << 1) - 1)
+    if len(history) < 2:
+        return bytes(block)
+    return len(block).to_bytes(2, 'little') + bytes(block)
+
+class _Emulated_Sensor:
+    def __init__(self, name:str, entry:dict, signal:Callable|None):
+        self.name = name
+        self.arduino_class = entry.get('arduino_class', None)
+        if self.arduino_class is None and name in ('t_ms', 't_us'):
+            # neurokraken auto-adds t_ms without an arduino_class, config2teensy makes it a MillisReader
+            self.arduino_class = 'MillisReader' if name == 't_ms' else 'MicrosReader'
+        self.byte_length = entry['byte_length']
+        self.num_values = len(entry['value']) if isinstance(entry['value'], list) else 1
+        self.compact = entry.get('compact', False)
+        self.mask = (1 << (8 * self.byte_length)) - 1
+        self.signal = signal if signal is not None else default_signal(name, entry)
+        self.change_period = None
+        if self.arduino_class == 'PulseClock':
+            self.change_period = entry['arduino_args'][1]
+            self.pulse_state = 1
+        self.last_bytes = bytes(self.byte_length * self.num_values)
+        self.history:list[tuple[int, bytes]] = []
+
+    def to_bytes(self, value) -> bytes:
+        values = value if isinstance(value, (list, tuple)) else (value,)
+        return b''.join([(int(v) & self.mask).to_bytes(self.byte_length, 'little') for v in values])
+
+class Teensy_Emulator:
+    """Emulates a teensy running teensy.ino with the Config.h created by config2teensy.py from the provided
+    serial_in/serial_out.
+
+    Args:
+        serial_in (dict): The task's serial_in. t_ms is added if missing, as neurokraken and config2teensy do.
+        serial_out (dict): The task's serial_out. start_stop is added if missing.
+        archivist_mode (bool, optional): archivist mode (default firmware) or direct mode (#define DIRECT_MODE). Defaults to True.
+        signals (dict[str, Callable[[int], int|list]], optional): Signal functions of the teensy time in milliseconds
+            for serial_in entries. Entries without a provided signal use a synthetic default for their arduino_class.
+        speed (float, optional): Clock speed relative to real time. Defaults to 1.0.
+        debug_level (int, optional): krakenVars::debugLevel. At 1 the received bytes are sent back as debug string. Defaults to 0.
+        poll_interval_s (float, optional): Maximum wait for serial input per emulated loop(). Defaults to 0.0001.
+    """
+    def __init__(self, serial_in:dict, serial_out:dict, archivist_mode:bool=True,
+                 signals:dict[str, Callable[[int], int|list]]={}, speed:float=1.0,
+                 debug_level:int=0, poll_interval_s:float=0.0001):
+        if not 't_ms' in serial_in.keys():
+            serial_in = {'t_ms': {'value': 0, 'encoding': 'uint', 'byte_length': 4, 'logging': False,
+                                  'arduino_class': 'MillisReader'}, **serial_in}
+        if not 'start_stop' in serial_out.keys():
+            serial_out = {'start_stop': {'value': 0, 'encoding': 'uint', 'byte_length': 1,
+                                         'default': 0, 'reset_after_send': True,
+                                         'arduino_class': 'StartStop'}, **serial_out}
+        self.archivist_mode = archivist_mode
+        self.speed = speed
+        self.debug_level = debug_level
+        self.poll_interval_s = poll_interval_s
+
+        self.sensors = [_Emulated_Sensor(name, entry, signals.get(name, None)) for name, entry in serial_in.items()]
+        self.controls = [(name, entry['byte_length']) for name, entry in serial_out.items()]
+        self.read_buffer_size = sum(byte_length for _, byte_length in self.controls)
+        self.message_length = sum(s.byte_length for s in self.sensors)
+        self.control_values:dict[str, int] = {name: 0 for name, _ in self.controls}
+        """The most recently received value of every serial_out control"""
+
+        # krakenVars
+        self.active = False
+        self.starting = False
+        self.framed = False
+
+        # elapsedMillis millisSinceSync / elapsedMicros microsSinceHour
+        self.t_sync = time.perf_counter()
+        self.millis_last_sensing = None
+
+        self.communications = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        """Bytes compact histories saved compared to sending them uncompressed"""
+        self.in_buffer = bytearray()
+        self.debug_string = ''
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port:str = os.ttyname(self.slave)
+        """The device path to provide as serial_key"""
+
+        self.running = False
+        self.thread = Thread(target=self.run, name='teensy_emulator', daemon=True)
+
+    #------------------------- CLOCK -------------------------
+
+    def millis(self) -> int:
+        return int((time.perf_counter() - self.t_sync) * 1000 * self.speed) & 0xFFFFFFFF
+
+    def micros(self) -> int:
+        return int((time.perf_counter() - self.t_sync) * 1_000_000 * self.speed) % 3_600_000_000
+
+    def reset_clock(self):
+        self.t_sync = time.perf_counter()
+
+    #------------------------- SENSORS -------------------------
+
+    def read_sensor(self, sensor:_Emulated_Sensor, t_ms:int) -> bytes:
+        match sensor.arduino_class:
+            case 'MillisReader':
+                return sensor.to_bytes(t_ms)
+            case 'MicrosReader':
+                return sensor.to_bytes(self.micros())
+            case 'PulseClock':
+                if self.active:
+                    sensor.pulse_state = 1 if t_ms % (sensor.change_period * 2) >= sensor.change_period else 0
+                return sensor.to_bytes(sensor.pulse_state)
+        return sensor.to_bytes(sensor.signal(t_ms))
+
+    def sense(self):
+        """read the sensors every millisecond and add changed values to their history"""
+        now = self.millis()
+        if self.millis_last_sensing is None:
+            t_sense = [now]
+        elif now == self.millis_last_sensing:
+            return
+        else:
+            # emulate every skipped millisecond (accelerated clock or a delayed emulator loop)
+            t_sense = range(max(self.millis_last_sensing + 1, now - MAX_HISTORY), now + 1)
+        self.millis_last_sensing = now
+        for t_ms in t_sense:
+            for sensor in self.sensors:
+                sensed = self.read_sensor(sensor, t_ms)
+                if sensed != sensor.last_bytes:
+                    sensor.last_bytes = sensed
+                    if self.active:
+                        # the teensy keeps overwriting its unsent last slot once the history is full
+                        if len(sensor.history) < MAX_HISTORY:
+                            sensor.history.append((t_ms, sensed))
+                    else:
+                        # keep this one datapoint alive rather than incrementing data for nobody to read
+                        sensor.history = [(t_ms, sensed)]
+
+    #------------------------- COMMUNICATION -------------------------
+
+    def act(self, message:bytes):
+        position = 0
+        for name, byte_length in self.controls:
+            self.control_values[name] = int.from_bytes(message[position:position+byte_length], 'little')
+            position += byte_length
+        start_stop = self.control_values['start_stop']
+        if start_stop == START_STOP_START:
+            self.reset_clock()
+            self.starting = True
+        elif start_stop == START_STOP_STOP:
+            self.active = False
+            for sensor in self.sensors:
+                if sensor.arduino_class == 'PulseClock':
+                    sensor.pulse_state = 1
+        elif start_stop == START_STOP_FRAMED:
+            self.framed = True
+        elif start_stop == START_STOP_LEGACY:
+            self.framed = False
+
+    def debug_str(self, text:str):
+        if self.debug_level == 1:
+            self.debug_string = (self.debug_string + text)[:MAX_DEBUG_STRING]
+
+    def answer(self) -> bytes:
+        packet = bytearray()
+        if not self.archivist_mode:
+            t_ms = self.millis()
+            for sensor in self.sensors:
+                packet += self.read_sensor(sensor, t_ms)
+        else:
+            for sensor in self.sensors:
+                packet += len(sensor.history).to_bytes(2, 'little')
+                if sensor.compact:
+                    block = encode_compact_history(sensor.history, sensor.byte_length, sensor.num_values)
+                    packet += block
+                    self.bytes_saved += len(sensor.history) * (4 + sensor.byte_length * sensor.num_values) - len(block)
+                    sensor.history = []
+                    continue
+                for t_ms, _ in sensor.history:
+                    packet += t_ms.to_bytes(4, 'little')
+                for _, sensed in sensor.history:
+                    packet += sensed
+                sensor.history = []
+
+        debug = self.debug_string.encode() if self.debug_level == 1 else b''
+        if self.framed:
+            debug = debug[:255]
+            payload = packet + bytes([len(debug)]) + debug
+            return FRAME_MAGIC + len(payload).to_bytes(4, 'little') + payload
+        if not self.archivist_mode:
+            packet = bytes([self.message_length & 0xFF]) + packet
+        if self.debug_level == 1:
+            packet += bytes([len(debug) & 0xFF]) + debug
+        return bytes(packet)
+
+    def write(self, data:bytes):
+        view = memoryview(data)
+        while len(view) > 0:
+            written = os.write(self.master, view)
+            view = view[written:]
+        self.bytes_sent += len(data)
+
+    def loop(self):
+        """one iteration of teensy.ino loop()"""
+        if self.starting:
+            if self.millis() < 1:
+                return
+            self.reset_clock()
+            self.millis_last_sensing = None
+            for sensor in self.sensors:
+                if sensor.arduino_class == 'PulseClock':
+                    sensor.pulse_state = 0
+            self.starting = False
+            self.active = True
+
+        self.debug_string = ''
+
+        if self.archivist_mode:
+            self.sense()
+
+        readable, _, _ = select.select([self.master], [], [], self.poll_interval_s)
+        if readable:
+            self.in_buffer += os.read(self.master, 4096)
+
+        if len(self.in_buffer) >= self.read_buffer_size:
+            message = bytes(self.in_buffer[:self.read_buffer_size])
+            leftover = len(self.in_buffer) - self.read_buffer_size
+            self.in_buffer.clear()
+            self.debug_str('Teensy Received bytes: ')
+            for i, b in enumerate(message):
+                self.debug_str(f'B{i}: {b:x} ')
+            self.act(message)
+            for _ in range(leftover):
+                self.debug_str('A leftover input byte was found\n')
+            self.write(self.answer())
+            self.communications += 1
+
+    def run(self):
+        while self.running:
+            try:
+                self.loop()
+            except OSError:
+                # the pseudo-terminal was closed
+                break
+
+    def start(self):
+        """Start emulating in a background thread"""
+        self.running = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread.is_alive():
+            self.thread.join(1.0)
+        os.close(self.master)
+        os.close(self.slave)
+
+#------------------------- THROUGHPUT AND LATENCY MEASUREMENT -------------------------
+
+if __name__ == '__main__':
+    import argparse
+    import numpy as np
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--sensors', type=int, default=20, help='number of emulated sensors')
+    parser.add_argument('-s', '--seconds', type=float, default=5.0, help='measurement duration')
+    parser.add_argument('-m', '--mode', choices=['archivist', 'direct'], default='archivist')
+    parser.add_argument('-x', '--speed', type=float, default=1.0, help='emulated clock speed relative to real time')
+    parser.add_argument('-f', '--framed', action='store_true', help='use the framed protocol')
+    parser.add_argument('-c', '--compact', action='store_true', help='send delta/varint compact histories')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str((os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'neurokraken'))))
+    from core.networker import Networker
+    from core.log_store import Log_History
+    from configurators import devices
+
+    serial_in = {'t_ms': devices.time_millis()}
+    for i in range(args.sensors - 1):
+        device = [devices.binary_read, devices.analog_read, lambda pin: devices.rotary_encoder(pins=(pin, pin+1))][i % 3]
+        serial_in[f'sensor{i}'] = device(i)
+    for entry in serial_in.values():
+        entry['compact'] = args.compact
+    serial_out = {'start_stop': devices.start_stop(),
+                  **{f'valve{i}': devices.direct_on(pin=i) for i in range(10)},
+                  **{f'servo{i}': devices.servo(pin=20+i) for i in range(5)}}
+
+    archivist_mode = args.mode == 'archivist'
+    emulator = Teensy_Emulator(serial_in, serial_out, archivist_mode=archivist_mode, speed=args.speed).start()
+    log = {}
+    networker = Networker(serial_key=emulator.port, archivist_mode=archivist_mode, serial_in_log=log)
+    if args.framed:
+        networker.negotiate_protocol(serial_out, framed=True)
+
+    serial_out['start_stop']['value'] = START_STOP_START
+    round_trips_us = []
+    t_end = time.perf_counter() + args.seconds
+    networker.write_teensy_data(serial_out)
+    t_write = time.perf_counter_ns()
+    while time.perf_counter() < t_end:
+        data_updated, _ = networker.read_teensy_data(serial_in)
+        if data_updated:
+            round_trips_us.append((time.perf_counter_ns() - t_write) / 1000)
+            networker.write_teensy_data(serial_out)
+            t_write = time.perf_counter_ns()
+    serial_out['start_stop']['value'] = START_STOP_STOP
+    networker.write_teensy_data(serial_out)
+    time.sleep(0.05)
+    networker.close()
+    emulator.stop()
+
+    round_trips_us = np.array(round_trips_us)
+    logged = sum(len(v) for k, v in log.items() if isinstance(v, (list, Log_History)))
+    print(f'{args.mode} mode{" (framed)" if args.framed else ""}{" (compact)" if args.compact else ""}, ' +
+          f'{args.sensors} sensors, clock speed {args.speed}x')
+    print(f'communications: {len(round_trips_us)} ({len(round_trips_us) / args.seconds:.0f}/s)')
+    print(f'round trip [us]: p50 {np.percentile(round_trips_us, 50):.0f}, p99 {np.percentile(round_trips_us, 99):.0f}, ' +
+          f'max {round_trips_us.max():.0f}')
+    print(f'teensy to python: {emulator.bytes_sent / args.seconds / 1000:.1f} kB/s, logged sensor values: {logged}')
+    if args.compact:
+        print(f'saved by compact histories: {emulator.bytes_saved / args.seconds / 1000:.1f} kB/s ' +
+              f'({emulator.bytes_saved / (emulator.bytes_sent + emulator.bytes_saved) * 100:.0f}%)')